@@ -0,0 +1,50 @@
+"""
+Measure the time needed to import sqlalchemy-tenants in a fresh interpreter.
+
+Usage:
+    python benchmarks/import_time.py [--runs 20] [--module sqlalchemy_tenants]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from typing import Dict, List
+
+
+def _measure(module: str) -> Dict[str, int]:
+    """Import the module with `-X importtime`, get the cumulative time by module."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times: Dict[str, int] = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--module", default="sqlalchemy_tenants")
+    args = parser.parse_args()
+
+    totals: List[int] = []
+    loaded: Dict[str, int] = {}
+    for _ in range(args.runs):
+        times = _measure(args.module)
+        totals.append(times[args.module])
+        loaded = times
+    alembic = sorted(m for m in loaded if m.split(".")[0] == "alembic")
+    print(f"import {args.module}: {statistics.median(totals) / 1000:.1f} ms (median)")
+    print(f"alembic modules loaded: {len(alembic)}")
+
+
+if __name__ == "__main__":
+    main()
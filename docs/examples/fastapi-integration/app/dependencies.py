@@ -1,15 +1,14 @@
 import logging
-from typing import Annotated, AsyncGenerator
+from typing import Annotated
 
 import jose
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from jose import jwt
+from sqlalchemy_tenants.aio import get_request_session
 from sqlalchemy_tenants.aio.managers import AsyncTenantSession
 from starlette.status import HTTP_401_UNAUTHORIZED
 
-from app.engine import manager
-
 logger = logging.getLogger(__name__)
 
 
@@ -45,11 +44,8 @@ def _extract_tenant(
 Tenant_T = Annotated[str, Depends(_extract_tenant)]
 
 
-async def _new_db_session(
-    tenant: Tenant_T,
-) -> AsyncGenerator[AsyncTenantSession, None]:
-    async with manager.new_tenant_session(tenant=tenant) as sess:
-        yield sess
+async def _get_db_session(request: Request, tenant: Tenant_T) -> AsyncTenantSession:
+    return await get_request_session(request.scope, tenant)
 
 
-Database_T = Annotated[AsyncTenantSession, Depends(_new_db_session)]
+Database_T = Annotated[AsyncTenantSession, Depends(_get_db_session)]
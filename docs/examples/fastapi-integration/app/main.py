@@ -2,11 +2,14 @@ from typing import Sequence
 
 from fastapi import FastAPI
 from sqlalchemy import select
+from sqlalchemy_tenants.aio import TenantSessionMiddleware
 
 from app.dependencies import Database_T
+from app.engine import manager
 from app.orm import TodoItem
 
 app = FastAPI()
+app.add_middleware(TenantSessionMiddleware, manager=manager)
 
 
 @app.get("/todos")
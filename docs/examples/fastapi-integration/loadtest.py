@@ -0,0 +1,205 @@
+"""
+Load test the example app with many tenants.
+
+The app runs in-process (through an ASGI transport), so that the pool and the
+tenant manager can be instrumented. Tenants are picked with a Zipfian
+distribution: a few tenants get most of the traffic, like in production.
+
+Usage:
+    uv run python loadtest.py --tenants 1000 --requests 20000 --concurrency 64
+"""
+
+import argparse
+import asyncio
+import bisect
+import itertools
+import random
+import statistics
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional
+
+import httpx
+from jose import jwt
+
+from app.engine import engine, manager
+from app.main import app
+
+
+@dataclass
+class Stats:
+    latencies: List[float] = field(default_factory=list)
+    statuses: Dict[int, int] = field(default_factory=dict)
+    errors: int = 0
+    pool_waits: List[float] = field(default_factory=list)
+    provisioning: List[float] = field(default_factory=list)
+
+
+class ZipfSampler:
+    """Sample indexes in [0, n) with probability proportional to 1 / (i + 1)^s."""
+
+    def __init__(self, n: int, s: float, seed: Optional[int] = None) -> None:
+        weights = [1 / (i + 1) ** s for i in range(n)]
+        self._cumulative = list(itertools.accumulate(weights))
+        self._random = random.Random(seed)
+
+    def sample(self) -> int:
+        x = self._random.random() * self._cumulative[-1]
+        return bisect.bisect_left(self._cumulative, x)
+
+
+def _percentile(values: List[float], p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def _instrument(stats: Stats) -> None:
+    """Time the connection checkouts of the pool and the tenants provisioning."""
+    pool = engine.sync_engine.pool
+    connect = pool.connect
+
+    def _timed_connect() -> Any:
+        start = time.perf_counter()
+        try:
+            return connect()
+        finally:
+            stats.pool_waits.append(time.perf_counter() - start)
+
+    pool.connect = _timed_connect  # type: ignore[method-assign]
+
+    create_tenant = manager.create_tenant
+
+    async def _timed_create_tenant(tenant: Any) -> None:
+        start = time.perf_counter()
+        try:
+            await create_tenant(tenant)
+        finally:
+            stats.provisioning.append(time.perf_counter() - start)
+
+    manager.create_tenant = _timed_create_tenant  # type: ignore[method-assign]
+
+
+def _report(stats: Stats, elapsed: float, instrumented: bool) -> None:
+    total = len(stats.latencies)
+    ms = [v * 1000 for v in stats.latencies]
+    print(f"requests:    {total} in {elapsed:.1f}s ({total / elapsed:.0f} req/s)")
+    print(
+        f"statuses:    {dict(sorted(stats.statuses.items()))}, errors: {stats.errors}"
+    )
+    print(
+        "latency ms:  "
+        f"p50={_percentile(ms, 50):.1f} p95={_percentile(ms, 95):.1f} "
+        f"p99={_percentile(ms, 99):.1f} max={max(ms, default=0):.1f}"
+    )
+    if not instrumented:
+        return
+    waits = [v * 1000 for v in stats.pool_waits]
+    print(
+        f"pool wait:   {len(waits)} checkouts, "
+        f"mean={statistics.fmean(waits) if waits else 0:.2f}ms "
+        f"p99={_percentile(waits, 99):.2f}ms max={max(waits, default=0):.2f}ms"
+    )
+    stalls = [v * 1000 for v in stats.provisioning]
+    print(
+        f"provisioning: {len(stalls)} tenants created on the fly, "
+        f"total={sum(stalls):.0f}ms max={max(stalls, default=0):.1f}ms"
+    )
+
+
+async def _worker(
+    send: Callable[[str], Awaitable[httpx.Response]],
+    tokens: List[str],
+    sampler: ZipfSampler,
+    remaining: Iterator[int],
+    total: int,
+    stats: Stats,
+) -> None:
+    while next(remaining) < total:
+        token = tokens[sampler.sample()]
+        start = time.perf_counter()
+        try:
+            response = await send(token)
+        except httpx.HTTPError:
+            stats.errors += 1
+            continue
+        stats.latencies.append(time.perf_counter() - start)
+        stats.statuses[response.status_code] = (
+            stats.statuses.get(response.status_code, 0) + 1
+        )
+
+
+async def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--tenants", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--zipf", type=float, default=1.1, help="Zipf exponent")
+    parser.add_argument(
+        "--prefix",
+        default=None,
+        help="Prefix of the tenant names, random by default so that tenants are "
+        "provisioned on the fly. Reuse it to test already provisioned tenants.",
+    )
+    parser.add_argument(
+        "--url", default=None, help="Test a running app instead of an in-process one"
+    )
+    parser.add_argument(
+        "--max-p99-ms",
+        type=float,
+        default=None,
+        help="Exit with an error if the p99 latency is higher",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    prefix = args.prefix or f"load-{uuid.uuid4().hex[:8]}"
+    tokens = [
+        jwt.encode({"tenant": f"{prefix}-{i}"}, key="loadtest", algorithm="HS256")
+        for i in range(args.tenants)
+    ]
+    stats = Stats()
+    instrumented = args.url is None
+    if instrumented:
+        _instrument(stats)
+        transport: httpx.AsyncBaseTransport = httpx.ASGITransport(app=app)
+        base_url = "http://loadtest"
+    else:
+        transport = httpx.AsyncHTTPTransport()
+        base_url = args.url
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, timeout=60
+    ) as client:
+
+        async def _send(token: str) -> httpx.Response:
+            return await client.get(
+                "/todos", headers={"Authorization": f"Bearer {token}"}
+            )
+
+        sampler = ZipfSampler(args.tenants, args.zipf, seed=args.seed)
+        remaining = itertools.count()
+        start = time.perf_counter()
+        await asyncio.gather(
+            *[
+                _worker(_send, tokens, sampler, remaining, args.requests, stats)
+                for _ in range(args.concurrency)
+            ]
+        )
+        elapsed = time.perf_counter() - start
+
+    _report(stats, elapsed, instrumented)
+    if instrumented:
+        await engine.dispose()
+    p99_ms = _percentile(stats.latencies, 99) * 1000
+    if args.max_p99_ms is not None and p99_ms > args.max_p99_ms:
+        print(f"p99 latency {p99_ms:.1f}ms is above {args.max_p99_ms}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
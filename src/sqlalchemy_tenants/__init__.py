@@ -1,6 +1,7 @@
-from .core import get_process_revision_directives, with_rls
+from .core import get_process_revision_directives, verify_rls, with_rls
 
 __all__ = [
     "get_process_revision_directives",
+    "verify_rls",
     "with_rls",
 ]
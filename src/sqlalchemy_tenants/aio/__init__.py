@@ -1,5 +1,17 @@
+from .asgi import TenantSessionMiddleware, get_request_session
+from .jobs import TenantJobScheduler
 from .managers import PostgresManager
+from .replicas import ReplicaSet
+from .scoped import ScopedTenantSession
+from .statement_cache import StatementCacheMode, get_asyncpg_connect_args
 
 __all__ = [
     "PostgresManager",
+    "ReplicaSet",
+    "ScopedTenantSession",
+    "TenantJobScheduler",
+    "StatementCacheMode",
+    "TenantSessionMiddleware",
+    "get_asyncpg_connect_args",
+    "get_request_session",
 ]
@@ -0,0 +1,203 @@
+import asyncio
+import time
+from contextlib import AsyncExitStack
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, MutableMapping, Optional
+
+from sqlalchemy_tenants.aio.managers import AsyncTenantSession, DBManager
+from sqlalchemy_tenants.core import TenantIdentifier
+
+Scope = MutableMapping[str, Any]
+Message = MutableMapping[str, Any]
+Receive = Callable[[], Awaitable[Message]]
+Send = Callable[[Message], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+REQUEST_SESSION_STATE_KEY = "sqlalchemy_tenants_request_session"
+
+
+@dataclass(frozen=True)
+class RequestSessionTiming:
+    """How long the tenant session of a request held its connection."""
+
+    tenant: TenantIdentifier
+    open_seconds: float
+    """Time spent opening the session: pool checkout and role switch."""
+    hold_seconds: float
+    """Time between the session being opened and its release."""
+
+
+class RequestSession:
+    """
+    The tenant session of a single request, opened on first use and shared by
+    everything resolving it during the request.
+    """
+
+    def __init__(self, manager: DBManager) -> None:
+        self._manager = manager
+        self._lock = asyncio.Lock()
+        self._stack: Optional[AsyncExitStack] = None
+        self._session: Optional[AsyncTenantSession] = None
+        self._open_seconds = 0.0
+        self._opened_at = 0.0
+        self._released = False
+        self.timing: Optional[RequestSessionTiming] = None
+
+    async def get(
+        self,
+        tenant: TenantIdentifier,
+        create_if_missing: bool = True,
+    ) -> AsyncTenantSession:
+        """
+        Get the tenant session of the request, opening it on the first call.
+
+        Args:
+            tenant: The tenant of the request.
+            create_if_missing: Whether to create the tenant role if it doesn't exist.
+
+        Returns:
+            The same session for every call of the request.
+
+        Raises:
+            RuntimeError: If the session was already released, which happens as
+                soon as the response starts.
+            ValueError: If the session was opened for another tenant.
+        """
+        async with self._lock:
+            if self._released:
+                raise RuntimeError(
+                    "The tenant session of the request was released when the "
+                    "response started"
+                )
+            if self._session is None:
+                start = time.perf_counter()
+                stack = AsyncExitStack()
+                self._session = await stack.enter_async_context(
+                    self._manager.new_tenant_session(
+                        tenant, create_if_missing=create_if_missing
+                    )
+                )
+                self._stack = stack
+                self._opened_at = time.perf_counter()
+                self._open_seconds = self._opened_at - start
+            elif self._session.tenant != tenant:
+                raise ValueError(
+                    f"The session of the request is bound to tenant "
+                    f"'{self._session.tenant}', not '{tenant}'"
+                )
+            return self._session
+
+    async def release(self) -> Optional[RequestSessionTiming]:
+        """
+        Close the session, returning its connection to the pool.
+
+        Uncommitted changes are rolled back. Calling it more than once is a no-op.
+
+        Returns:
+            The timing of the session, or None if it was never opened.
+        """
+        async with self._lock:
+            if self._released:
+                return None
+            self._released = True
+            if self._stack is None or self._session is None:
+                return None
+            tenant = self._session.tenant
+            try:
+                await self._stack.aclose()
+            finally:
+                self.timing = RequestSessionTiming(
+                    tenant=tenant,
+                    open_seconds=self._open_seconds,
+                    hold_seconds=time.perf_counter() - self._opened_at,
+                )
+                self._stack = None
+                self._session = None
+            return self.timing
+
+
+class TenantSessionMiddleware:
+    """
+    ASGI middleware giving each HTTP request at most one tenant session.
+
+    The session is opened lazily by `get_request_session`, shared by all the
+    dependencies of the request, and released as soon as the response starts,
+    so the connection isn't held while the body is sent to the client. Handlers
+    must commit before returning, and streaming bodies can't use the session.
+
+    Example:
+        ```python
+        app.add_middleware(TenantSessionMiddleware, manager=manager)
+
+        async def get_db(
+            request: Request, tenant: Tenant_T
+        ) -> AsyncTenantSession:
+            return await get_request_session(request.scope, tenant)
+        ```
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        manager: DBManager,
+        on_release: Optional[Callable[[RequestSessionTiming], None]] = None,
+    ) -> None:
+        """
+        Args:
+            app: The wrapped ASGI application.
+            manager: The manager opening the tenant sessions.
+            on_release: Called with the timing of each released session, e.g.
+                to export metrics.
+        """
+        self.app = app
+        self.manager = manager
+        self.on_release = on_release
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_session = RequestSession(self.manager)
+        scope.setdefault("state", {})[REQUEST_SESSION_STATE_KEY] = request_session
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                await self._release(request_session)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            await self._release(request_session)
+
+    async def _release(self, request_session: RequestSession) -> None:
+        timing = await request_session.release()
+        if timing is not None and self.on_release is not None:
+            self.on_release(timing)
+
+
+async def get_request_session(
+    scope: Scope,
+    tenant: TenantIdentifier,
+    create_if_missing: bool = True,
+) -> AsyncTenantSession:
+    """
+    Get the tenant session of the current request.
+
+    Args:
+        scope: The ASGI scope of the request, e.g. `request.scope` in FastAPI.
+        tenant: The tenant of the request.
+        create_if_missing: Whether to create the tenant role if it doesn't exist.
+
+    Returns:
+        The session of the request, opened on the first call.
+
+    Raises:
+        RuntimeError: If the request doesn't go through `TenantSessionMiddleware`.
+    """
+    request_session: Optional[RequestSession] = scope.get("state", {}).get(
+        REQUEST_SESSION_STATE_KEY
+    )
+    if request_session is None:
+        raise RuntimeError("TenantSessionMiddleware is not installed")
+    return await request_session.get(tenant, create_if_missing=create_if_missing)
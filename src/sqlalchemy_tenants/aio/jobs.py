@@ -0,0 +1,391 @@
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import random
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from sqlalchemy_tenants.aio.managers import AsyncTenantSession, DBManager
+from sqlalchemy_tenants.aio.sharding import ShardedManager
+from sqlalchemy_tenants.core import TenantIdentifier
+from sqlalchemy_tenants.exceptions import TenantNotFound
+
+logger = logging.getLogger(__name__)
+
+Job = Callable[[AsyncTenantSession], Awaitable[Any]]
+
+_DEFAULT_DATABASE = "default"
+_GET_DATABASE_BATCH_SIZE = 100
+"""The number of tenants whose database is looked up concurrently."""
+
+
+class JobStatus(str, Enum):
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    """Failed on every attempt."""
+    SKIPPED = "skipped"
+    """Already succeeded in a previous run of the same job."""
+
+
+@dataclass(frozen=True)
+class JobProgress:
+    """
+    The progress of a job fanned out across tenants, reported each time a
+    tenant is done.
+    """
+
+    tenant: TenantIdentifier
+    status: JobStatus
+    attempts: int
+    completed: int
+    total: int
+    error: Optional[str] = None
+
+
+@dataclass
+class JobReport:
+    """
+    The outcome of running a job across many tenants.
+    """
+
+    name: str
+    statuses: Dict[TenantIdentifier, JobStatus] = field(default_factory=dict)
+    errors: Dict[TenantIdentifier, str] = field(default_factory=dict)
+    attempts: Dict[TenantIdentifier, int] = field(default_factory=dict)
+
+    def get_tenants(self, status: JobStatus) -> List[TenantIdentifier]:
+        """Get the tenants with the given status."""
+        return sorted((t for t, s in self.statuses.items() if s is status), key=str)
+
+    @property
+    def ok(self) -> bool:
+        """Whether the job succeeded for all the tenants."""
+        return JobStatus.FAILED not in self.statuses.values()
+
+    def summary(self) -> str:
+        """Get a human-readable summary of the run."""
+        lines = [f"Job {self.name}:"]
+        for status in JobStatus:
+            lines.append(f"  {status.value}: {len(self.get_tenants(status))}")
+        for tenant in self.get_tenants(JobStatus.FAILED):
+            lines.append(f"  - {tenant}: {self.errors[tenant]}")
+        return "\n".join(lines)
+
+
+class _DatabaseQueue:
+    """The tenants waiting to run on a database, the largest first."""
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[float, int, TenantIdentifier]] = []
+        self._counter = itertools.count()
+        self.running = 0
+        self.virtual_time = 0.0
+
+    def __bool__(self) -> bool:
+        return bool(self._heap)
+
+    def push(self, tenant: TenantIdentifier, size: float) -> None:
+        heapq.heappush(self._heap, (-size, next(self._counter), tenant))
+
+    def pop(self) -> Tuple[TenantIdentifier, float]:
+        size, _, tenant = heapq.heappop(self._heap)
+        # The database is charged for the work it has been given
+        self.virtual_time += -size
+        return tenant, -size
+
+
+class TenantJobScheduler:
+    """
+    Run a job for each tenant concurrently, without taking over the databases.
+
+    - At most `max_concurrency` tenants run at once, and at most
+      `max_concurrency_per_database` on the same database, leaving connections
+      to the online traffic.
+    - Tenants are weighted by their size (e.g. their number of rows). Databases
+      are served by weighted fair queuing: the next tenant is taken from the
+      database that has been given the least work so far, so a database full of
+      large tenants doesn't starve the others. On each database the largest
+      tenants run first, so they don't end up as stragglers.
+    - A failing tenant is retried up to `max_attempts` times with an exponential
+      backoff, without holding a slot while it waits. A failure doesn't stop
+      the other tenants. Tenants that don't exist fail right away.
+    - When `state_path` is given, the outcome of each tenant is appended there as
+      soon as it's known, and the tenants that already succeeded are skipped by
+      the next runs of the job with the same name, so an interrupted run can
+      be resumed.
+    """
+
+    def __init__(
+        self,
+        manager: DBManager,
+        max_concurrency: int = 8,
+        max_concurrency_per_database: Optional[int] = None,
+        get_database: Optional[Callable[[TenantIdentifier], Awaitable[str]]] = None,
+        max_attempts: int = 3,
+        backoff: float = 1.0,
+        max_backoff: float = 60.0,
+        state_path: Optional[str | Path] = None,
+        on_progress: Optional[Callable[[JobProgress], None]] = None,
+    ) -> None:
+        """
+        Args:
+            manager: The manager opening the tenant sessions.
+            max_concurrency: The maximum number of tenants running at once.
+            max_concurrency_per_database: The maximum number of tenants running
+                at once on the same database.
+            get_database: Get the database of a tenant. Defaults to the shard of
+                the tenant with a `ShardedManager`, and to a single database
+                otherwise.
+            max_attempts: The number of times a tenant is tried before failing.
+            backoff: The delay before the first retry, in seconds, doubled on
+                each following retry.
+            max_backoff: The maximum delay between retries, in seconds.
+            state_path: The file where the outcome of each tenant is saved.
+            on_progress: Called each time a tenant is done.
+        """
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1.")
+        if max_attempts < 1:
+            raise ValueError("max_attempts must be at least 1.")
+        self.manager = manager
+        self.max_concurrency = max_concurrency
+        self.max_concurrency_per_database = max_concurrency_per_database
+        self.get_database = get_database
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.state_path = Path(state_path) if state_path is not None else None
+        self.on_progress = on_progress
+
+    async def _get_database(self, tenant: TenantIdentifier) -> str:
+        if self.get_database is not None:
+            return await self.get_database(tenant)
+        if isinstance(self.manager, ShardedManager):
+            return await self.manager.placement.get_shard(tenant)
+        return _DEFAULT_DATABASE
+
+    def _get_delay(self, attempt: int) -> float:
+        delay = min(self.max_backoff, self.backoff * 2.0 ** (attempt - 1))
+        # Spread the retries of tenants failing together, e.g. on a failover
+        return delay * random.uniform(0.5, 1.0)
+
+    def _load_state(self, name: str) -> Set[str]:
+        if self.state_path is None or not self.state_path.exists():
+            return set()
+        succeeded: Set[str] = set()
+        for line in self.state_path.read_text().splitlines():
+            entry = json.loads(line)
+            if entry["job"] == name and entry["status"] == JobStatus.SUCCEEDED:
+                succeeded.add(entry["tenant"])
+        return succeeded
+
+    def _save_state(
+        self, name: str, tenant: TenantIdentifier, status: JobStatus
+    ) -> None:
+        if self.state_path is None:
+            return
+        # Appending keeps each checkpoint cheap, whatever the number of tenants
+        entry = {"job": name, "tenant": str(tenant), "status": status.value}
+        with self.state_path.open("a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+    def _report_progress(
+        self, report: JobReport, tenant: TenantIdentifier, total: int
+    ) -> None:
+        status = report.statuses[tenant]
+        if status is not JobStatus.SKIPPED:
+            self._save_state(report.name, tenant, status)
+        if self.on_progress is not None:
+            self.on_progress(
+                JobProgress(
+                    tenant=tenant,
+                    status=status,
+                    attempts=report.attempts.get(tenant, 0),
+                    completed=len(report.statuses),
+                    total=total,
+                    error=report.errors.get(tenant),
+                )
+            )
+
+    async def run(
+        self,
+        job: Job,
+        tenants: Mapping[TenantIdentifier, float] | Iterable[TenantIdentifier],
+        name: str = "job",
+    ) -> JobReport:
+        """
+        Run the job for each tenant, in a session of the tenant.
+
+        The job must commit the session to persist its changes. Tenants that
+        don't exist fail without being created.
+
+        Args:
+            job: The coroutine function to run, called with the session.
+            tenants: The tenants to run the job for, optionally mapped to their
+                size. Without sizes, all the tenants weigh the same.
+            name: The name of the job, identifying it in the state.
+
+        Returns:
+            The report with the status of each tenant.
+        """
+        sizes: Dict[TenantIdentifier, float] = (
+            dict(tenants)
+            if isinstance(tenants, Mapping)
+            else dict.fromkeys(tenants, 1.0)
+        )
+        report = JobReport(name=name)
+        done = self._load_state(name)
+        pending: List[TenantIdentifier] = []
+        for tenant in sizes:
+            if str(tenant) in done:
+                report.statuses[tenant] = JobStatus.SKIPPED
+                self._report_progress(report, tenant, len(sizes))
+            else:
+                pending.append(tenant)
+
+        queues: Dict[str, _DatabaseQueue] = {}
+        for i in range(0, len(pending), _GET_DATABASE_BATCH_SIZE):
+            batch = pending[i : i + _GET_DATABASE_BATCH_SIZE]
+            databases = await asyncio.gather(
+                *(self._get_database(t) for t in batch), return_exceptions=True
+            )
+            for tenant, database in zip(batch, databases):
+                if isinstance(database, TenantNotFound):
+                    report.statuses[tenant] = JobStatus.FAILED
+                    report.errors[tenant] = str(database)
+                    self._report_progress(report, tenant, len(sizes))
+                elif isinstance(database, BaseException):
+                    raise database
+                else:
+                    queues.setdefault(database, _DatabaseQueue()).push(
+                        tenant, sizes[tenant]
+                    )
+        await _JobRun(self, job, report, queues, total=len(sizes)).run()
+        return report
+
+
+class _JobRun:
+    """A single run of a job, dispatching the queued tenants to tasks."""
+
+    def __init__(
+        self,
+        scheduler: TenantJobScheduler,
+        job: Job,
+        report: JobReport,
+        queues: Dict[str, _DatabaseQueue],
+        total: int,
+    ) -> None:
+        self.scheduler = scheduler
+        self.job = job
+        self.report = report
+        self.queues = queues
+        self.total = total
+        self.active = 0
+        self.tasks: Set["asyncio.Task[None]"] = set()
+        self.crashes: List[BaseException] = []
+        self.wake = asyncio.Event()
+
+    def _next_queue(self) -> Optional[_DatabaseQueue]:
+        limit = self.scheduler.max_concurrency_per_database
+        available = [
+            q
+            for q in self.queues.values()
+            if q and (limit is None or q.running < limit)
+        ]
+        return min(available, key=lambda q: q.virtual_time, default=None)
+
+    def _dispatch(self) -> None:
+        while self.active < self.scheduler.max_concurrency:
+            queue = self._next_queue()
+            if queue is None:
+                return
+            tenant, size = queue.pop()
+            self.active += 1
+            queue.running += 1
+            task = asyncio.create_task(self._attempt(queue, tenant, size))
+            self.tasks.add(task)
+            task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: "asyncio.Task[None]") -> None:
+        self.tasks.discard(task)
+        if not task.cancelled():
+            error = task.exception()
+            if error is not None:
+                self.crashes.append(error)
+        self.wake.set()
+
+    async def run(self) -> None:
+        try:
+            while True:
+                self._dispatch()
+                if self.crashes:
+                    raise self.crashes[0]
+                if not self.tasks:
+                    return
+                self.wake.clear()
+                await self.wake.wait()
+        finally:
+            for task in self.tasks:
+                task.cancel()
+
+    async def _attempt(
+        self, queue: _DatabaseQueue, tenant: TenantIdentifier, size: float
+    ) -> None:
+        report = self.report
+        attempt = report.attempts.get(tenant, 0) + 1
+        report.attempts[tenant] = attempt
+        error: Optional[Exception] = None
+        try:
+            async with self.scheduler.manager.new_tenant_session(
+                tenant, create_if_missing=False
+            ) as sess:
+                await self.job(sess)
+        except Exception as e:
+            error = e
+        finally:
+            # Free the slot right away, even when waiting to retry
+            self.active -= 1
+            queue.running -= 1
+            self.wake.set()
+
+        if (
+            error is not None
+            and not isinstance(error, TenantNotFound)
+            and attempt < self.scheduler.max_attempts
+        ):
+            delay = self.scheduler._get_delay(attempt)
+            logger.warning(
+                "job %s failed on tenant %s (attempt %d), retrying in %.1fs",
+                report.name,
+                tenant,
+                attempt,
+                delay,
+                exc_info=error,
+            )
+            await asyncio.sleep(delay)
+            queue.push(tenant, size)
+            return
+        if error is None:
+            report.statuses[tenant] = JobStatus.SUCCEEDED
+        else:
+            logger.error(
+                "job %s failed on tenant %s", report.name, tenant, exc_info=error
+            )
+            report.statuses[tenant] = JobStatus.FAILED
+            report.errors[tenant] = str(error)
+        self.scheduler._report_progress(report, tenant, self.total)
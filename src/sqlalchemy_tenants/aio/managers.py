@@ -1,35 +1,90 @@
 import logging
+import time
 from abc import abstractmethod
-from contextlib import asynccontextmanager
-from typing import Any, AsyncContextManager, AsyncGenerator, Protocol, Set
+from contextlib import AsyncExitStack, asynccontextmanager, suppress
+from typing import (
+    Any,
+    AsyncContextManager,
+    AsyncGenerator,
+    Dict,
+    List,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    TypeVar,
+)
 
-from sqlalchemy import text
-from sqlalchemy.exc import DBAPIError
+from sqlalchemy import MetaData, Table
+from sqlalchemy.exc import DBAPIError, IntegrityError, ProgrammingError
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from sqlalchemy.sql.base import Executable
 from typing_extensions import Self, runtime_checkable
 
+from sqlalchemy_tenants.aio.replicas import ReplicaSet
+from sqlalchemy_tenants.aio.statement_cache import (
+    StatementCacheMode,
+    apply_statement_cache,
+    apply_statement_cache_on_begin,
+    prepare_statements,
+)
+from sqlalchemy_tenants.clone import get_clone_plan
+from sqlalchemy_tenants.context import resolve_tenant
 from sqlalchemy_tenants.core import (
+    DEFAULT_TENANT_CODEC,
     TENANT_ROLE_PREFIX,
+    TenantCodec,
     TenantIdentifier,
     get_tenant_role_name,
 )
+from sqlalchemy_tenants.events import listen_tenant_events
 from sqlalchemy_tenants.exceptions import (
     TenantAlreadyExists,
     TenantNotFound,
 )
-from sqlalchemy_tenants.utils import pg_quote
+from sqlalchemy_tenants.pool import RoleResetMode, install_role_reset, mark_role_set
+from sqlalchemy_tenants.registry import RegistryStatements, parse_tenant
+from sqlalchemy_tenants.replicas import route_reads, set_role_on_begin
+from sqlalchemy_tenants.statements import (
+    CREATE_TENANT,
+    DELETE_TENANT,
+    LIST_ROLES,
+    PROVISIONING_FUNCTIONS_EXIST,
+    PROVISIONING_FUNCTIONS_TTL,
+    ROLE_EXISTS,
+    ProvisioningStatements,
+    get_set_role_statement,
+)
+from sqlalchemy_tenants.utils import (
+    DUPLICATE_OBJECT,
+    get_qualified_name,
+    get_sqlstate,
+)
+from sqlalchemy_tenants.warmup import (
+    CompiledCacheStats,
+    WarmupStatement,
+    compile_tenant_statements,
+    tag_tenant_statements,
+    track_compiled_cache,
+)
 
 logger = logging.getLogger(__name__)
 
+E = TypeVar("E", bound=Executable)
+
 
 class AsyncTenantSession(AsyncSession):
     def __init__(
         self,
         tenant: TenantIdentifier,
+        inject_tenant_filter: bool = False,
         **kw: Any,
     ) -> None:
         super().__init__(**kw)
         self.tenant = tenant
+        listen_tenant_events(
+            self.sync_session, tenant, inject_tenant_filter=inject_tenant_filter
+        )
 
 
 @runtime_checkable
@@ -64,11 +119,41 @@ class DBManager(Protocol):
             A set with all the available tenants.
         """
 
+    @abstractmethod
+    async def clone_tenant(
+        self,
+        source: TenantIdentifier,
+        target: TenantIdentifier,
+        metadata: MetaData | Sequence[MetaData],
+        remap_ids: bool = False,
+        batch_size: int = 10_000,
+    ) -> Dict[str, int]:
+        """
+        Copy all the rows of the RLS tables from a tenant to another tenant.
+
+        The copy runs entirely inside the database with `INSERT ... SELECT`
+        statements, in foreign key dependency order and within a single
+        transaction. Only the data is copied: the target tenant role is neither
+        created nor checked.
+
+        Args:
+            source: The identifier of the tenant to copy the data from.
+            target: The identifier of the tenant to copy the data to.
+            metadata: The metadata containing the RLS tables to copy.
+            remap_ids: Whether to assign new values to auto-incrementing primary
+                keys, rewriting the foreign keys referencing them.
+            batch_size: The maximum number of rows copied by each statement.
+
+        Returns:
+            The number of copied rows for each table.
+        """
+
     @abstractmethod
     def new_tenant_session(
         self,
-        tenant: TenantIdentifier,
+        tenant: Optional[TenantIdentifier] = None,
         create_if_missing: bool = True,
+        readonly: bool = False,
     ) -> AsyncContextManager[AsyncTenantSession]:
         """
         Create a new SQLAlchemy session scoped to a specific tenant.
@@ -79,8 +164,11 @@ class DBManager(Protocol):
 
         Args:
             tenant: The tenant identifier, which must match a valid PostgreSQL role
-                used for RLS enforcement.
+                used for RLS enforcement. Defaults to the tenant of the current
+                context, see `sqlalchemy_tenants.context`.
             create_if_missing: Whether to create the tenant role if it doesn't exist.
+            readonly: Whether to run the whole session on a read replica, when
+                one is available.
 
         Yields:
             A SQLAlchemy session restricted to the tenant's data via RLS.
@@ -88,6 +176,7 @@ class DBManager(Protocol):
         Raises:
             TenantNotFound: If the tenant role doesn't exist and `create_if_missing`
                 is False.
+            NoCurrentTenant: If no tenant is given and none is current.
         """
 
     @abstractmethod
@@ -106,22 +195,70 @@ class DBManager(Protocol):
 class PostgresManager(DBManager):
     def __init__(
         self,
-        schema_name: str,
+        schema_name: str | Sequence[str],
         engine: AsyncEngine,
         session_maker: async_sessionmaker[AsyncSession],
+        inject_tenant_filter: bool = False,
+        statement_cache_mode: StatementCacheMode = StatementCacheMode.SHARED,
+        statement_cache_size: int = 100,
+        replicas: Optional[ReplicaSet] = None,
+        route_reads: bool = False,
+        release_between_transactions: bool = False,
+        registry: Optional[Table] = None,
+        tenant_codec: Optional[TenantCodec] = None,
+        role_reset: Optional[RoleResetMode] = RoleResetMode.RESET_ROLE,
     ) -> None:
         self.engine = engine
-        self.schema = schema_name
+        self.schemas = (
+            [schema_name] if isinstance(schema_name, str) else list(schema_name)
+        )
+        if not self.schemas:
+            raise ValueError("At least one schema is required.")
+        self.schema = self.schemas[0]
         self.session_maker = session_maker
+        self.inject_tenant_filter = inject_tenant_filter
+        self.statement_cache_mode = statement_cache_mode
+        self.statement_cache_size = statement_cache_size
+        self.replicas = replicas
+        self.route_reads = route_reads
+        self.release_between_transactions = release_between_transactions
+        self.registry = registry
+        self._registry = RegistryStatements(registry) if registry is not None else None
+        self.tenant_codec = tenant_codec or DEFAULT_TENANT_CODEC
+        if self.tenant_codec.compact_uuid:
+            raise ValueError("The RLS policies can't cast compact UUIDs.")
+        self.role_reset = role_reset
+        if role_reset is not None:
+            for e in [engine, *(replicas.engines if replicas is not None else [])]:
+                install_role_reset(e.sync_engine, role_reset)
+        self._owner = str(engine.url.username)
+        self._statements = ProvisioningStatements(
+            self.schemas,
+            owner=self._owner,
+            registry=get_qualified_name(registry) if registry is not None else None,
+        )
+        self._has_provisioning_functions = False
+        self._provisioning_checked_until = 0.0
+        self._warmup_statements: List[WarmupStatement] = []
+        self.compiled_cache_stats: Optional[CompiledCacheStats] = None
 
     @classmethod
     def from_engine(
         cls,
         engine: AsyncEngine,
-        schema_name: str,
+        schema_name: str | Sequence[str],
         expire_on_commit: bool = False,
         autoflush: bool = False,
         autocommit: bool = False,
+        inject_tenant_filter: bool = False,
+        statement_cache_mode: StatementCacheMode = StatementCacheMode.SHARED,
+        statement_cache_size: int = 100,
+        replicas: Optional[ReplicaSet] = None,
+        route_reads: bool = False,
+        release_between_transactions: bool = False,
+        registry: Optional[Table] = None,
+        tenant_codec: Optional[TenantCodec] = None,
+        role_reset: Optional[RoleResetMode] = RoleResetMode.RESET_ROLE,
     ) -> Self:
         session_maker = async_sessionmaker(
             bind=engine,
@@ -133,92 +270,373 @@ class PostgresManager(DBManager):
             schema_name=schema_name,
             engine=engine,
             session_maker=session_maker,
+            inject_tenant_filter=inject_tenant_filter,
+            statement_cache_mode=statement_cache_mode,
+            statement_cache_size=statement_cache_size,
+            replicas=replicas,
+            route_reads=route_reads,
+            release_between_transactions=release_between_transactions,
+            registry=registry,
+            tenant_codec=tenant_codec,
+            role_reset=role_reset,
         )
 
     @staticmethod
     async def _role_exists(sess: AsyncSession, role: str) -> bool:
+        result = await sess.execute(ROLE_EXISTS, {"role": role})
+        return result.scalar() is not None
+
+    async def _tenant_exists(
+        self, sess: AsyncSession, tenant: TenantIdentifier
+    ) -> bool:
+        if self._registry is None:
+            return await self._role_exists(
+                sess, get_tenant_role_name(tenant, self.tenant_codec)
+            )
         result = await sess.execute(
-            text("SELECT 1 FROM pg_roles WHERE rolname = :role").bindparams(role=role)
+            self._registry.exists, {"tenant": self.tenant_codec.encode(tenant)}
         )
         return result.scalar() is not None
 
+    async def _provisioning_functions_exist(self, sess: AsyncSession) -> bool:
+        # Databases migrated before the functions were added to the migrations
+        # keep running a statement per round trip. Checked again once expired,
+        # as a migration may add or drop the functions while the manager runs
+        if time.monotonic() >= self._provisioning_checked_until:
+            result = await sess.execute(PROVISIONING_FUNCTIONS_EXIST)
+            self._has_provisioning_functions = bool(result.scalar())
+            self._provisioning_checked_until = (
+                time.monotonic() + PROVISIONING_FUNCTIONS_TTL
+            )
+        return self._has_provisioning_functions
+
     async def create_tenant(self, tenant: TenantIdentifier) -> None:
         logger.info("creating tenant %s", tenant)
         async with self.new_session() as sess:
-            role = get_tenant_role_name(tenant)
-            safe_role = pg_quote(role)
-            # Check if the role already exists
-            if await self._role_exists(sess, role):
-                raise TenantAlreadyExists(tenant)
-            # Create the tenant role
-            await sess.execute(text(f"CREATE ROLE {safe_role}"))
-            await sess.execute(text(f"GRANT {safe_role} TO {self.engine.url.username}"))
-            await sess.execute(
-                text(f"GRANT USAGE ON SCHEMA {self.schema} TO {safe_role}")
-            )
-            await sess.execute(
-                text(
-                    f"GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES "
-                    f"IN SCHEMA {self.schema} TO {safe_role};"
-                )
-            )
-            await sess.execute(
-                text(
-                    f"ALTER DEFAULT PRIVILEGES IN SCHEMA {self.schema} "
-                    f"GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO {safe_role};"
-                )
-            )
+            role = get_tenant_role_name(tenant, self.tenant_codec)
+            try:
+                if await self._provisioning_functions_exist(sess):
+                    # Create the role and grant access in a single round trip
+                    result = await sess.execute(
+                        CREATE_TENANT,
+                        {"role": role, "schemas": self.schemas, "owner": self._owner},
+                    )
+                    if not result.scalar():
+                        raise TenantAlreadyExists(tenant)
+                    for stmt in self._statements.revoke_registry([role]):
+                        await sess.execute(stmt)
+                else:
+                    # Check if the tenant already exists
+                    if await self._tenant_exists(sess, tenant):
+                        raise TenantAlreadyExists(tenant)
+                    # Create the tenant role and grant access to all the schemas
+                    for stmt in self._statements.create_role(role):
+                        await sess.execute(stmt)
+                if self._registry is not None:
+                    # Committed with the role, so they can't get out of sync
+                    await sess.execute(
+                        self._registry.insert,
+                        self._registry.get_insert_params(
+                            self.tenant_codec.parse(tenant),
+                            self.tenant_codec.encode(tenant),
+                        ),
+                    )
+            except IntegrityError as e:
+                # Created concurrently by another session
+                raise TenantAlreadyExists(tenant) from e
+            except ProgrammingError as e:
+                # The role was created concurrently by another session
+                if get_sqlstate(e) != DUPLICATE_OBJECT:
+                    raise
+                raise TenantAlreadyExists(tenant) from e
             await sess.commit()
 
     async def delete_tenant(self, tenant: TenantIdentifier) -> None:
         logger.info("deleting tenant %s", tenant)
         async with self.new_session() as sess:
-            role = get_tenant_role_name(tenant)
-            safe_role = pg_quote(role)
-            # Check if the role exists
-            if not await self._role_exists(sess, role):
-                raise TenantNotFound(tenant)
-            await sess.execute(
-                text(f'REASSIGN OWNED BY {safe_role} TO "{self.engine.url.username}"')
-            )
-            await sess.execute(text(f"DROP OWNED BY {safe_role}"))
-            await sess.execute(text(f"DROP ROLE {safe_role}"))
+            role = get_tenant_role_name(tenant, self.tenant_codec)
+            if await self._provisioning_functions_exist(sess):
+                result = await sess.execute(
+                    DELETE_TENANT, {"role": role, "owner": self._owner}
+                )
+                if not result.scalar():
+                    raise TenantNotFound(tenant)
+            else:
+                # Check if the tenant exists
+                if not await self._tenant_exists(sess, tenant):
+                    raise TenantNotFound(tenant)
+                for stmt in self._statements.delete_role(role):
+                    await sess.execute(stmt)
+            if self._registry is not None:
+                await sess.execute(
+                    self._registry.delete, {"tenant": self.tenant_codec.encode(tenant)}
+                )
             await sess.commit()
 
     async def list_tenants(self) -> Set[TenantIdentifier]:
+        async with self.new_session() as sess:
+            if self._registry is not None:
+                result = await sess.execute(self._registry.list)
+                return {
+                    self.tenant_codec.parse(parse_tenant(*row)) for row in result.all()
+                }
+            result = await sess.execute(
+                LIST_ROLES, {"prefix": f"{TENANT_ROLE_PREFIX}%"}
+            )
+            return {
+                self.tenant_codec.decode(row[0].removeprefix(TENANT_ROLE_PREFIX))
+                for row in result.all()
+            }
+
+    async def tenant_exists(self, tenant: TenantIdentifier) -> bool:
+        """
+        Check whether a tenant exists, with a primary key lookup on the registry
+        when the manager has one.
+
+        Args:
+            tenant: The identifier of the tenant.
+        """
+        async with self.new_session() as sess:
+            return await self._tenant_exists(sess, tenant)
+
+    async def count_tenants(self) -> int:
+        """
+        Get the number of tenants.
+        """
+        async with self.new_session() as sess:
+            if self._registry is not None:
+                result = await sess.execute(self._registry.count)
+                return int(result.scalar_one())
+            result = await sess.execute(
+                LIST_ROLES, {"prefix": f"{TENANT_ROLE_PREFIX}%"}
+            )
+            return len(result.all())
+
+    async def list_tenants_page(
+        self, limit: int = 1000, after: Optional[TenantIdentifier] = None
+    ) -> List[TenantIdentifier]:
+        """
+        Get a page of tenants, ordered by their identifier as a string.
+
+        Pass the last tenant of a page as `after` to get the next one: each page
+        is read from the primary key of the registry, however many tenants
+        there are.
+
+        Args:
+            limit: The maximum number of tenants in the page.
+            after: The last tenant of the previous page.
+
+        Returns:
+            The tenants of the page, fewer than `limit` on the last one.
+
+        Raises:
+            ValueError: If the manager has no registry.
+        """
+        if self._registry is None:
+            raise ValueError("Paginating the tenants requires a registry.")
         async with self.new_session() as sess:
             result = await sess.execute(
-                text(
-                    "SELECT rolname FROM pg_roles WHERE rolname LIKE :prefix"
-                ).bindparams(prefix=f"{TENANT_ROLE_PREFIX}%")
+                self._registry.get_page(
+                    limit,
+                    self.tenant_codec.encode(after) if after is not None else None,
+                )
             )
-            return {row[0].removeprefix(TENANT_ROLE_PREFIX) for row in result.all()}
+            return [self.tenant_codec.parse(parse_tenant(*row)) for row in result.all()]
+
+    async def backfill_registry(self) -> int:
+        """
+        Record in the registry the tenants created before it was in use.
+
+        Their identifiers are recorded as strings, since the role names don't
+        keep their type.
+
+        Returns:
+            The number of recorded tenants.
+
+        Raises:
+            ValueError: If the manager has no registry.
+        """
+        if self._registry is None:
+            raise ValueError("The manager has no registry.")
+        async with self.new_session() as sess:
+            result = await sess.execute(self._registry.backfill)
+            count = len(result.all())
+            # The roles created before the registry were granted it by default
+            roles = await sess.execute(LIST_ROLES, {"prefix": f"{TENANT_ROLE_PREFIX}%"})
+            for stmt in self._statements.revoke_registry(list(roles.scalars())):
+                await sess.execute(stmt)
+            await sess.commit()
+            return count
+
+    async def clone_tenant(
+        self,
+        source: TenantIdentifier,
+        target: TenantIdentifier,
+        metadata: MetaData | Sequence[MetaData],
+        remap_ids: bool = False,
+        batch_size: int = 10_000,
+    ) -> Dict[str, int]:
+        logger.info("cloning tenant %s into %s", source, target)
+        plan = get_clone_plan(
+            metadata,
+            source=source,
+            target=target,
+            remap_ids=remap_ids,
+            batch_size=batch_size,
+        )
+        copied: Dict[str, int] = {}
+        async with self.new_session() as sess:
+            for stmt in plan.setup:
+                await sess.execute(stmt)
+            for table_clone in plan.tables:
+                after = None
+                total = 0
+                while True:
+                    result = await sess.execute(table_clone.copy, {"after": after})
+                    last_key, count = result.one()
+                    total += count
+                    if table_clone.key is None or count < plan.batch_size:
+                        break
+                    after = last_key
+                copied[table_clone.table.fullname] = total
+            await sess.commit()
+        return copied
+
+    def register_warmup(
+        self,
+        statement: E,
+        column_keys: Sequence[str] = (),
+        for_executemany: bool = False,
+    ) -> E:
+        """
+        Register a statement to compile when `warmup` is called.
+
+        Args:
+            statement: The statement, as it's executed by the tenant sessions.
+            column_keys: The names of the parameters it's executed with, e.g.
+                the values of an `insert()`.
+            for_executemany: Whether it's executed with a list of parameters.
+
+        Returns:
+            The statement, so that it can be registered where it's defined.
+        """
+        self._warmup_statements.append(
+            WarmupStatement(statement, tuple(column_keys), for_executemany)
+        )
+        return statement
+
+    async def warmup(
+        self, tenant: Optional[TenantIdentifier] = None, connections: int = 1
+    ) -> int:
+        """
+        Compile the statements registered with `register_warmup` into the
+        compiled cache of the engine, e.g. at startup, so the first requests
+        after a deploy don't pay for their compilation.
+
+        With asyncpg, the statements can also be prepared on pooled connections,
+        under the role of a representative tenant.
+
+        Args:
+            tenant: The tenant whose sessions prepare the statements. When None,
+                the statements are only compiled.
+            connections: The number of pooled connections to prepare the
+                statements on.
+
+        Returns:
+            The number of compiled statements.
+        """
+        compiled = compile_tenant_statements(
+            self.engine.sync_engine,
+            self._warmup_statements,
+            inject_tenant_filter=self.inject_tenant_filter,
+        )
+        if tenant is None or not compiled:
+            return len(compiled)
+        async with AsyncExitStack() as stack:
+            # Hold the sessions together, so each one gets its own connection
+            for _ in range(connections):
+                sess = await stack.enter_async_context(
+                    self.new_tenant_session(tenant, create_if_missing=False)
+                )
+                await prepare_statements(sess, compiled)
+        return len(compiled)
+
+    def track_compiled_cache(self) -> CompiledCacheStats:
+        """
+        Start recording the compiled cache hits and misses of the statements
+        executed by the tenant sessions opened from now on.
+
+        Returns:
+            The statistics, updated as the statements are executed.
+        """
+        if self.compiled_cache_stats is None:
+            self.compiled_cache_stats = CompiledCacheStats()
+            track_compiled_cache(self.engine.sync_engine, self.compiled_cache_stats)
+        return self.compiled_cache_stats
 
     @staticmethod
     async def _maybe_set_session_role(sess: AsyncSession, role: str) -> None:
-        safe_role = pg_quote(role)
+        mark_role_set(await sess.connection())
         try:
-            await sess.execute(text(f"SET SESSION ROLE {safe_role}"))
+            await sess.execute(get_set_role_statement(role))
         except DBAPIError as e:
             if e.args and "does not exist" in e.args[0]:
                 raise TenantNotFound(f"Role '{role}' does not exist") from e
 
+    @asynccontextmanager
+    async def _new_engine_session(
+        self, engine: AsyncEngine, role: str
+    ) -> AsyncGenerator[AsyncSession, None]:
+        if self.release_between_transactions:
+            async with self.session_maker(bind=engine) as session:
+                # The role is set again on each transaction, which may run on
+                # another connection: begin right away to check it, then
+                # release the connection
+                set_role_on_begin(session.sync_session, role)
+                await session.connection()
+                await session.rollback()
+                yield session
+            return
+        # Hold the connection for the whole session and commit the role, so that
+        # it's neither reset on return to the pool nor undone by a rollback
+        async with engine.connect() as conn, self.session_maker(bind=conn) as session:
+            await self._maybe_set_session_role(session, role)
+            await session.commit()
+            yield session
+
     @asynccontextmanager
     async def new_tenant_session(
         self,
-        tenant: TenantIdentifier,
+        tenant: Optional[TenantIdentifier] = None,
         create_if_missing: bool = True,
+        readonly: bool = False,
     ) -> AsyncGenerator[AsyncTenantSession, None]:
-        role = get_tenant_role_name(tenant)
+        tenant = resolve_tenant(tenant)
+        role = get_tenant_role_name(tenant, self.tenant_codec)
         tried_create = False
 
         while True:
             try:
-                async with self.session_maker() as session:
-                    await self._maybe_set_session_role(session, role)
+                async with self._new_role_session(role, readonly) as session:
+                    if self.release_between_transactions:
+                        apply_statement_cache_on_begin(
+                            session,
+                            role=role,
+                            mode=self.statement_cache_mode,
+                            size=self.statement_cache_size,
+                        )
+                    else:
+                        await self._apply_statement_cache(session, role)
+                    if self.compiled_cache_stats is not None:
+                        tag_tenant_statements(session.sync_session)
+                    listen_tenant_events(
+                        session.sync_session,
+                        tenant,
+                        inject_tenant_filter=self.inject_tenant_filter,
+                    )
                     tenant_session = AsyncTenantSession.__new__(AsyncTenantSession)
                     tenant_session.__dict__ = session.__dict__
-                    tenant_session.tenant = tenant
+                    tenant_session.tenant = self.tenant_codec.parse(tenant)
                     yield tenant_session
                 break
             except TenantNotFound:
@@ -227,10 +645,47 @@ class PostgresManager(DBManager):
                 if not create_if_missing:
                     raise
                 logger.info("tenant %s does not exist, creating it", tenant)
-                await self.create_tenant(tenant)
+                # The tenant may be created concurrently by another session
+                with suppress(TenantAlreadyExists):
+                    await self.create_tenant(tenant)
                 tried_create = True
 
+    @asynccontextmanager
+    async def _new_role_session(
+        self, role: str, readonly: bool
+    ) -> AsyncGenerator[AsyncSession, None]:
+        replica = None
+        if self.replicas is not None and (readonly or self.route_reads):
+            replica = await self.replicas.get_engine()
+        if replica is None:
+            async with self._new_engine_session(self.engine, role) as session:
+                yield session
+        elif readonly:
+            async with self._new_engine_session(replica, role) as session:
+                yield session
+        else:
+            async with self.session_maker() as session:
+                set_role_on_begin(session.sync_session, role)
+                route_reads(session.sync_session, replica.sync_engine)
+                # Begin on the replica right away to check the role
+                await session.connection(bind_arguments={"bind": replica.sync_engine})
+                if self.release_between_transactions:
+                    await session.rollback()
+                yield session
+
+    async def _apply_statement_cache(self, sess: AsyncSession, role: str) -> None:
+        await apply_statement_cache(
+            sess,
+            role=role,
+            mode=self.statement_cache_mode,
+            size=self.statement_cache_size,
+        )
+
     @asynccontextmanager
     async def new_session(self) -> AsyncGenerator[AsyncSession, None]:
         async with self.session_maker() as session:
+            if self.statement_cache_mode is not StatementCacheMode.SHARED:
+                await self._apply_statement_cache(
+                    session, str(self.engine.url.username)
+                )
             yield session
@@ -0,0 +1,69 @@
+import itertools
+import logging
+from typing import Optional, Sequence
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from sqlalchemy_tenants.replicas import LAG_QUERY, LagCache
+
+logger = logging.getLogger(__name__)
+
+
+class ReplicaSet:
+    """
+    A set of read replicas, balancing tenant sessions across them in round-robin.
+
+    When `max_lag` is set, the replication lag of each replica is checked at most
+    every `check_interval` seconds, and replicas lagging behind (or unreachable)
+    are skipped until the next check. When no replica is available, sessions
+    fall back to the primary.
+    """
+
+    def __init__(
+        self,
+        engines: Sequence[AsyncEngine],
+        max_lag: Optional[float] = None,
+        check_interval: float = 5.0,
+    ) -> None:
+        if not engines:
+            raise ValueError("At least one replica is required.")
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self._lags = LagCache(check_interval)
+        self._counter = itertools.count()
+
+    async def get_engine(self) -> Optional[AsyncEngine]:
+        """
+        Get the next available replica.
+
+        Returns:
+            The engine of the replica, or None if all the replicas are lagging.
+        """
+        start = next(self._counter)
+        for i in range(len(self.engines)):
+            engine = self.engines[(start + i) % len(self.engines)]
+            if await self._is_available(engine):
+                return engine
+        logger.warning("no replica available, falling back to the primary")
+        return None
+
+    async def get_lag(self, engine: AsyncEngine) -> float:
+        """Get the replication lag of the replica, in seconds."""
+        async with engine.connect() as conn:
+            result = await conn.execute(text(LAG_QUERY))
+            return float(result.scalar_one())
+
+    async def _is_available(self, engine: AsyncEngine) -> bool:
+        if self.max_lag is None:
+            return True
+        lag = self._lags.get(engine)
+        if lag is None:
+            try:
+                lag = await self.get_lag(engine)
+            except (DBAPIError, OSError):
+                logger.warning("replica %s is unreachable", engine.url, exc_info=True)
+                lag = float("inf")
+            self._lags.set(engine, lag)
+        return lag <= self.max_lag
@@ -0,0 +1,235 @@
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, Optional, Sequence, Set
+
+from sqlalchemy import MetaData, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+from typing_extensions import Self
+
+from sqlalchemy_tenants.aio.managers import AsyncTenantSession, DBManager
+from sqlalchemy_tenants.context import resolve_tenant
+from sqlalchemy_tenants.core import (
+    DEFAULT_TENANT_CODEC,
+    TENANT_SCHEMA_PREFIX,
+    TenantCodec,
+    TenantIdentifier,
+    get_tenant_schema_name,
+)
+from sqlalchemy_tenants.events import listen_tenant_events
+from sqlalchemy_tenants.exceptions import TenantAlreadyExists, TenantNotFound
+from sqlalchemy_tenants.schemas import (
+    SET_SEARCH_PATH_QUERY,
+    get_clone_statements,
+    get_search_path,
+    get_tenant_tables,
+    needs_search_path,
+    record_search_path,
+    track_search_path,
+)
+from sqlalchemy_tenants.utils import pg_quote
+
+logger = logging.getLogger(__name__)
+
+
+class SchemaPerTenantManager(DBManager):
+    """
+    A manager giving each tenant its own schema, for tenants that need
+    physical isolation (separate tables, indexes and vacuum statistics).
+
+    Tenant sessions switch the `search_path` to the tenant schema followed by
+    the shared schemas, so models without an explicit schema resolve to the
+    tables of the tenant. Each tenant session holds a single connection for its
+    whole lifetime, whose `search_path` is set once and reset when the
+    connection is returned to the pool.
+
+    Sessions run with the role of the engine: isolation relies on the
+    `search_path`, not on database privileges. Read replicas are not supported,
+    so `readonly` sessions run on the engine as well.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        session_maker: async_sessionmaker[AsyncSession],
+        metadata: Optional[MetaData] = None,
+        shared_schemas: Sequence[str] = ("public",),
+        tenant_codec: Optional[TenantCodec] = None,
+    ) -> None:
+        self.engine = engine
+        self.session_maker = session_maker
+        self.metadata = metadata
+        self.shared_schemas = list(shared_schemas)
+        self.tenant_codec = tenant_codec or DEFAULT_TENANT_CODEC
+        track_search_path(engine.sync_engine)
+
+    @classmethod
+    def from_engine(
+        cls,
+        engine: AsyncEngine,
+        metadata: Optional[MetaData] = None,
+        shared_schemas: Sequence[str] = ("public",),
+        expire_on_commit: bool = False,
+        autoflush: bool = False,
+        autocommit: bool = False,
+        tenant_codec: Optional[TenantCodec] = None,
+    ) -> Self:
+        session_maker = async_sessionmaker(
+            bind=engine,
+            expire_on_commit=expire_on_commit,
+            autoflush=autoflush,
+            autocommit=autocommit,
+        )
+        return cls(
+            engine=engine,
+            session_maker=session_maker,
+            metadata=metadata,
+            shared_schemas=shared_schemas,
+            tenant_codec=tenant_codec,
+        )
+
+    @staticmethod
+    async def _schema_exists(sess: AsyncSession, schema: str) -> bool:
+        result = await sess.execute(
+            text("SELECT 1 FROM pg_namespace WHERE nspname = :schema").bindparams(
+                schema=schema
+            )
+        )
+        return result.scalar() is not None
+
+    async def create_tenant(self, tenant: TenantIdentifier) -> None:
+        """
+        Create the schema of the tenant and, when the manager has a metadata,
+        the tables without an explicit schema in it.
+        """
+        logger.info("creating schema of tenant %s", tenant)
+        schema = get_tenant_schema_name(tenant, self.tenant_codec)
+        async with self.new_session() as sess:
+            if await self._schema_exists(sess, schema):
+                raise TenantAlreadyExists(tenant)
+            await sess.execute(text(f"CREATE SCHEMA {pg_quote(schema)}"))
+            if self.metadata is not None:
+                conn = await sess.connection()
+                conn = await conn.execution_options(schema_translate_map={None: schema})
+                await conn.run_sync(
+                    self.metadata.create_all, tables=get_tenant_tables(self.metadata)
+                )
+            await sess.commit()
+
+    async def delete_tenant(self, tenant: TenantIdentifier) -> None:
+        """
+        Drop the schema of the tenant.
+
+        Unlike with RLS, the data of the tenant lives in its schema
+        and is deleted with it.
+        """
+        logger.info("dropping schema of tenant %s", tenant)
+        schema = get_tenant_schema_name(tenant, self.tenant_codec)
+        async with self.new_session() as sess:
+            if not await self._schema_exists(sess, schema):
+                raise TenantNotFound(tenant)
+            await sess.execute(text(f"DROP SCHEMA {pg_quote(schema)} CASCADE"))
+            await sess.commit()
+
+    async def list_tenants(self) -> Set[TenantIdentifier]:
+        async with self.new_session() as sess:
+            result = await sess.execute(
+                text(
+                    "SELECT nspname FROM pg_namespace WHERE nspname LIKE :prefix"
+                ).bindparams(prefix=f"{TENANT_SCHEMA_PREFIX}%")
+            )
+            return {
+                self.tenant_codec.decode(row[0].removeprefix(TENANT_SCHEMA_PREFIX))
+                for row in result.all()
+            }
+
+    async def clone_tenant(
+        self,
+        source: TenantIdentifier,
+        target: TenantIdentifier,
+        metadata: MetaData | Sequence[MetaData],
+        remap_ids: bool = False,
+        batch_size: int = 10_000,
+    ) -> Dict[str, int]:
+        """
+        Copy all the rows of the tenant tables from a tenant schema to another.
+
+        Each schema has its own tables, so ids never clash and are copied as
+        they are: `remap_ids` and `batch_size` are ignored.
+        """
+        if source == target:
+            raise ValueError("Source and target tenants must be different.")
+        logger.info("cloning tenant %s into %s", source, target)
+        meta_list = metadata if isinstance(metadata, Sequence) else [metadata]
+        copied: Dict[str, int] = {}
+        async with self.new_session() as sess:
+            for meta in meta_list:
+                statements = get_clone_statements(
+                    meta,
+                    source_schema=get_tenant_schema_name(source, self.tenant_codec),
+                    target_schema=get_tenant_schema_name(target, self.tenant_codec),
+                )
+                for name, stmt in statements.items():
+                    result = await sess.execute(text(stmt))
+                    copied[name] = result.rowcount  # type: ignore[attr-defined]
+            await sess.commit()
+        return copied
+
+    async def _set_search_path(self, sess: AsyncSession, schema: Optional[str]) -> None:
+        conn = await sess.connection()
+        if schema is None:
+            if needs_search_path(conn.info, None):
+                await sess.execute(text("RESET search_path"))
+                record_search_path(conn.info, None)
+            return
+        search_path = get_search_path(schema, self.shared_schemas)
+        if not needs_search_path(conn.info, search_path):
+            return
+        result = await sess.execute(
+            text(SET_SEARCH_PATH_QUERY),
+            {"search_path": search_path, "schema": schema},
+        )
+        record_search_path(conn.info, search_path)
+        if not result.scalar():
+            raise TenantNotFound(f"Schema '{schema}' does not exist")
+
+    @asynccontextmanager
+    async def new_tenant_session(
+        self,
+        tenant: Optional[TenantIdentifier] = None,
+        create_if_missing: bool = True,
+        readonly: bool = False,
+    ) -> AsyncGenerator[AsyncTenantSession, None]:
+        tenant = resolve_tenant(tenant)
+        schema = get_tenant_schema_name(tenant, self.tenant_codec)
+        tried_create = False
+
+        while True:
+            try:
+                async with (
+                    self.engine.connect() as conn,
+                    self.session_maker(bind=conn) as session,
+                ):
+                    # Commit the search_path, so that it applies to all the
+                    # transactions of the session
+                    await self._set_search_path(session, schema)
+                    await session.commit()
+                    listen_tenant_events(session.sync_session, tenant)
+                    tenant_session = AsyncTenantSession.__new__(AsyncTenantSession)
+                    tenant_session.__dict__ = session.__dict__
+                    tenant_session.tenant = self.tenant_codec.parse(tenant)
+                    yield tenant_session
+                break
+            except TenantNotFound:
+                if tried_create:
+                    raise
+                if not create_if_missing:
+                    raise
+                logger.info("tenant %s does not exist, creating it", tenant)
+                await self.create_tenant(tenant)
+                tried_create = True
+
+    @asynccontextmanager
+    async def new_session(self) -> AsyncGenerator[AsyncSession, None]:
+        async with self.session_maker() as session:
+            await self._set_search_path(session, None)
+            yield session
@@ -0,0 +1,93 @@
+import asyncio
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Optional, Tuple
+
+from sqlalchemy_tenants.aio.managers import AsyncTenantSession, DBManager
+from sqlalchemy_tenants.context import is_same_tenant, resolve_tenant
+from sqlalchemy_tenants.core import TenantIdentifier
+
+
+class ScopedTenantSession:
+    """
+    Share the tenant session opened by the outermost `session()` block of a
+    task with the nested blocks, instead of opening a connection for each.
+
+    Only the outermost block owns the session: it's committed (or not) by the
+    code of that block and closed when the block exits. Nested blocks asking
+    for another tenant, or for a writable session while the current one is
+    readonly, get their own session. Tasks created within a block, e.g. by
+    `asyncio.gather`, get their own session too, since a session can't be used
+    concurrently.
+
+    Example:
+        ```python
+        sessions = ScopedTenantSession(manager)
+
+        async def get_user(user_id: int) -> User:
+            async with sessions.session() as sess:  # (1)
+                return await sess.get_one(User, user_id)
+
+        with tenant_context("tenant_1"):
+            async with sessions.session() as sess:
+                user = await get_user(1)
+                await sess.commit()
+        ```
+
+        1. Reuses the session of the caller.
+    """
+
+    def __init__(self, manager: DBManager) -> None:
+        self.manager = manager
+        self._current: ContextVar[
+            Optional[Tuple[AsyncTenantSession, bool, "asyncio.Task[Any]"]]
+        ] = ContextVar(f"sqlalchemy_tenants_scoped_session_{id(self)}", default=None)
+
+    def get(self) -> Optional[AsyncTenantSession]:
+        """Get the session opened by the current task, if any."""
+        current = self._current.get()
+        if current is None or current[2] is not asyncio.current_task():
+            return None
+        return current[0]
+
+    @asynccontextmanager
+    async def session(
+        self,
+        tenant: Optional[TenantIdentifier] = None,
+        create_if_missing: bool = True,
+        readonly: bool = False,
+    ) -> AsyncGenerator[AsyncTenantSession, None]:
+        """
+        Get the session of the tenant opened by an enclosing block, or open one.
+
+        Args:
+            tenant: The identifier of the tenant, the current tenant by default.
+            create_if_missing: Whether to create the tenant role if it doesn't exist.
+            readonly: Whether the session may run on a read replica.
+
+        Yields:
+            The session of the tenant.
+        """
+        tenant = resolve_tenant(tenant)
+        task = asyncio.current_task()
+        current = self._current.get()
+        if (
+            current is not None
+            and current[2] is task
+            and is_same_tenant(current[0].tenant, tenant)
+            and (readonly or not current[1])
+        ):
+            yield current[0]
+            return
+        async with self.manager.new_tenant_session(
+            tenant, create_if_missing=create_if_missing, readonly=readonly
+        ) as sess:
+            if task is None:
+                # Outside of a task, the session can't be told apart from others
+                yield sess
+                return
+            token = self._current.set((sess, readonly, task))
+            try:
+                yield sess
+            finally:
+                self._current.reset(token)
@@ -0,0 +1,280 @@
+import asyncio
+import logging
+from abc import abstractmethod
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncGenerator,
+    Dict,
+    Mapping,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    cast,
+)
+
+from sqlalchemy import MetaData, Table, delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from sqlalchemy.schema import CreateSchema
+from typing_extensions import runtime_checkable
+
+from sqlalchemy_tenants.aio.managers import AsyncTenantSession, DBManager
+from sqlalchemy_tenants.context import resolve_tenant
+from sqlalchemy_tenants.core import TenantIdentifier
+from sqlalchemy_tenants.exceptions import TenantNotFound
+from sqlalchemy_tenants.sharding import HashRing, ShardCache, get_directory_table
+
+logger = logging.getLogger(__name__)
+
+
+@runtime_checkable
+class Placement(Protocol):
+    @abstractmethod
+    async def get_shard(self, tenant: TenantIdentifier) -> str:
+        """
+        Get the shard of an existing tenant.
+
+        Raises:
+            TenantNotFound: If the tenant has not been placed on any shard.
+        """
+
+    @abstractmethod
+    async def add_tenant(self, tenant: TenantIdentifier) -> str:
+        """
+        Place a new tenant on a shard.
+
+        Returns:
+            The shard the tenant has been placed on.
+        """
+
+    @abstractmethod
+    async def remove_tenant(self, tenant: TenantIdentifier) -> None:
+        """
+        Remove the tenant from its shard.
+        """
+
+
+class ConsistentHashPlacement(Placement):
+    """
+    Place tenants on shards with consistent hashing.
+
+    The placement is computed, so nothing needs to be stored.
+    """
+
+    def __init__(self, shards: Sequence[str], vnodes: int = 100) -> None:
+        self.ring = HashRing(shards, vnodes=vnodes)
+
+    async def get_shard(self, tenant: TenantIdentifier) -> str:
+        return self.ring.get_shard(tenant)
+
+    async def add_tenant(self, tenant: TenantIdentifier) -> str:
+        return self.ring.get_shard(tenant)
+
+    async def remove_tenant(self, tenant: TenantIdentifier) -> None:
+        pass
+
+
+class DirectoryPlacement(Placement):
+    """
+    Place tenants on shards according to a directory table, caching lookups
+    in a local LRU cache.
+
+    New tenants are placed using the `default` placement and recorded in the
+    directory, so they can later be moved to another shard by updating
+    their row (and invalidating the cache).
+
+    Cached shards expire after `cache_ttl` seconds, so every process routes a
+    moved tenant to its new shard within `cache_ttl` of the move. Call
+    `invalidate` in each process (e.g. when notified of the move) to route it
+    there immediately. With `cache_ttl=None`, shards are cached until they're
+    invalidated.
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        default: Placement,
+        table: Optional[Table] = None,
+        cache_size: int = 10_000,
+        cache_ttl: Optional[float] = 30.0,
+    ) -> None:
+        self.engine = engine
+        self.default = default
+        self.table = table if table is not None else get_directory_table()
+        self._cache = ShardCache(cache_size, ttl=cache_ttl)
+
+    async def create_table(self) -> None:
+        """Create the directory table and its schema, if they don't exist."""
+        async with self.engine.begin() as conn:
+            if self.table.schema is not None:
+                await conn.execute(CreateSchema(self.table.schema, if_not_exists=True))
+            await conn.run_sync(self.table.create, checkfirst=True)
+
+    def invalidate(self, tenant: Optional[TenantIdentifier] = None) -> None:
+        """Drop the cached shard of the given tenant, or of all tenants."""
+        if tenant is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(str(tenant))
+
+    async def get_shard(self, tenant: TenantIdentifier) -> str:
+        key = str(tenant)
+        shard: Optional[str] = self._cache.get(key)
+        if shard is not None:
+            return shard
+        async with self.engine.connect() as conn:
+            result = await conn.execute(
+                select(self.table.c.shard).where(self.table.c.tenant == key)
+            )
+            shard = cast(Optional[str], result.scalar())
+        if shard is None:
+            raise TenantNotFound(tenant)
+        self._cache.set(key, shard)
+        return shard
+
+    async def add_tenant(self, tenant: TenantIdentifier) -> str:
+        key = str(tenant)
+        async with self.engine.begin() as conn:
+            await conn.execute(
+                insert(self.table)
+                .values(tenant=key, shard=await self.default.add_tenant(tenant))
+                .on_conflict_do_nothing()
+            )
+            # Another process may have placed the tenant concurrently
+            result = await conn.execute(
+                select(self.table.c.shard).where(self.table.c.tenant == key)
+            )
+            shard: str = result.scalar_one()
+        self._cache.set(key, shard)
+        return shard
+
+    async def remove_tenant(self, tenant: TenantIdentifier) -> None:
+        key = str(tenant)
+        async with self.engine.begin() as conn:
+            await conn.execute(delete(self.table).where(self.table.c.tenant == key))
+        self._cache.pop(key)
+
+    async def move_tenant(self, tenant: TenantIdentifier, shard: str) -> None:
+        """
+        Route the tenant to another shard.
+
+        Only the directory is updated: the data of the tenant must already
+        be on the new shard.
+
+        Raises:
+            TenantNotFound: If the tenant has not been placed on any shard.
+        """
+        key = str(tenant)
+        async with self.engine.begin() as conn:
+            result = await conn.execute(
+                update(self.table).where(self.table.c.tenant == key).values(shard=shard)
+            )
+        if result.rowcount == 0:
+            raise TenantNotFound(tenant)
+        self._cache.set(key, shard)
+
+
+class ShardedManager(DBManager):
+    """
+    A manager spreading tenants across multiple databases (shards).
+
+    Each shard is served by its own manager, and tenants are routed to them
+    according to the given placement. Tenant sessions are opened on the shard
+    of the tenant, so application code using `new_tenant_session` is unchanged.
+    """
+
+    def __init__(
+        self,
+        managers: Mapping[str, DBManager],
+        placement: Placement,
+    ) -> None:
+        if not managers:
+            raise ValueError("At least one shard is required.")
+        self.managers: Dict[str, DBManager] = dict(managers)
+        self.placement = placement
+
+    async def get_manager(self, tenant: TenantIdentifier) -> DBManager:
+        """
+        Get the manager of the shard the tenant is placed on.
+
+        Raises:
+            TenantNotFound: If the tenant has not been placed on any shard.
+        """
+        return self.managers[await self.placement.get_shard(tenant)]
+
+    async def create_tenant(self, tenant: TenantIdentifier) -> None:
+        shard = await self.placement.add_tenant(tenant)
+        logger.info("creating tenant %s on shard %s", tenant, shard)
+        try:
+            await self.managers[shard].create_tenant(tenant)
+        except Exception:
+            await self.placement.remove_tenant(tenant)
+            raise
+
+    async def delete_tenant(self, tenant: TenantIdentifier) -> None:
+        manager = await self.get_manager(tenant)
+        await manager.delete_tenant(tenant)
+        await self.placement.remove_tenant(tenant)
+
+    async def list_tenants(self) -> Set[TenantIdentifier]:
+        results = await asyncio.gather(
+            *(m.list_tenants() for m in self.managers.values())
+        )
+        return set().union(*results)
+
+    async def clone_tenant(
+        self,
+        source: TenantIdentifier,
+        target: TenantIdentifier,
+        metadata: MetaData | Sequence[MetaData],
+        remap_ids: bool = False,
+        batch_size: int = 10_000,
+    ) -> Dict[str, int]:
+        manager = await self.get_manager(source)
+        if manager is not await self.get_manager(target):
+            raise ValueError(
+                f"Tenants '{source}' and '{target}' are placed on different shards."
+            )
+        return await manager.clone_tenant(
+            source,
+            target,
+            metadata,
+            remap_ids=remap_ids,
+            batch_size=batch_size,
+        )
+
+    @asynccontextmanager
+    async def new_tenant_session(
+        self,
+        tenant: Optional[TenantIdentifier] = None,
+        create_if_missing: bool = True,
+        readonly: bool = False,
+    ) -> AsyncGenerator[AsyncTenantSession, None]:
+        tenant = resolve_tenant(tenant)
+        try:
+            manager = await self.get_manager(tenant)
+        except TenantNotFound:
+            if not create_if_missing:
+                raise
+            manager = self.managers[await self.placement.add_tenant(tenant)]
+        async with manager.new_tenant_session(
+            tenant, create_if_missing=create_if_missing, readonly=readonly
+        ) as sess:
+            yield sess
+
+    @asynccontextmanager
+    async def new_session(
+        self, shard: Optional[str] = None
+    ) -> AsyncGenerator[AsyncSession, None]:
+        """
+        Create a new admin session on the given shard.
+
+        The shard can be omitted when there is a single shard.
+        """
+        if shard is None:
+            if len(self.managers) > 1:
+                raise ValueError("A shard is required when there are many shards.")
+            shard = next(iter(self.managers))
+        async with self.managers[shard].new_session() as sess:
+            yield sess
@@ -0,0 +1,155 @@
+from enum import Enum
+from typing import Any, Dict, Sequence
+from uuid import uuid4
+
+from sqlalchemy import event
+from sqlalchemy.engine import Compiled, Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, SessionTransaction
+from sqlalchemy.pool import PoolProxiedConnection
+from sqlalchemy.util import LRUCache
+
+_INFO_ROLE_KEY = "sqlalchemy_tenants_statement_cache_role"
+_INFO_CACHES_KEY = "sqlalchemy_tenants_statement_caches"
+_MAX_ROLE_CACHES = 32
+
+
+class StatementCacheMode(str, Enum):
+    """
+    How the asyncpg prepared statement cache of pooled connections is managed
+    when switching tenant roles.
+
+    Postgres re-plans prepared statements that depend on RLS every time they are
+    executed by a role different from the one they were planned for, so sharing
+    the cache across tenants keeps working but throws plans away on each switch.
+    """
+
+    SHARED = "shared"
+    """Keep a single cache per connection, shared by all the roles (default)."""
+
+    PER_ROLE = "per_role"
+    """
+    Keep a separate cache for each role on each connection, so statements
+    prepared by a tenant are only reused by the same tenant.
+    """
+
+    RESET = "reset"
+    """Clear the cache of the connection whenever it switches to another role."""
+
+
+def get_asyncpg_connect_args(
+    statement_cache_size: int = 100,
+    pgbouncer: bool = False,
+) -> Dict[str, Any]:
+    """
+    Get the `connect_args` to use when creating an asyncpg engine for
+    tenant sessions.
+
+    Args:
+        statement_cache_size: the size of the prepared statement cache of each
+            connection. Zero disables the cache.
+        pgbouncer: whether connections go through PgBouncer in transaction
+            mode, in which case prepared statements get unique names so that
+            they don't clash across server connections.
+
+    Returns:
+        The keyword arguments to pass as `connect_args` to `create_async_engine`.
+    """
+    connect_args: Dict[str, Any] = {
+        "prepared_statement_cache_size": statement_cache_size,
+    }
+    if pgbouncer:
+        connect_args["prepared_statement_name_func"] = _unique_statement_name
+    return connect_args
+
+
+def _unique_statement_name() -> str:
+    return f"__asyncpg_{uuid4()}__"
+
+
+async def apply_statement_cache(
+    session: AsyncSession,
+    role: str,
+    mode: StatementCacheMode,
+    size: int,
+) -> None:
+    """
+    Set up the prepared statement cache of the session connection for the
+    given role.
+
+    Does nothing for drivers other than asyncpg or when the cache is disabled.
+    """
+    if mode is StatementCacheMode.SHARED:
+        return
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    _apply_to_connection(raw, role=role, mode=mode, size=size)
+
+
+def apply_statement_cache_on_begin(
+    session: AsyncSession,
+    role: str,
+    mode: StatementCacheMode,
+    size: int,
+) -> None:
+    """
+    Set up the prepared statement cache for the given role on every connection
+    the session begins a transaction on.
+    """
+    if mode is StatementCacheMode.SHARED:
+        return
+
+    @event.listens_for(session.sync_session, "after_begin")
+    def _after_begin(
+        _: Session, transaction: SessionTransaction, connection: Connection
+    ) -> None:
+        _apply_to_connection(connection.connection, role=role, mode=mode, size=size)
+
+
+async def prepare_statements(
+    session: AsyncSession, statements: Sequence[Compiled]
+) -> int:
+    """
+    Prepare the compiled statements on the connection of the session, adding
+    them to its prepared statement cache as their execution would.
+
+    Does nothing for drivers other than asyncpg or when the cache is disabled.
+
+    Returns:
+        The number of prepared statements.
+    """
+    conn = await session.connection()
+    raw = await conn.get_raw_connection()
+    dbapi_conn: Any = raw.dbapi_connection
+    if getattr(dbapi_conn, "_prepared_statement_cache", None) is None:
+        return 0
+    invalidate_timestamp = getattr(conn.dialect, "_invalidate_schema_cache_asof", 0)
+    for compiled in statements:
+        await dbapi_conn._prepare(compiled.string, invalidate_timestamp)
+    return len(statements)
+
+
+def _apply_to_connection(
+    raw: PoolProxiedConnection,
+    role: str,
+    mode: StatementCacheMode,
+    size: int,
+) -> None:
+    dbapi_conn = raw.dbapi_connection
+    if getattr(dbapi_conn, "_prepared_statement_cache", None) is None:
+        return
+
+    if mode is StatementCacheMode.RESET:
+        if raw.info.get(_INFO_ROLE_KEY) != role:
+            dbapi_conn._prepared_statement_cache.clear()  # type: ignore[union-attr]
+            raw.info[_INFO_ROLE_KEY] = role
+        return
+
+    caches: LRUCache[str, Any] = raw.info.setdefault(
+        _INFO_CACHES_KEY, LRUCache(_MAX_ROLE_CACHES)
+    )
+    cache = caches.get(role)
+    if cache is None:
+        cache = LRUCache(size)
+        caches[role] = cache
+    dbapi_conn._prepared_statement_cache = cache  # type: ignore[union-attr]
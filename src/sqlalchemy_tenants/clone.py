@@ -0,0 +1,216 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import (
+    BigInteger,
+    Column,
+    ColumnElement,
+    Executable,
+    MetaData,
+    Select,
+    Table,
+    bindparam,
+    func,
+    insert,
+    null,
+    or_,
+    select,
+)
+from sqlalchemy.schema import CreateTable
+
+from sqlalchemy_tenants.core import (
+    TenantIdentifier,
+    coerce_tenant,
+    get_tenant_rls_tables,
+)
+from sqlalchemy_tenants.utils import get_qualified_name
+
+_MAP_TABLE_PREFIX = "_sqlalchemy_tenants_clone_map_"
+
+
+@dataclass(frozen=True)
+class TableClone:
+    """
+    The statement copying the rows of a single table from one tenant to another.
+
+    Each execution of `copy` returns a single row with the last key copied and
+    the number of copied rows. When `key` is set, the copy is performed in
+    batches using keyset pagination: pass the returned key as the `after`
+    parameter to copy the next batch (None for the first one).
+    Tables without a single-column primary key are copied with a single statement.
+    """
+
+    table: Table
+    key: Optional[Column[Any]]
+    copy: Select[Any]
+
+
+@dataclass(frozen=True)
+class ClonePlan:
+    """
+    The statements required to clone the data of a tenant into another tenant.
+
+    The `setup` statements must be executed first, followed by the copy of each
+    table in order. Everything must run within the same transaction.
+    """
+
+    batch_size: int
+    setup: List[Executable] = field(default_factory=list)
+    tables: List[TableClone] = field(default_factory=list)
+
+
+def _get_map_table(index: int) -> Table:
+    return Table(
+        f"{_MAP_TABLE_PREFIX}{index}",
+        MetaData(),
+        Column("old_id", BigInteger, primary_key=True),
+        Column("new_id", BigInteger, nullable=False),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+
+
+def _get_single_pk(table: Table) -> Optional[Column[Any]]:
+    pk = list(table.primary_key.columns)
+    if len(pk) != 1:
+        return None
+    return pk[0]
+
+
+def get_clone_plan(
+    metadata: MetaData | Sequence[MetaData],
+    source: TenantIdentifier,
+    target: TenantIdentifier,
+    remap_ids: bool = False,
+    batch_size: int = 10_000,
+) -> ClonePlan:
+    """
+    Build the statements to clone all the RLS tables' rows of a tenant into
+    another tenant, entirely server-side with `INSERT ... SELECT`.
+
+    Tables are copied in foreign key dependency order, so that parents are
+    always copied before their children. The tenant identifiers are converted
+    to the tenant column type of each table (e.g. a UUID passed as a string),
+    and the tables whose tenant column can't hold them are skipped.
+
+    When `remap_ids` is True, new values are drawn from the sequence of each
+    auto-incrementing integer primary key, and foreign keys referencing remapped
+    tables are rewritten accordingly. Foreign keys pointing to rows outside of
+    the source tenant are copied unchanged. The old -> new mapping is kept in
+    temporary tables dropped on commit, so the whole plan must run in a single
+    transaction.
+
+    Args:
+        metadata: the metadata containing the RLS tables.
+        source: the tenant to copy the rows from.
+        target: the tenant to copy the rows to.
+        remap_ids: whether to generate new auto-incrementing primary keys.
+        batch_size: the maximum number of rows copied by each statement.
+
+    Returns:
+        The plan to execute to clone the tenant.
+
+    Raises:
+        ValueError: If the tenants are the same, or no RLS table can hold them.
+    """
+    if str(source) == str(target):
+        raise ValueError("Source and target tenants must be different.")
+    if batch_size <= 0:
+        raise ValueError("batch_size must be greater than zero.")
+    tables = get_tenant_rls_tables(metadata, source, target)
+
+    # Allocate the new IDs of every remapped table upfront, so that
+    # foreign keys (including self-referencing ones) can always be resolved.
+    plan = ClonePlan(batch_size=batch_size)
+    id_maps: Dict[Column[Any], Table] = {}
+    if remap_ids:
+        for table in tables:
+            pk = table.autoincrement_column
+            if pk is None:
+                continue
+            map_table = _get_map_table(len(id_maps))
+            id_maps[pk] = map_table
+            source_param = bindparam(
+                "source", coerce_tenant(source, table), type_=table.c.tenant.type
+            )
+            sequence = func.pg_get_serial_sequence(get_qualified_name(table), pk.name)
+            plan.setup.extend(
+                [
+                    CreateTable(map_table),
+                    insert(map_table).from_select(
+                        ["old_id", "new_id"],
+                        select(pk, func.nextval(sequence))
+                        .where(table.c.tenant == source_param)
+                        .order_by(pk),
+                    ),
+                ]
+            )
+
+    plan.tables.extend(
+        TableClone(
+            table=t,
+            key=_get_single_pk(t),
+            copy=_get_copy_statement(
+                t,
+                coerce_tenant(source, t),
+                coerce_tenant(target, t),
+                id_maps,
+                batch_size,
+            ),
+        )
+        for t in tables
+    )
+    return plan
+
+
+def _get_copy_statement(
+    table: Table,
+    source: TenantIdentifier,
+    target: TenantIdentifier,
+    id_maps: Dict[Column[Any], Table],
+    batch_size: int,
+) -> Select[Any]:
+    tenant_type = table.c.tenant.type
+    key = _get_single_pk(table)
+
+    batch_query = select(table).where(
+        table.c.tenant == bindparam("source", source, type_=tenant_type)
+    )
+    if key is not None:
+        after = bindparam("after", type_=key.type)
+        batch_query = (
+            batch_query.where(or_(after.is_(None), key > after))
+            .order_by(key)
+            .limit(batch_size)
+        )
+    batch = batch_query.cte("batch")
+
+    values: List[ColumnElement[Any]] = []
+    for col in table.columns:
+        if col.key == "tenant":
+            values.append(bindparam("target", target, type_=tenant_type))
+            continue
+        value: ColumnElement[Any] = batch.c[col.key]
+        if col in id_maps:
+            value = _lookup_new_id(id_maps[col], value)
+        else:
+            for fk in col.foreign_keys:
+                if fk.column in id_maps:
+                    # Rows outside of the source tenant keep being referenced
+                    value = func.coalesce(
+                        _lookup_new_id(id_maps[fk.column], value), value
+                    )
+                    break
+        values.append(value)
+
+    copy_rows = insert(table).from_select(list(table.columns), select(*values))
+    last_key = func.max(batch.c[key.key]) if key is not None else null()
+    return (
+        select(last_key, func.count()).select_from(batch).add_cte(copy_rows.cte("copy"))
+    )
+
+
+def _lookup_new_id(map_table: Table, old_id: ColumnElement[Any]) -> ColumnElement[Any]:
+    return (
+        select(map_table.c.new_id).where(map_table.c.old_id == old_id).scalar_subquery()
+    )
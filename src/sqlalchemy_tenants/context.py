@@ -0,0 +1,72 @@
+from contextlib import contextmanager
+from contextvars import ContextVar, Token
+from typing import Generator, Optional
+
+from sqlalchemy_tenants.core import TenantIdentifier
+from sqlalchemy_tenants.exceptions import NoCurrentTenant
+
+_current_tenant: ContextVar[Optional[TenantIdentifier]] = ContextVar(
+    "sqlalchemy_tenants_current_tenant", default=None
+)
+
+
+def get_current_tenant() -> Optional[TenantIdentifier]:
+    """Get the tenant of the current context, if any."""
+    return _current_tenant.get()
+
+
+def set_current_tenant(tenant: TenantIdentifier) -> Token[Optional[TenantIdentifier]]:
+    """
+    Set the tenant of the current context, e.g. once per request.
+
+    Each thread and each asyncio task has its own context: tasks inherit the
+    tenant of the code that created them, threads start without one.
+
+    Returns:
+        The token restoring the previous tenant with `reset_current_tenant`.
+    """
+    return _current_tenant.set(tenant)
+
+
+def reset_current_tenant(token: Token[Optional[TenantIdentifier]]) -> None:
+    """Restore the tenant that was current before `set_current_tenant`."""
+    _current_tenant.reset(token)
+
+
+@contextmanager
+def tenant_context(tenant: TenantIdentifier) -> Generator[TenantIdentifier, None, None]:
+    """
+    Make the tenant current within the block.
+
+    Example:
+        ```python
+        with tenant_context("tenant_1"):
+            with manager.new_tenant_session() as sess:
+                ...
+        ```
+    """
+    token = set_current_tenant(tenant)
+    try:
+        yield tenant
+    finally:
+        reset_current_tenant(token)
+
+
+def resolve_tenant(tenant: Optional[TenantIdentifier]) -> TenantIdentifier:
+    """
+    Get the given tenant or, when None, the tenant of the current context.
+
+    Raises:
+        NoCurrentTenant: If no tenant is given and none is current.
+    """
+    if tenant is not None:
+        return tenant
+    current = _current_tenant.get()
+    if current is None:
+        raise NoCurrentTenant()
+    return current
+
+
+def is_same_tenant(a: TenantIdentifier, b: TenantIdentifier) -> bool:
+    """Check whether two identifiers, possibly of different types, are equal."""
+    return a == b or str(a) == str(b)
@@ -1,24 +1,51 @@
-from typing import Callable, Iterable, List, Optional, Sequence, Type, TypeVar, Union
+import base64
+from dataclasses import dataclass
+from functools import cached_property
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+    Union,
+)
 from uuid import UUID
 
-from alembic.operations import MigrationScript, ops
-from alembic.runtime.migration import MigrationContext
-from sqlalchemy import MetaData, inspect, text
+from sqlalchemy import Connection, Engine, MetaData, Table, inspect, text
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.schema import sort_tables
 
 from sqlalchemy_tenants.utils import (
     function_exists,
+    get_qualified_name,
     normalize_whitespace,
+    pg_quote,
 )
 
+if TYPE_CHECKING:
+    # Alembic is only needed by the migration hook, don't slow down the import
+    # of the package for the applications
+    from alembic.operations import MigrationScript
+    from alembic.runtime.migration import MigrationContext
+
 TENANT_ROLE_PREFIX = "tenant_"
+TENANT_SCHEMA_PREFIX = "tenant_schema_"
 TENANT_SUPPORTED_TYPES = {str, int, UUID}
 GET_TENANT_FUNCTION_NAME = "sqlalchemy_tenants_get_tenant"
+CREATE_TENANT_FUNCTION_NAME = "sqlalchemy_tenants_create_tenant"
+DELETE_TENANT_FUNCTION_NAME = "sqlalchemy_tenants_delete_tenant"
 
 _POLICY_NAME = "sqlalchemy_tenants_all"
+_INFO_RLS_TABLES = "sqlalchemy_tenants_rls_tables"
+_INFO_RLS_SORTED = "sqlalchemy_tenants_rls_sorted"
 _POLICY_TEMPLATE = """\
 CREATE POLICY {policy_name} 
-ON "{table_name}"
+ON {table}
 AS PERMISSIVE
 FOR ALL
 USING (
@@ -29,8 +56,6 @@ WITH CHECK (
 )
 """
 
-_ATTRIBUTE_RLS_ENABLED = "__rls_enabled__"
-_ATTRIBUTE_TENANT_COLUMN_TYPE = "__tenant_column_type__"
 
 _GET_TENANT_FUNCTION_TEMPLATE = """ \
 CREATE OR REPLACE FUNCTION {name}()
@@ -44,61 +69,628 @@ $$
 $$;
 """
 
+# Provision a tenant role in a single call, instead of a round trip per statement
+_CREATE_TENANT_FUNCTION_TEMPLATE = """\
+CREATE OR REPLACE FUNCTION {name}(
+    tenant_role text,
+    tenant_schemas text[],
+    owner_role text
+)
+    RETURNS boolean
+    LANGUAGE plpgsql
+    SECURITY INVOKER
+AS
+$$
+DECLARE
+    schema_name text;
+BEGIN
+    BEGIN
+        EXECUTE format('CREATE ROLE %I', tenant_role);
+    EXCEPTION WHEN duplicate_object THEN
+        RETURN false;
+    END;
+    EXECUTE format('GRANT %I TO %I', tenant_role, owner_role);
+    FOREACH schema_name IN ARRAY tenant_schemas LOOP
+        EXECUTE format(
+            'GRANT USAGE ON SCHEMA %I TO %I', schema_name, tenant_role
+        );
+        EXECUTE format(
+            'GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA %I TO %I',
+            schema_name,
+            tenant_role
+        );
+        EXECUTE format(
+            'ALTER DEFAULT PRIVILEGES IN SCHEMA %I '
+            'GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO %I',
+            schema_name,
+            tenant_role
+        );
+    END LOOP;
+    RETURN true;
+END
+$$;
+"""
+
+_DELETE_TENANT_FUNCTION_TEMPLATE = """\
+CREATE OR REPLACE FUNCTION {name}(tenant_role text, owner_role text)
+    RETURNS boolean
+    LANGUAGE plpgsql
+    SECURITY INVOKER
+AS
+$$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_roles WHERE rolname = tenant_role) THEN
+        RETURN false;
+    END IF;
+    EXECUTE format('REASSIGN OWNED BY %I TO %I', tenant_role, owner_role);
+    EXECUTE format('DROP OWNED BY %I', tenant_role);
+    EXECUTE format('DROP ROLE %I', tenant_role);
+    RETURN true;
+END
+$$;
+"""
+
+_RLS_STATUS_QUERY = """\
+SELECT
+    t.name,
+    c.oid IS NOT NULL,
+    coalesce(c.relrowsecurity, false),
+    p.policyname IS NOT NULL,
+    p.permissive,
+    p.cmd,
+    p.roles,
+    p.qual,
+    p.with_check,
+    format_type(to_regtype(t.sql_type), NULL),
+    EXISTS (SELECT 1 FROM pg_proc WHERE proname = :function_name)
+FROM unnest(CAST(:names AS text[]), CAST(:sql_types AS text[])) AS t(name, sql_type)
+LEFT JOIN pg_class AS c ON c.oid = to_regclass(t.name)
+LEFT JOIN pg_namespace AS n ON n.oid = c.relnamespace
+LEFT JOIN pg_policies AS p
+    ON p.schemaname = n.nspname
+    AND p.tablename = c.relname
+    AND p.policyname = :policy_name
+"""
+
+_SQL_TYPES = {str: "varchar", int: "integer", UUID: "uuid"}
+
+# Postgres truncates identifiers to 63 bytes
+_MAX_NAME_BYTES = 63
+_MAX_KEY_BYTES = _MAX_NAME_BYTES - len(TENANT_ROLE_PREFIX)
+
 TenantIdentifier = str | UUID | int
 
 
-def get_table_policy(*, table_name: str, column_type: Type[TenantIdentifier]) -> str:
+def _quote_table(table_name: str, schema_name: Optional[str]) -> str:
+    if schema_name:
+        return f'"{schema_name}"."{table_name}"'
+    return f'"{table_name}"'
+
+
+def _get_sql_type(column_type: Type[TenantIdentifier]) -> str:
+    sql_type = _SQL_TYPES.get(column_type)
+    if sql_type is None:
+        raise TypeError(f"Unknown column type {column_type}")  # pragma: no cover
+    return sql_type
+
+
+def get_table_policy(
+    *,
+    table_name: str,
+    column_type: Type[TenantIdentifier],
+    schema_name: Optional[str] = None,
+) -> str:
     """
-    Returns the SQL policy for a given table name.
+    Returns the SQL policy for a given table name, optionally qualified
+    with its schema.
     """
-    if column_type is str:
-        sql_type = "varchar"
-    elif column_type is int:
-        sql_type = "integer"
-    elif column_type is UUID:
-        sql_type = "uuid"
-    else:
-        raise TypeError(f"Unknown column type {column_type}")  # pragma: no cover
     policy = _POLICY_TEMPLATE.format(
-        table_name=table_name,
+        table=_quote_table(table_name, schema_name),
         get_tenant_fn=GET_TENANT_FUNCTION_NAME,
         policy_name=_POLICY_NAME,
-        sql_type=sql_type,
+        sql_type=_get_sql_type(column_type),
     )
     return normalize_whitespace(policy)
 
 
-def get_tenant_role_name(tenant: TenantIdentifier) -> str:
+class TenantCodec:
+    """
+    Convert tenant identifiers to the canonical key naming their role or schema,
+    and back.
+
+    With a `tenant_type`, identifiers are parsed into that type, so that `1` and
+    `"1"` are the same int tenant, and the tenants listed from the database
+    have that type. Without one, the key is the string of the identifier and
+    listed tenants are strings.
+
+    With `compact_uuid`, UUIDs are encoded in base32 (26 characters instead
+    of 36), leaving more room in the 63 bytes of a Postgres identifier. The RLS
+    policies cast the key to the type of the tenant column, so compact keys
+    can only name tenant schemas.
+    """
+
+    def __init__(
+        self,
+        tenant_type: Optional[Type[TenantIdentifier]] = None,
+        compact_uuid: bool = False,
+    ) -> None:
+        if tenant_type is not None and tenant_type not in TENANT_SUPPORTED_TYPES:
+            raise TypeError(f"Unsupported tenant type {tenant_type}")
+        if compact_uuid and tenant_type is not UUID:
+            raise ValueError("compact_uuid requires tenant_type=UUID")
+        self.tenant_type = tenant_type
+        self.compact_uuid = compact_uuid
+
+    def parse(self, tenant: TenantIdentifier) -> TenantIdentifier:
+        """Get the identifier with the type of the tenants."""
+        if self.tenant_type is None or isinstance(tenant, self.tenant_type):
+            return tenant
+        if self.tenant_type is int:
+            return int(tenant)
+        if self.tenant_type is UUID:
+            return UUID(str(tenant))
+        return str(tenant)
+
+    def encode(self, tenant: TenantIdentifier) -> str:
+        """
+        Get the canonical key of the tenant.
+
+        Raises:
+            ValueError: If the tenant can't be parsed, or the role name built
+                from the key would be truncated by Postgres.
+        """
+        tenant = self.parse(tenant)
+        if self.compact_uuid and isinstance(tenant, UUID):
+            key = base64.b32encode(tenant.bytes).decode().rstrip("=").lower()
+        else:
+            key = str(tenant)
+        if len(key.encode()) > _MAX_KEY_BYTES:
+            raise ValueError(
+                f"Tenant '{tenant}' is longer than {_MAX_KEY_BYTES} bytes, "
+                "Postgres would truncate its role name"
+            )
+        return key
+
+    def decode(self, key: str) -> TenantIdentifier:
+        """Get the tenant identifier from its canonical key."""
+        if self.tenant_type is int:
+            return int(key)
+        if self.tenant_type is UUID:
+            if self.compact_uuid:
+                padded = key.upper() + "=" * (-len(key) % 8)
+                return UUID(bytes=base64.b32decode(padded))
+            return UUID(key)
+        return key
+
+
+DEFAULT_TENANT_CODEC = TenantCodec()
+"""The codec using the string of the identifiers as their key."""
+
+
+def get_tenant_role_name(
+    tenant: TenantIdentifier, codec: TenantCodec = DEFAULT_TENANT_CODEC
+) -> str:
     """
     Get the Postgres role name for the given tenant.
 
     Args:
         tenant: the tenant slug.
+        codec: the codec giving the key of the tenant.
 
     Returns:
         The Postgres role name for the tenant.
     """
-    return f"{TENANT_ROLE_PREFIX}{str(tenant)}"
+    return f"{TENANT_ROLE_PREFIX}{codec.encode(tenant)}"
+
+
+def get_tenant_schema_name(
+    tenant: TenantIdentifier, codec: TenantCodec = DEFAULT_TENANT_CODEC
+) -> str:
+    """
+    Get the Postgres schema name for the given tenant, when each tenant
+    has its own schema.
+
+    Args:
+        tenant: the tenant slug.
+        codec: the codec giving the key of the tenant.
+
+    Returns:
+        The Postgres schema name for the tenant.
+
+    Raises:
+        ValueError: If Postgres would truncate the schema name.
+    """
+    name = f"{TENANT_SCHEMA_PREFIX}{codec.encode(tenant)}"
+    if len(name.encode()) > _MAX_NAME_BYTES:
+        raise ValueError(
+            f"Tenant '{tenant}' is too long, Postgres would truncate "
+            f"its schema name '{name}'"
+        )
+    return name
+
+
+@dataclass(frozen=True, eq=False)
+class RLSTable:
+    """
+    A table marked for RLS with `@with_rls`.
+    """
+
+    table: Table
+    column_type: Type[TenantIdentifier]
+    """The Python type of the tenant column."""
+
+    @cached_property
+    def qualified_name(self) -> str:
+        """The quoted, schema-qualified name of the table."""
+        return get_qualified_name(self.table)
+
+    @cached_property
+    def sql_type(self) -> str:
+        """The SQL type the current tenant is cast to by the policy."""
+        return _get_sql_type(self.column_type)
+
+    @cached_property
+    def policy(self) -> str:
+        """The SQL creating the RLS policy of the table."""
+        return get_table_policy(
+            table_name=self.table.name,
+            column_type=self.column_type,
+            schema_name=self.table.schema,
+        )
+
+
+class RLSRegistry:
+    """
+    The tables marked for RLS with `@with_rls`, by metadata.
+
+    The lookups only go through the RLS tables, however large the metadata is.
+    The RLS tables are kept in the `info` of their metadata, so they're collected
+    together with it and models defined on the fly (e.g. in tests) don't leak.
+    """
+
+    def register(self, table: Table, column_type: Type[TenantIdentifier]) -> RLSTable:
+        """Mark the table for RLS."""
+        rls_table = RLSTable(table=table, column_type=column_type)
+        info = table.metadata.info
+        info.setdefault(_INFO_RLS_TABLES, {})[table.key] = rls_table
+        info.pop(_INFO_RLS_SORTED, None)
+        return rls_table
+
+    def get(self, table: Table) -> Optional[RLSTable]:
+        """Get the RLS table, or None if the table is not marked for RLS."""
+        tables = table.metadata.info.get(_INFO_RLS_TABLES)
+        if tables is None:
+            return None
+        rls_table: Optional[RLSTable] = tables.get(table.key)
+        if rls_table is None:
+            return None
+        # The table may be an annotated copy (e.g. the table of an ORM insert):
+        # check that the registered table is still in the metadata instead
+        if table.metadata.tables.get(table.key) is not rls_table.table:
+            return None
+        return rls_table
+
+    def get_tables(self, metadata: MetaData) -> List[RLSTable]:
+        """
+        Get the RLS tables of the metadata, sorted by foreign key dependency
+        (parents first).
+        """
+        sorted_tables: Optional[List[RLSTable]] = metadata.info.get(_INFO_RLS_SORTED)
+        if sorted_tables is None:
+            tables: Dict[str, RLSTable] = metadata.info.get(_INFO_RLS_TABLES, {})
+            by_table = {id(t.table): t for t in tables.values()}
+            sorted_tables = [
+                by_table[id(t)]
+                for t in sort_tables([t.table for t in by_table.values()])
+            ]
+            metadata.info[_INFO_RLS_SORTED] = sorted_tables
+        # Tables removed from the metadata are not RLS tables anymore
+        return [t for t in sorted_tables if metadata.tables.get(t.table.key) is t.table]
+
+
+RLS_REGISTRY = RLSRegistry()
+"""The registry populated by `@with_rls`."""
+
+
+def is_rls_enabled(table: Table) -> bool:
+    """
+    Check whether the given table has been marked for RLS with `@with_rls`.
+    """
+    return RLS_REGISTRY.get(table) is not None
+
+
+def _get_rls_table(table: Table) -> RLSTable:
+    rls_table = RLS_REGISTRY.get(table)
+    if rls_table is None:
+        raise ValueError(f"Table '{table.name}' is not marked for RLS.")
+    return rls_table
+
+
+def coerce_tenant(tenant: TenantIdentifier, table: Table) -> TenantIdentifier:
+    """
+    Convert the tenant to the type of the tenant column of the table, e.g. a UUID
+    or an integer passed as a string.
+
+    Args:
+        tenant: the tenant identifier.
+        table: the RLS table.
+
+    Returns:
+        The tenant identifier, with the Python type of the tenant column.
+
+    Raises:
+        ValueError: If the tenant can't be converted.
+    """
+    python_type: Type[TenantIdentifier] = table.c.tenant.type.python_type
+    if isinstance(tenant, python_type):
+        return tenant
+    if python_type is str:
+        return str(tenant)
+    if isinstance(tenant, str):
+        try:
+            return python_type(tenant)
+        except (TypeError, ValueError):
+            pass
+    raise ValueError(
+        f"Tenant '{tenant}' can't be converted to the tenant column type "
+        f"of table '{table.name}'"
+    )
+
+
+def get_rls_tables(metadata: MetaData | Sequence[MetaData]) -> List[Table]:
+    """
+    Get all the tables marked for RLS in the given metadata.
+
+    Args:
+        metadata: one or more SQLAlchemy MetaData objects.
+
+    Returns:
+        The RLS tables, sorted by foreign key dependency (parents first).
+    """
+    meta_list = metadata if isinstance(metadata, Sequence) else [metadata]
+    if len(meta_list) == 1:
+        return [t.table for t in RLS_REGISTRY.get_tables(meta_list[0])]
+    tables = [t.table for m in meta_list for t in RLS_REGISTRY.get_tables(m)]
+    return sort_tables(tables)
+
+
+def get_tenant_rls_tables(
+    metadata: MetaData | Sequence[MetaData], *tenants: TenantIdentifier
+) -> List[Table]:
+    """
+    Get the RLS tables whose tenant column can hold all the given tenants, e.g.
+    only the UUID tables for a UUID tenant, also when passed as a string.
+
+    Args:
+        metadata: one or more SQLAlchemy MetaData objects.
+        tenants: the tenant identifiers.
+
+    Returns:
+        The RLS tables, sorted by foreign key dependency (parents first).
+
+    Raises:
+        ValueError: If no RLS table can hold the tenants.
+    """
+    tables = []
+    for table in get_rls_tables(metadata):
+        try:
+            for tenant in tenants:
+                coerce_tenant(tenant, table)
+        except ValueError:
+            continue
+        tables.append(table)
+    if not tables:
+        raise ValueError(
+            f"No RLS table has a tenant column that can hold tenant(s) "
+            f"{', '.join(repr(str(t)) for t in tenants)}"
+        )
+    return tables
+
+
+@dataclass(frozen=True)
+class RLSStatus:
+    """
+    The live RLS setup of a table marked with `@with_rls`.
+    """
+
+    table: str
+    """The quoted, schema-qualified name of the table."""
+    table_exists: bool
+    rls_enabled: bool
+    policy_exists: bool
+    policy_matches: bool
+    """Whether the policy is the one `get_table_policy` would create."""
+    function_exists: bool
+    """Whether the function returning the current tenant exists."""
+    live_policy: Optional[str]
+    """The SQL creating the live policy, if any."""
+
+    def get_issues(self) -> List[str]:
+        """Get the problems with the RLS setup of the table, if any."""
+        if not self.table_exists:
+            return [f"{self.table}: table does not exist"]
+        issues = []
+        if not self.function_exists:
+            issues.append(
+                f"{self.table}: function {GET_TENANT_FUNCTION_NAME} is missing"
+            )
+        if not self.rls_enabled:
+            issues.append(f"{self.table}: row level security is disabled")
+        if not self.policy_exists:
+            issues.append(f"{self.table}: policy {_POLICY_NAME} is missing")
+        elif not self.policy_matches:
+            issues.append(f"{self.table}: policy {_POLICY_NAME} is outdated")
+        return issues
+
+
+def _get_live_policy(
+    table: str,
+    permissive: str,
+    cmd: str,
+    roles: List[str],
+    qual: Optional[str],
+    with_check: Optional[str],
+) -> str:
+    quoted_roles = ", ".join(r if r == "public" else pg_quote(r) for r in roles)
+    policy = (
+        f"CREATE POLICY {_POLICY_NAME} ON {table} AS {permissive} FOR {cmd} "
+        f"TO {quoted_roles}"
+    )
+    if qual is not None:
+        policy += f" USING ({qual})"
+    if with_check is not None:
+        policy += f" WITH CHECK ({with_check})"
+    return policy
+
+
+def _is_expected_policy(
+    permissive: str,
+    cmd: str,
+    roles: List[str],
+    qual: Optional[str],
+    with_check: Optional[str],
+    sql_type: Optional[str],
+) -> bool:
+    # Postgres stores the policy expressions parsed, compare their canonical
+    # form, e.g. "(tenant = ( SELECT (fn())::uuid AS fn))"
+    if qual is None or qual != with_check or sql_type is None:
+        return False
+    cast = f"{GET_TENANT_FUNCTION_NAME}())::{sql_type} AS {GET_TENANT_FUNCTION_NAME})"
+    return (
+        permissive == "PERMISSIVE"
+        and cmd == "ALL"
+        and roles == ["public"]
+        and qual.lstrip("(").startswith("tenant")
+        and cast in qual
+    )
+
+
+def get_rls_status(conn: Connection, tables: Sequence[Table]) -> Dict[str, RLSStatus]:
+    """
+    Get the live RLS setup of the given tables, in a single query.
+
+    Args:
+        conn: the connection to the database.
+        tables: the tables marked for RLS.
+
+    Returns:
+        The status of each table, by quoted schema-qualified name.
+    """
+    if not tables:
+        return {}
+    rows = conn.execute(
+        text(_RLS_STATUS_QUERY),
+        {
+            "policy_name": _POLICY_NAME,
+            "function_name": GET_TENANT_FUNCTION_NAME,
+            "names": [get_qualified_name(t) for t in tables],
+            "sql_types": [_get_rls_table(t).sql_type for t in tables],
+        },
+    )
+    status = {}
+    for (
+        name,
+        table_exists,
+        rls_enabled,
+        policy_exists,
+        permissive,
+        cmd,
+        roles,
+        qual,
+        with_check,
+        sql_type,
+        fn_exists,
+    ) in rows:
+        status[name] = RLSStatus(
+            table=name,
+            table_exists=table_exists,
+            rls_enabled=rls_enabled,
+            policy_exists=policy_exists,
+            policy_matches=policy_exists
+            and _is_expected_policy(permissive, cmd, roles, qual, with_check, sql_type),
+            function_exists=fn_exists,
+            live_policy=(
+                _get_live_policy(name, permissive, cmd, roles, qual, with_check)
+                if policy_exists
+                else None
+            ),
+        )
+    return status
+
+
+def verify_rls(engine: Engine, metadata: MetaData | Sequence[MetaData]) -> List[str]:
+    """
+    Check that the tables marked for RLS are set up as the migrations
+    generated by `get_process_revision_directives` would, in a single round trip.
+
+    Run it at startup to detect missing migrations:
+
+    ```python
+    issues = verify_rls(engine, Base.metadata)
+    if issues:
+        raise RuntimeError("RLS is not set up: " + "; ".join(issues))
+    ```
+
+    With an `AsyncEngine`, run `get_rls_status` with `AsyncConnection.run_sync`.
+
+    Returns:
+        The problems found, empty if RLS is set up correctly.
+    """
+    tables = get_rls_tables(metadata)
+    with engine.connect() as conn:
+        status = get_rls_status(conn, tables)
+    return [issue for s in status.values() for issue in s.get_issues()]
+
+
+def _add_missing_functions(
+    conn: Connection, upgrade_ops: List[Any], downgrade_ops: List[Any]
+) -> None:
+    from alembic.operations import ops  # noqa: PLC0415
+
+    if not function_exists(conn, GET_TENANT_FUNCTION_NAME):
+        get_tenant_fn = _GET_TENANT_FUNCTION_TEMPLATE.format(
+            name=GET_TENANT_FUNCTION_NAME,
+            tenant_role_prefix=TENANT_ROLE_PREFIX,
+        )
+        upgrade_ops.append(ops.ExecuteSQLOp(get_tenant_fn))
+        downgrade_ops.insert(
+            0,
+            ops.ExecuteSQLOp(f"DROP FUNCTION IF EXISTS {GET_TENANT_FUNCTION_NAME}()"),
+        )
+    provisioning_functions = [
+        (
+            CREATE_TENANT_FUNCTION_NAME,
+            _CREATE_TENANT_FUNCTION_TEMPLATE,
+            "text, text[], text",
+        ),
+        (DELETE_TENANT_FUNCTION_NAME, _DELETE_TENANT_FUNCTION_TEMPLATE, "text, text"),
+    ]
+    for name, template, arg_types in provisioning_functions:
+        if function_exists(conn, name):
+            continue
+        upgrade_ops.append(ops.ExecuteSQLOp(template.format(name=name)))
+        downgrade_ops.append(
+            ops.ExecuteSQLOp(f"DROP FUNCTION IF EXISTS {name}({arg_types})")
+        )
 
 
 def get_process_revision_directives(
     metadata: MetaData | Sequence[MetaData],
 ) -> Callable[
     [
-        MigrationContext,
+        "MigrationContext",
         Union[str, Iterable[Optional[str]], Iterable[str]],
-        List[MigrationScript],
+        List["MigrationScript"],
     ],
     None,
 ]:
-    meta_list = metadata if isinstance(metadata, Sequence) else [metadata]
-    tables = [v for m in meta_list for v in m.tables.values()]
-
     def process_revision_directives(
-        context: MigrationContext,
+        context: "MigrationContext",
         revision: Union[str, Iterable[Optional[str]], Iterable[str]],
-        directives: List[MigrationScript],
+        directives: List["MigrationScript"],
     ) -> None:
+        from alembic.operations import ops  # noqa: PLC0415
+
         if not directives:
             return
         script = directives[0]
@@ -110,85 +702,39 @@ def get_process_revision_directives(
             raise RuntimeError("No connection available in the migration context.")
 
         # Check if required functions need to be created
-        if not function_exists(conn, GET_TENANT_FUNCTION_NAME):
-            get_tenant_fn = _GET_TENANT_FUNCTION_TEMPLATE.format(
-                name=GET_TENANT_FUNCTION_NAME,
-                tenant_role_prefix=TENANT_ROLE_PREFIX,
-            )
-            upgrade_ops.append(ops.ExecuteSQLOp(get_tenant_fn))
-            downgrade_ops.insert(
-                0,
-                ops.ExecuteSQLOp(
-                    f"DROP FUNCTION IF EXISTS {GET_TENANT_FUNCTION_NAME}()"
-                ),
-            )
-
-        # Check if RLS needs to be enabled on each table
-        for table in tables:
-            table_name = table.name
-            model = table.metadata.tables.get(table_name, None)
-
-            # Skip if not marked for RLS
-            if model is None or not getattr(model, _ATTRIBUTE_RLS_ENABLED, False):
-                continue
+        _add_missing_functions(conn, upgrade_ops, downgrade_ops)
 
-            # Check if RLS is already enabled
-            rls_enabled = conn.execute(
-                text(
-                    """
-                    SELECT relrowsecurity
-                    FROM pg_class
-                    WHERE oid = (
-                        SELECT oid
-                        FROM pg_class
-                        WHERE relname = :table_name
-                        LIMIT 1
-                    )
-                    """
-                ),
-                {"table_name": table_name},
-            ).scalar()
+        # Check RLS and policies of all the tables in a single query
+        rls_tables = get_rls_tables(metadata)
+        status = get_rls_status(conn, rls_tables)
+        for table in rls_tables:
+            table_status = status[get_qualified_name(table)]
+            quoted_table = _quote_table(table.name, table.schema)
 
-            if not rls_enabled:
+            if not table_status.rls_enabled:
                 upgrade_ops.append(
                     ops.ExecuteSQLOp(
-                        f'ALTER TABLE "{table_name}" ENABLE ROW LEVEL SECURITY'
+                        f"ALTER TABLE {quoted_table} ENABLE ROW LEVEL SECURITY"
                     )
                 )
                 downgrade_ops.insert(
                     0,
                     ops.ExecuteSQLOp(
-                        f'ALTER TABLE "{table_name}" DISABLE ROW LEVEL SECURITY'
+                        f"ALTER TABLE {quoted_table} DISABLE ROW LEVEL SECURITY"
                     ),
                 )
 
-            # Create policy
-            policy_name = "sqlalchemy_tenants_all"
-            policy = get_table_policy(
-                table_name=table_name,
-                column_type=getattr(model, _ATTRIBUTE_TENANT_COLUMN_TYPE),
-            )
-            exists = conn.execute(
-                text(
-                    """
-                    SELECT 1
-                    FROM pg_policy
-                    WHERE polname = :policy_name
-                      AND polrelid = (
-                        SELECT oid
-                        FROM pg_class
-                        WHERE relname = :table_name
-                        LIMIT 1
-                    )
-                    """
-                ),
-                {"policy_name": policy_name, "table_name": table_name},
-            ).fetchone()
-            if not exists:
-                upgrade_ops.append(ops.ExecuteSQLOp(policy))
-                downgrade_ops.insert(
-                    0, ops.ExecuteSQLOp(f'DROP POLICY {policy_name} ON "{table_name}"')
-                )
+            if table_status.policy_matches:
+                continue
+            drop_policy = f"DROP POLICY {_POLICY_NAME} ON {quoted_table}"
+            policy = _get_rls_table(table).policy
+            if table_status.live_policy is not None:
+                # The policy is outdated: drop it before the other operations,
+                # that may alter the tenant column it depends on
+                upgrade_ops.insert(0, ops.ExecuteSQLOp(drop_policy))
+                downgrade_ops.append(ops.ExecuteSQLOp(table_status.live_policy))
+            upgrade_ops.append(ops.ExecuteSQLOp(policy))
+            downgrade_ops.insert(0, ops.ExecuteSQLOp(drop_policy))
 
     return process_revision_directives
 
@@ -223,8 +769,10 @@ def with_rls(cls: Type[T]) -> Type[T]:
             f"of the following: {', '.join(map(str, TENANT_SUPPORTED_TYPES))}."
         )
 
-    setattr(cls.__table__, _ATTRIBUTE_RLS_ENABLED, True)
-    setattr(
-        cls.__table__, _ATTRIBUTE_TENANT_COLUMN_TYPE, tenant_column.type.python_type
-    )
+    table = cls.__table__
+    if not isinstance(table, Table):
+        raise TypeError(
+            f"@with_rls must be applied to a model mapped to a table, got: {table}"
+        )
+    RLS_REGISTRY.register(table, tenant_column.type.python_type)
     return cls
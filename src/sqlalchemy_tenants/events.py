@@ -0,0 +1,175 @@
+from typing import Any, Dict, List, Mapping, Optional, Tuple, cast
+
+from sqlalchemy import BindParameter, ClauseElement, Insert, Table, event, inspect
+from sqlalchemy.engine import Result
+from sqlalchemy.orm import Mapper, ORMExecuteState, Session, with_loader_criteria
+from sqlalchemy.orm.util import LoaderCriteriaOption
+
+from sqlalchemy_tenants.core import TenantIdentifier, coerce_tenant, is_rls_enabled
+from sqlalchemy_tenants.exceptions import TenantMismatch
+
+_TENANT_COLUMN = "tenant"
+
+
+def _coerce_tenant(tenant: TenantIdentifier, table: Table) -> Any:
+    try:
+        return coerce_tenant(tenant, table)
+    except ValueError:
+        return tenant
+
+
+def _check_tenant(tenant: Any, value: Any) -> None:
+    if value != tenant and str(value) != str(tenant):
+        raise TenantMismatch(expected=tenant, actual=value)
+
+
+def _get_rls_table(obj: Any) -> Optional[Table]:
+    return _get_mapper_rls_table(inspect(obj).mapper)
+
+
+def _get_mapper_rls_table(mapper: Mapper[Any]) -> Optional[Table]:
+    for table in mapper.tables:
+        if isinstance(table, Table) and is_rls_enabled(table):
+            return table
+    return None
+
+
+def _get_statement_rows(stmt: Insert) -> List[Dict[str, Any]]:
+    """
+    Get the rows explicitly provided with `insert().values(...)`,
+    keyed by column name.
+
+    Reads the private `Insert._values` and `Insert._multi_values`.
+    """
+    rows: List[Dict[Any, Any]] = [dict(stmt._values or {})]
+    rows.extend(r for multi in stmt._multi_values for r in multi if isinstance(r, dict))
+    return [{str(getattr(k, "key", k)): v for k, v in r.items()} for r in rows]
+
+
+def _get_rls_insert(state: ORMExecuteState) -> Optional[Tuple[Insert, Table]]:
+    stmt = state.statement
+    if not state.is_insert or not isinstance(stmt, Insert) or stmt.select is not None:
+        return None
+    table = stmt.table
+    if not isinstance(table, Table) or not is_rls_enabled(table):
+        return None
+    return stmt, table
+
+
+def _before_flush(session: Session, tenant: TenantIdentifier) -> None:
+    for obj in session.new:
+        table = _get_rls_table(obj)
+        if table is None:
+            continue
+        value = getattr(obj, _TENANT_COLUMN, None)
+        if value is None:
+            setattr(obj, _TENANT_COLUMN, _coerce_tenant(tenant, table))
+        else:
+            _check_tenant(tenant, value)
+    for obj in session.dirty:
+        if _get_rls_table(obj) is not None:
+            _check_tenant(tenant, getattr(obj, _TENANT_COLUMN))
+
+
+def _do_orm_execute(
+    state: ORMExecuteState, tenant: TenantIdentifier
+) -> Optional[Result[Any]]:
+    rls_insert = _get_rls_insert(state)
+    if rls_insert is None:
+        return None
+    stmt, table = rls_insert
+
+    stmt_rows = [r for r in _get_statement_rows(stmt) if _TENANT_COLUMN in r]
+    for stmt_row in stmt_rows:
+        # Only literal values can be checked client-side: multi-values rows
+        # keep the plain Python values
+        stmt_value = stmt_row[_TENANT_COLUMN]
+        if isinstance(stmt_value, BindParameter):
+            _check_tenant(tenant, stmt_value.value)
+        elif not isinstance(stmt_value, ClauseElement):
+            _check_tenant(tenant, stmt_value)
+    if stmt_rows:
+        return None
+
+    value = _coerce_tenant(tenant, table)
+    params = state.parameters
+    if not params:
+        state.statement = stmt.values({_TENANT_COLUMN: value})
+        return None
+    rows: List[Mapping[str, Any]] = (
+        list(params) if isinstance(params, list) else [cast(Mapping[str, Any], params)]
+    )
+    for row in rows:
+        if _TENANT_COLUMN in row:
+            _check_tenant(tenant, row[_TENANT_COLUMN])
+    if all(_TENANT_COLUMN in row for row in rows):
+        return None
+    new_rows = [{_TENANT_COLUMN: value, **row} for row in rows]
+    return state.invoke_statement(
+        params=new_rows if isinstance(params, list) else new_rows[0]
+    )
+
+
+def _tenant_criteria(mapper: Mapper[Any], tenant: Any) -> LoaderCriteriaOption:
+    # The tenant is a closure variable, so it's rendered as a bound parameter
+    # and the statement stays cacheable across tenants.
+    return with_loader_criteria(
+        mapper.class_,
+        lambda cls: cls.tenant == tenant,
+        include_aliases=True,
+    )
+
+
+def _add_tenant_criteria(state: ORMExecuteState, tenant: TenantIdentifier) -> None:
+    if not (state.is_select or state.is_update or state.is_delete):
+        return
+    if state.is_column_load or state.is_relationship_load:
+        return
+    options = []
+    for mapper in state.all_mappers:
+        table = _get_mapper_rls_table(mapper)
+        if table is None:
+            continue
+        options.append(_tenant_criteria(mapper, _coerce_tenant(tenant, table)))
+    if options:
+        state.statement = state.statement.options(*options)
+
+
+def listen_tenant_events(
+    session: Session,
+    tenant: TenantIdentifier,
+    inject_tenant_filter: bool = False,
+) -> None:
+    """
+    Register the session events that scope the ORM and Core writes of
+    the session to the given tenant.
+
+    On flush, the tenant column of new `@with_rls` objects is populated
+    with the session tenant when missing. On `insert()` statements
+    targeting `@with_rls` tables, the tenant column is added to the values
+    or parameters when missing.
+
+    In both cases a `TenantMismatch` error is raised when a different tenant
+    is provided, before any statement is sent to the database.
+
+    When `inject_tenant_filter` is True, an explicit `WHERE tenant = :tenant`
+    criteria is also added to every ORM SELECT, UPDATE and DELETE involving
+    `@with_rls` entities. RLS keeps enforcing the isolation, but the planner
+    sees a plain predicate that can use the indexes on the tenant column.
+
+    Args:
+        session: the session to register the events on.
+        tenant: the tenant the session is scoped to.
+        inject_tenant_filter: whether to add the tenant criteria to queries.
+    """
+
+    def before_flush(sess: Session, _flush_context: Any, _instances: Any) -> None:
+        _before_flush(sess, tenant)
+
+    def do_orm_execute(state: ORMExecuteState) -> Optional[Result[Any]]:
+        if inject_tenant_filter:
+            _add_tenant_criteria(state, tenant)
+        return _do_orm_execute(state, tenant)
+
+    event.listen(session, "before_flush", before_flush)
+    event.listen(session, "do_orm_execute", do_orm_execute)
@@ -1,3 +1,5 @@
+from typing import Any
+
 from sqlalchemy_tenants.core import TenantIdentifier
 
 
@@ -17,3 +19,26 @@ class TenantNotFound(SqlalchemyTenantErr):
 
     def __init__(self, tenant: TenantIdentifier) -> None:
         super().__init__(f"Tenant '{tenant}' not found.")
+
+
+class TenantMismatch(SqlalchemyTenantErr):
+    """Raised when writing data of a tenant from a session of another tenant."""
+
+    def __init__(self, expected: TenantIdentifier, actual: Any) -> None:
+        super().__init__(
+            f"Tenant '{actual}' does not match the session tenant '{expected}'."
+        )
+
+
+class TenantRelocationError(SqlalchemyTenantErr):
+    """Raised when a tenant can't be relocated to another database."""
+
+    def __init__(self, tenant: TenantIdentifier, reason: str) -> None:
+        super().__init__(f"Relocation of tenant '{tenant}' failed: {reason}.")
+
+
+class NoCurrentTenant(SqlalchemyTenantErr):
+    """Raised when no tenant is given and none is set in the current context."""
+
+    def __init__(self) -> None:
+        super().__init__("No tenant is set in the current context.")
@@ -0,0 +1,290 @@
+import json
+import logging
+import multiprocessing
+import os
+from argparse import Namespace
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from enum import Enum
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from alembic import command
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from sqlalchemy import NullPool, create_engine, make_url, text
+
+logger = logging.getLogger(__name__)
+
+TENANT_SCHEMA_X_ARGUMENT = "tenant_schema"
+
+_LOCK_KEY_PREFIX = "sqlalchemy_tenants_migration"
+_SYNC_DRIVER = "postgresql+psycopg"
+
+
+@dataclass(frozen=True)
+class MigrationTarget:
+    """
+    A database, or a schema of a database, to run the migrations on.
+    """
+
+    name: str
+    """A unique name for the target, used in the state and the report."""
+    url: Optional[str] = None
+    """The URL of the database, defaulting to `sqlalchemy.url` of the config."""
+    schema: Optional[str] = None
+    """The schema to migrate, passed to `env.py` as `-x tenant_schema=...`."""
+
+
+class MigrationStatus(str, Enum):
+    SUCCEEDED = "succeeded"
+    FAILED = "failed"
+    LOCKED = "locked"
+    """Another runner is migrating the same target."""
+    SKIPPED = "skipped"
+    """Already migrated to the revision by a previous run."""
+
+
+@dataclass(frozen=True)
+class MigrationProgress:
+    """
+    The progress of the migrations fanned out across targets, reported each
+    time a target is done.
+    """
+
+    target: str
+    status: MigrationStatus
+    completed: int
+    total: int
+    error: Optional[str] = None
+
+
+@dataclass
+class MigrationReport:
+    """
+    The outcome of running the migrations across many targets.
+    """
+
+    revision: str
+    statuses: Dict[str, MigrationStatus] = field(default_factory=dict)
+    errors: Dict[str, str] = field(default_factory=dict)
+
+    def get_targets(self, status: MigrationStatus) -> List[str]:
+        """Get the names of the targets with the given status."""
+        return sorted(n for n, s in self.statuses.items() if s is status)
+
+    @property
+    def ok(self) -> bool:
+        """Whether all the targets are at the revision."""
+        return all(
+            s in (MigrationStatus.SUCCEEDED, MigrationStatus.SKIPPED)
+            for s in self.statuses.values()
+        )
+
+    def summary(self) -> str:
+        """Get a human-readable summary of the run."""
+        lines = [f"Upgrade to {self.revision}:"]
+        for status in MigrationStatus:
+            lines.append(f"  {status.value}: {len(self.get_targets(status))}")
+        for name in self.get_targets(MigrationStatus.FAILED):
+            lines.append(f"  - {name}: {self.errors[name]}")
+        return "\n".join(lines)
+
+
+def get_migration_tenant_schema(config: Config) -> Optional[str]:
+    """
+    Get the tenant schema the migrations are running for, from the
+    `-x tenant_schema=...` argument.
+
+    Use it in `env.py` to configure the migration context for the tenant schema:
+
+    ```python
+    schema = get_migration_tenant_schema(context.config)
+    if schema is not None:
+        connection.execute(text(f'SET search_path TO "{schema}"'))
+        connection.dialect.default_schema_name = schema
+    context.configure(connection=connection, version_table_schema=schema, ...)
+    ```
+    """
+    x_args = getattr(config.cmd_opts, "x", None) or []
+    for arg in x_args:
+        key, _, value = str(arg).partition("=")
+        if key == TENANT_SCHEMA_X_ARGUMENT:
+            return value
+    return None
+
+
+def _get_lock_url(url: str) -> Any:
+    # The lock is held by the runner with a sync driver, whatever env.py uses
+    parsed = make_url(url)
+    if parsed.get_dialect().is_async:
+        parsed = parsed.set(drivername=_SYNC_DRIVER)
+    return parsed
+
+
+def _upgrade_target(
+    config_file: Optional[str],
+    ini_section: str,
+    options: Dict[str, str],
+    target: MigrationTarget,
+    revision: str,
+) -> MigrationStatus:
+    x_args = (
+        [] if target.schema is None else [f"{TENANT_SCHEMA_X_ARGUMENT}={target.schema}"]
+    )
+    config = Config(
+        file_=config_file,
+        ini_section=ini_section,
+        cmd_opts=Namespace(x=x_args),
+    )
+    for key, value in options.items():
+        config.set_main_option(key, value.replace("%", "%%"))
+    if target.url is not None:
+        config.set_main_option("sqlalchemy.url", target.url.replace("%", "%%"))
+
+    url = config.get_main_option("sqlalchemy.url")
+    if not url:
+        raise ValueError(f"No database URL for target '{target.name}'.")
+    lock_key = f"{_LOCK_KEY_PREFIX}:{target.schema or ''}"
+    engine = create_engine(_get_lock_url(url), poolclass=NullPool)
+    try:
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            locked = conn.execute(
+                text("SELECT pg_try_advisory_lock(hashtext(:key))"), {"key": lock_key}
+            ).scalar()
+            if not locked:
+                return MigrationStatus.LOCKED
+            try:
+                command.upgrade(config, revision)
+            finally:
+                conn.execute(
+                    text("SELECT pg_advisory_unlock(hashtext(:key))"),
+                    {"key": lock_key},
+                )
+    finally:
+        engine.dispose()
+    return MigrationStatus.SUCCEEDED
+
+
+class MigrationRunner:
+    """
+    Run Alembic upgrades across many targets (databases or tenant schemas)
+    concurrently.
+
+    - Alembic keeps the migration context in process-wide globals, so each target
+      is upgraded by a separate worker process.
+    - Each target is locked with a Postgres advisory lock while it's being
+      upgraded, so concurrent runners (e.g. two deploys) skip it instead of
+      running the same migrations twice.
+    - A failure on a target doesn't stop the others.
+    - When `state_path` is given, the outcome of each target is saved there as
+      soon as it's known, and the targets already upgraded to the same revision
+      are skipped by the next runs, so an interrupted run can be resumed.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        max_workers: int = 4,
+        state_path: Optional[str | Path] = None,
+        on_progress: Optional[Callable[[MigrationProgress], None]] = None,
+    ) -> None:
+        self.config = config
+        self.max_workers = max_workers
+        self.state_path = Path(state_path) if state_path is not None else None
+        self.on_progress = on_progress
+
+    def _resolve_revision(self, revision: str) -> str:
+        script = ScriptDirectory.from_config(self.config)
+        resolved = script.as_revision_number(revision)
+        if isinstance(resolved, tuple):
+            return ",".join(resolved)
+        return resolved or revision
+
+    def _load_state(self, revision: str) -> Dict[str, str]:
+        if self.state_path is None or not self.state_path.exists():
+            return {}
+        state = json.loads(self.state_path.read_text())
+        if state.get("revision") != revision:
+            return {}
+        return dict(state.get("targets", {}))
+
+    def _save_state(self, report: MigrationReport) -> None:
+        if self.state_path is None:
+            return
+        state = {
+            "revision": report.revision,
+            "targets": {n: s.value for n, s in report.statuses.items()},
+        }
+        tmp_path = self.state_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state, indent=2))
+        os.replace(tmp_path, self.state_path)
+
+    def _report_progress(
+        self,
+        report: MigrationReport,
+        name: str,
+        total: int,
+    ) -> None:
+        self._save_state(report)
+        if self.on_progress is not None:
+            self.on_progress(
+                MigrationProgress(
+                    target=name,
+                    status=report.statuses[name],
+                    completed=len(report.statuses),
+                    total=total,
+                    error=report.errors.get(name),
+                )
+            )
+
+    def upgrade(
+        self, targets: Sequence[MigrationTarget], revision: str = "head"
+    ) -> MigrationReport:
+        """
+        Upgrade all the targets to the given revision.
+
+        Returns:
+            The report with the status of each target.
+        """
+        report = MigrationReport(revision=self._resolve_revision(revision))
+        done = self._load_state(report.revision)
+        pending: List[MigrationTarget] = []
+        for target in targets:
+            if done.get(target.name) in (
+                MigrationStatus.SUCCEEDED.value,
+                MigrationStatus.SKIPPED.value,
+            ):
+                report.statuses[target.name] = MigrationStatus.SKIPPED
+                self._report_progress(report, target.name, len(targets))
+            else:
+                pending.append(target)
+
+        options = dict(self.config.get_section(self.config.config_ini_section) or {})
+        with ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _upgrade_target,
+                    self.config.config_file_name,
+                    self.config.config_ini_section,
+                    options,
+                    target,
+                    revision,
+                ): target
+                for target in pending
+            }
+            for future in as_completed(futures):
+                name = futures[future].name
+                error = future.exception()
+                if error is None:
+                    report.statuses[name] = future.result()
+                else:
+                    logger.error("upgrade of %s failed: %r", name, error)
+                    report.statuses[name] = MigrationStatus.FAILED
+                    report.errors[name] = repr(error)
+                self._report_progress(report, name, len(targets))
+        logger.info(report.summary())
+        return report
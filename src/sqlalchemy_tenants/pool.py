@@ -0,0 +1,158 @@
+from enum import Enum
+from typing import TYPE_CHECKING, Any, Dict
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import Connection, Engine, event
+from sqlalchemy.pool import NullPool, PoolProxiedConnection, PoolResetState
+
+if TYPE_CHECKING:
+    from sqlalchemy.ext.asyncio import AsyncConnection
+
+_INFO_PREFIX = "sqlalchemy_tenants_"
+_INFO_ROLE_SET_KEY = "sqlalchemy_tenants_role_set"
+_IDLE = 0
+"""The libpq status of a connection outside of a transaction."""
+
+_installed: "WeakKeyDictionary[Engine, RoleResetMode]" = WeakKeyDictionary()
+
+
+class RoleResetMode(str, Enum):
+    """
+    How a pooled connection that ran a tenant session is cleaned up when it's
+    returned to the pool.
+    """
+
+    RESET_ROLE = "reset_role"
+    """Switch back to the role of the engine (default)."""
+
+    DISCARD_ALL = "discard_all"
+    """
+    Reset the whole session state: role, settings, prepared statements and
+    temporary tables. Prepared statements have to be prepared again by the
+    next sessions.
+    """
+
+
+_STATEMENTS: Dict[RoleResetMode, str] = {
+    RoleResetMode.RESET_ROLE: "RESET ROLE",
+    RoleResetMode.DISCARD_ALL: "DISCARD ALL",
+}
+_NON_TRANSACTIONAL_STATEMENTS = {"DISCARD ALL"}
+"""The statements that can't run in a transaction block."""
+
+
+def mark_role_set(
+    connection: "Connection | AsyncConnection | PoolProxiedConnection",
+) -> None:
+    """
+    Record that a tenant role is set on the connection, so that it's reset
+    when the connection is returned to the pool.
+    """
+    connection.info[_INFO_ROLE_SET_KEY] = True
+
+
+def install_role_reset(
+    engine: Engine, mode: RoleResetMode = RoleResetMode.RESET_ROLE
+) -> None:
+    """
+    Reset the tenant role of the connections returned to the pool of the engine,
+    so that the next sessions, including admin ones, don't inherit it.
+
+    Only the connections marked by `mark_role_set` are reset, rolling back the
+    transaction left open, if any: connections used by admin sessions only are
+    returned as they are.
+
+    Args:
+        engine: The engine of the tenant sessions.
+        mode: How the connections are reset.
+
+    Raises:
+        ValueError: If the engine already resets the roles with another mode.
+    """
+    installed = _installed.get(engine)
+    if installed is not None:
+        if installed is not mode:
+            raise ValueError(
+                f"The engine already resets the tenant roles with {installed.value}"
+            )
+        return
+    _installed[engine] = mode
+    if isinstance(engine.pool, NullPool):
+        # Connections are closed on return, with the role
+        return
+    statement = _STATEMENTS[mode]
+    is_asyncpg = engine.dialect.driver == "asyncpg"
+
+    @event.listens_for(engine, "reset")
+    def _reset(
+        dbapi_connection: Any, connection_record: Any, reset_state: PoolResetState
+    ) -> None:
+        info = connection_record.info
+        if not info.pop(_INFO_ROLE_SET_KEY, False):
+            return
+        if reset_state.terminate_only or not reset_state.asyncio_safe:
+            # The connection is discarded, and its role with it
+            return
+        reset_connection(dbapi_connection, statement, reset_state, is_asyncpg)
+        if mode is RoleResetMode.DISCARD_ALL:
+            _forget_session_state(dbapi_connection, info)
+
+
+def reset_connection(
+    dbapi_connection: Any,
+    statement: str,
+    reset_state: PoolResetState,
+    is_asyncpg: bool,
+) -> None:
+    """
+    Run a statement resetting the session state of a connection returned to
+    the pool, from a `reset` pool event, after rolling back the transaction
+    left open, if any.
+    """
+    if is_asyncpg:
+        _reset_asyncpg(dbapi_connection, statement, reset_state)
+    else:
+        _reset_dbapi(dbapi_connection, statement)
+
+
+def _reset_dbapi(dbapi_connection: Any, statement: str) -> None:
+    driver = getattr(dbapi_connection, "driver_connection", dbapi_connection)
+    status = driver.info.transaction_status
+    cursor = dbapi_connection.cursor()
+    try:
+        if status != _IDLE:
+            if statement not in _NON_TRANSACTIONAL_STATEMENTS:
+                # Without parameters, both statements are sent in one round trip
+                cursor.execute(f"ROLLBACK; {statement}")
+                return
+            # Statements sent together run in an implicit transaction block
+            dbapi_connection.rollback()
+        # Outside of a transaction, don't let the driver begin one first
+        autocommit = dbapi_connection.autocommit
+        dbapi_connection.autocommit = True
+        try:
+            cursor.execute(statement)
+        finally:
+            dbapi_connection.autocommit = autocommit
+    finally:
+        cursor.close()
+
+
+def _reset_asyncpg(
+    dbapi_connection: Any, statement: str, reset_state: PoolResetState
+) -> None:
+    if not reset_state.transaction_was_reset:
+        # The adapter tracks its transaction, it must end it itself
+        dbapi_connection.rollback()
+    # Sent as a simple query, outside of the prepared statement cache
+    dbapi_connection.await_(dbapi_connection.driver_connection.execute(statement))
+
+
+def _forget_session_state(dbapi_connection: Any, info: Dict[str, Any]) -> None:
+    # The search path and the prepared statements tracked for the connection
+    # were discarded with the rest of the session state
+    for key in [k for k in info if k.startswith(_INFO_PREFIX)]:
+        del info[key]
+    cache = getattr(dbapi_connection, "_prepared_statement_cache", None)
+    if cache is not None:
+        cache.clear()
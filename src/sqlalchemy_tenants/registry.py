@@ -0,0 +1,112 @@
+from typing import Any, Optional
+from uuid import UUID
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    MetaData,
+    Select,
+    String,
+    Table,
+    bindparam,
+    column,
+    delete,
+    func,
+    literal,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.dialects.postgresql import JSONB, insert
+
+from sqlalchemy_tenants.core import TENANT_ROLE_PREFIX, TenantIdentifier
+
+REGISTRY_TABLE_NAME = "sqlalchemy_tenants_registry"
+
+_KEY_TYPES = {str: "str", int: "int", UUID: "uuid"}
+
+_pg_roles = table("pg_roles", column("rolname", String))
+
+
+def get_registry_table(
+    metadata: Optional[MetaData] = None,
+    table_name: str = REGISTRY_TABLE_NAME,
+    schema: Optional[str] = None,
+) -> Table:
+    """
+    Get the definition of the table recording the tenants of a database.
+
+    Pass your own metadata to have the table managed by your migrations.
+    """
+    return Table(
+        table_name,
+        metadata if metadata is not None else MetaData(),
+        Column("tenant", String, primary_key=True),
+        Column("key_type", String, nullable=False),
+        Column(
+            "created_at",
+            DateTime(timezone=True),
+            nullable=False,
+            server_default=func.now(),
+            index=True,
+        ),
+        Column(
+            "metadata",
+            JSONB,
+            nullable=False,
+            server_default=text("'{}'::jsonb"),
+        ),
+        schema=schema,
+    )
+
+
+def get_key_type(tenant: TenantIdentifier) -> str:
+    """Get the name of the type of the tenant identifier, stored in the registry."""
+    try:
+        return _KEY_TYPES[type(tenant)]
+    except KeyError:
+        raise TypeError(f"Unsupported tenant identifier type: {type(tenant)}.")
+
+
+def parse_tenant(key: str, key_type: str) -> TenantIdentifier:
+    """Get the tenant identifier stored in the registry, with its original type."""
+    if key_type == "int":
+        return int(key)
+    if key_type == "uuid":
+        return UUID(key)
+    return key
+
+
+class RegistryStatements:
+    """The statements reading and updating a registry table."""
+
+    def __init__(self, registry: Table) -> None:
+        c = registry.c
+        self.insert = insert(registry).on_conflict_do_nothing(index_elements=[c.tenant])
+        self.delete = delete(registry).where(c.tenant == bindparam("tenant"))
+        self.exists = select(literal(1)).where(c.tenant == bindparam("tenant"))
+        self.count = select(func.count()).select_from(registry)
+        self.list = select(c.tenant, c.key_type)
+        # Record the roles created before the registry, whose type is unknown
+        self.backfill = (
+            insert(registry)
+            .from_select(
+                ["tenant", "key_type"],
+                select(
+                    func.substr(_pg_roles.c.rolname, len(TENANT_ROLE_PREFIX) + 1),
+                    literal("str"),
+                ).where(_pg_roles.c.rolname.startswith(TENANT_ROLE_PREFIX)),
+            )
+            .on_conflict_do_nothing(index_elements=[c.tenant])
+            .returning(c.tenant)
+        )
+
+    def get_insert_params(self, tenant: TenantIdentifier, key: str) -> Any:
+        return {"tenant": key, "key_type": get_key_type(tenant)}
+
+    def get_page(self, limit: int, after: Optional[str] = None) -> Select[Any]:
+        """Get the tenants following the key `after`, in the order of their key."""
+        stmt = self.list.order_by(self.list.selected_columns.tenant).limit(limit)
+        if after is not None:
+            stmt = stmt.where(self.list.selected_columns.tenant > after)
+        return stmt
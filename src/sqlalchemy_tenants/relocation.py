@@ -0,0 +1,516 @@
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import (
+    Column,
+    Connection,
+    Engine,
+    Integer,
+    MetaData,
+    Table,
+    and_,
+    bindparam,
+    exists,
+    select,
+    text,
+)
+from sqlalchemy.dialects import postgresql
+
+from sqlalchemy_tenants.core import (
+    TenantIdentifier,
+    coerce_tenant,
+    get_tenant_rls_tables,
+    get_tenant_role_name,
+)
+from sqlalchemy_tenants.exceptions import TenantAlreadyExists, TenantRelocationError
+from sqlalchemy_tenants.managers import PostgresManager
+from sqlalchemy_tenants.utils import get_qualified_name, pg_quote
+
+logger = logging.getLogger(__name__)
+
+_CHECKSUM_TEMPLATE = """\
+SELECT
+    count(*),
+    coalesce(sum(('x' || substr(md5(t::text), 1, 16))::bit(64)::bigint), 0)
+FROM {table} AS t
+WHERE t.tenant = :tenant
+"""
+
+_MARK_QUERY = """\
+SELECT least(now(), min(xact_start))
+FROM pg_stat_activity
+WHERE datname = current_database() AND pid <> pg_backend_pid()
+"""
+
+_ACTIVE_BEFORE_QUERY = """\
+SELECT count(*)
+FROM pg_stat_activity
+WHERE datname = current_database()
+  AND pid <> pg_backend_pid()
+  AND xact_start < :before
+"""
+
+_ROLE_SHARED_QUERY = """\
+SELECT EXISTS (
+    SELECT 1
+    FROM pg_shdepend AS d
+    JOIN pg_database AS db ON db.oid = d.dbid
+    JOIN pg_roles AS r ON r.oid = d.refobjid
+    WHERE r.rolname = :role AND db.datname <> current_database()
+)
+"""
+
+_SYNC_SEQUENCE_TEMPLATE = """\
+SELECT setval(seq, greatest((SELECT max({column}) FROM {table}), nextval(seq)))
+FROM pg_get_serial_sequence(:table, :column) AS seq
+WHERE seq IS NOT NULL
+"""
+
+
+@dataclass(frozen=True)
+class TableChecksum:
+    """
+    An order-independent checksum of the rows of a tenant in a table.
+    """
+
+    rows: int
+    checksum: int
+
+
+@dataclass
+class RelocationReport:
+    """
+    The outcome of a tenant relocation.
+    """
+
+    tenant: TenantIdentifier
+    copied: Dict[str, int] = field(default_factory=dict)
+    """The number of rows copied by the initial copy, for each table."""
+    caught_up: Dict[str, int] = field(default_factory=dict)
+    """The number of rows copied while catching up, for each table."""
+    deleted: Dict[str, int] = field(default_factory=dict)
+    """The number of rows deleted from the source during the copy, for each table."""
+    checksums: Dict[str, TableChecksum] = field(default_factory=dict)
+    """The verified checksum of each table."""
+
+
+class _Throttle:
+    """A token bucket limiting the bytes per second shared by all the copies."""
+
+    def __init__(self, rate: Optional[int]) -> None:
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._allowance = float(rate or 0)
+        self._last = time.monotonic()
+
+    def consume(self, size: int) -> None:
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                float(self.rate), self._allowance + (now - self._last) * self.rate
+            )
+            self._last = now
+            self._allowance -= size
+            wait = -self._allowance / self.rate if self._allowance < 0 else 0.0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _get_dependency_levels(tables: Sequence[Table]) -> List[List[Table]]:
+    """
+    Group the tables (sorted by dependency) in levels, so that the tables of
+    each level only reference tables of the previous levels.
+    """
+    levels: Dict[Table, int] = {}
+    for table in tables:
+        parents = [
+            fk.column.table
+            for fk in table.foreign_keys
+            if fk.column.table in levels and fk.column.table is not table
+        ]
+        levels[table] = 1 + max((levels[p] for p in parents), default=-1)
+    grouped: List[List[Table]] = [
+        [] for _ in range(max(levels.values(), default=-1) + 1)
+    ]
+    for table, level in levels.items():
+        grouped[level].append(table)
+    return grouped
+
+
+class TenantRelocator:
+    """
+    Move the data of a tenant from a database to another without downtime.
+
+    The relocation works as follows:
+
+    1. The tenant is created on the target database, and the rows of all the RLS
+       tables are streamed from the source with `COPY`, copying in parallel the
+       tables that don't depend on each other.
+    2. When a change-tracking column is provided (e.g. an `updated_at` timestamp
+       set on every write), the rows changed during the copy are upserted
+       while the tenant keeps writing to the source.
+    3. The writes of the tenant on the source are frozen by revoking the write
+       privileges of its role, and the remaining changes are upserted. Tables
+       without the change-tracking column are entirely upserted at this stage.
+       The rows deleted from the source in the meantime are deleted from the
+       target by primary key.
+    4. The checksums of each table are compared, the sequences of the target
+       are moved past the copied ids, then `switch` is called to route the
+       tenant to the target database.
+
+    If anything fails before the switch, the tenant writes on the source are
+    restored.
+
+    Requires the `psycopg` driver on both engines.
+    """
+
+    def __init__(
+        self,
+        source: PostgresManager,
+        target: PostgresManager,
+        metadata: MetaData | Sequence[MetaData],
+        updated_at_column: Optional[str] = None,
+        max_workers: int = 4,
+        max_bytes_per_second: Optional[int] = None,
+        freeze_timeout: float = 30.0,
+    ) -> None:
+        self.source = source
+        self.target = target
+        self.metadata = metadata
+        self.updated_at_column = updated_at_column
+        self.max_workers = max_workers
+        self.freeze_timeout = freeze_timeout
+        self._throttle = _Throttle(max_bytes_per_second)
+
+    def relocate(
+        self,
+        tenant: TenantIdentifier,
+        switch: Optional[Callable[[], None]] = None,
+        drop_source: bool = False,
+    ) -> RelocationReport:
+        """
+        Relocate the tenant from the source to the target database.
+
+        Any data of the tenant already present on the target database is deleted
+        first, so a failed relocation can simply be retried.
+
+        Args:
+            tenant: The identifier of the tenant to relocate.
+            switch: Called to route the tenant to the target database, once the
+                data has been verified and while the writes are still frozen.
+            drop_source: Whether to delete the data and the role of the tenant
+                from the source after the switch. Otherwise, they are kept with
+                the writes revoked. The role is kept when it is still used by
+                another database of the same cluster.
+
+        Returns:
+            A report with the copied rows and the verified checksums.
+
+        Raises:
+            ValueError: If no RLS table can hold the tenant.
+            TenantRelocationError: If the checksums don't match, or the writes
+                can't be frozen within the timeout.
+        """
+        logger.info("relocating tenant %s", tenant)
+        tables = get_tenant_rls_tables(self.metadata, tenant)
+        report = RelocationReport(tenant=tenant)
+        self._create_target_tenant(tenant)
+        self._clear(self.target.engine, tenant, tables)
+
+        mark = self._get_mark()
+        report.copied = self._copy_tables(tenant, tables)
+        # Catch up while the tenant keeps writing, to keep the freeze short
+        tracked = [t for t in tables if self._is_tracked(t)]
+        mark, changes = self._catch_up(tenant, tracked, since=mark)
+        report.caught_up.update(changes)
+
+        self._freeze(tenant)
+        try:
+            _, changes = self._catch_up(tenant, tables, since=mark)
+            report.caught_up.update(changes)
+            report.deleted = self._delete_missing(tenant, tables)
+            report.checksums = self._verify(tenant, tables)
+            self._sync_sequences(tables)
+            if switch is not None:
+                switch()
+        except BaseException:
+            self._unfreeze(tenant)
+            raise
+
+        if drop_source:
+            self._drop_source(tenant, tables)
+        logger.info("tenant %s relocated", tenant)
+        return report
+
+    def _create_target_tenant(self, tenant: TenantIdentifier) -> None:
+        try:
+            self.target.create_tenant(tenant)
+        except TenantAlreadyExists:
+            # Roles are shared by the databases of the same cluster
+            with self.target.new_session() as sess:
+                role = get_tenant_role_name(tenant, self.target.tenant_codec)
+                self.target._grant_privileges(sess, role)
+                sess.commit()
+
+    def _drop_source(self, tenant: TenantIdentifier, tables: Sequence[Table]) -> None:
+        self._clear(self.source.engine, tenant, tables)
+        role = get_tenant_role_name(tenant, self.source.tenant_codec)
+        with self.source.engine.begin() as conn:
+            shared = conn.execute(
+                text(_ROLE_SHARED_QUERY).bindparams(role=role)
+            ).scalar_one()
+            if shared:
+                conn.execute(text(f"DROP OWNED BY {pg_quote(role)}"))
+        if not shared:
+            self.source.delete_tenant(tenant)
+
+    def _is_tracked(self, table: Table) -> bool:
+        return (
+            self.updated_at_column is not None
+            and self.updated_at_column in table.c
+            and len(table.primary_key.columns) > 0
+        )
+
+    def _get_mark(self) -> datetime:
+        # Changes committed after the mark may have started before it,
+        # so the mark is the start of the oldest running transaction.
+        with self.source.engine.connect() as conn:
+            mark: datetime = conn.execute(text(_MARK_QUERY)).scalar_one()
+        return mark
+
+    def _tenant_query(
+        self,
+        table: Table,
+        tenant: TenantIdentifier,
+        since: Optional[datetime] = None,
+        columns: Optional[Sequence[Column[Any]]] = None,
+    ) -> str:
+        query = select(*(columns or table.columns)).where(
+            table.c.tenant == coerce_tenant(tenant, table)
+        )
+        if since is not None and self.updated_at_column is not None:
+            query = query.where(table.c[self.updated_at_column] >= since)
+        compiled = query.compile(
+            dialect=postgresql.dialect(),  # type: ignore[no-untyped-call]
+            compile_kwargs={"literal_binds": True},
+        )
+        return str(compiled)
+
+    def _copy_into(self, target_conn: Connection, table: Table, query: str) -> int:
+        """Stream the rows returned by the query on the source into the table."""
+        columns = ", ".join(pg_quote(c.name) for c in table.columns)
+        copy_out = f"COPY ({query}) TO STDOUT (FORMAT BINARY)"
+        copy_in = (
+            f"COPY {get_qualified_name(table)} ({columns}) FROM STDIN (FORMAT BINARY)"
+        )
+        with self.source.engine.connect() as source_conn:
+            source_cur = _cursor(source_conn)
+            target_cur = _cursor(target_conn)
+            with source_cur.copy(copy_out) as out, target_cur.copy(copy_in) as into:
+                for data in out:
+                    self._throttle.consume(len(data))
+                    into.write(data)
+            return int(target_cur.rowcount)
+
+    def _copy_table(self, tenant: TenantIdentifier, table: Table) -> int:
+        with self.target.engine.begin() as conn:
+            return self._copy_into(conn, table, self._tenant_query(table, tenant))
+
+    def _copy_tables(
+        self, tenant: TenantIdentifier, tables: Sequence[Table]
+    ) -> Dict[str, int]:
+        copied: Dict[str, int] = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for level in _get_dependency_levels(tables):
+                counts = executor.map(lambda t: self._copy_table(tenant, t), level)
+                copied.update(zip((t.fullname for t in level), counts))
+        return copied
+
+    def _catch_up(
+        self, tenant: TenantIdentifier, tables: Sequence[Table], since: datetime
+    ) -> Tuple[datetime, Dict[str, int]]:
+        """
+        Copy the rows changed since the given mark. The tables without the
+        change-tracking column are copied entirely.
+
+        Returns:
+            The mark to use for the next catch-up, and the copied rows.
+        """
+        mark = self._get_mark()
+        changes: Dict[str, int] = {}
+        with self.target.engine.begin() as conn:
+            for table in tables:
+                if not table.primary_key.columns:
+                    conn.execute(
+                        table.delete().where(
+                            table.c.tenant == coerce_tenant(tenant, table)
+                        )
+                    )
+                    query = self._tenant_query(table, tenant)
+                    changes[table.fullname] = self._copy_into(conn, table, query)
+                    continue
+                query = self._tenant_query(
+                    table, tenant, since=since if self._is_tracked(table) else None
+                )
+                changes[table.fullname] = self._upsert(conn, table, query)
+        return mark, changes
+
+    def _upsert(self, conn: Connection, table: Table, query: str) -> int:
+        staging = _get_staging_table(table, list(table.columns))
+        staging.create(conn)
+        count = self._copy_into(conn, staging, query)
+        if count:
+            stmt = postgresql.insert(table).from_select(
+                [c.name for c in table.columns], select(*staging.columns)
+            )
+            pk = list(table.primary_key.columns)
+            values = {
+                c.name: stmt.excluded[c.name]
+                for c in table.columns
+                if not c.primary_key
+            }
+            conn.execute(
+                stmt.on_conflict_do_update(index_elements=pk, set_=values)
+                if values
+                else stmt.on_conflict_do_nothing(index_elements=pk)
+            )
+        staging.drop(conn)
+        return count
+
+    def _delete_missing(
+        self, tenant: TenantIdentifier, tables: Sequence[Table]
+    ) -> Dict[str, int]:
+        """
+        Delete from the target the rows whose primary key is not on the source
+        anymore, children first. The writes of the tenant must be frozen.
+
+        Returns:
+            The deleted rows, for each table.
+        """
+        deleted: Dict[str, int] = {}
+        with self.target.engine.begin() as conn:
+            for table in reversed(tables):
+                pk = list(table.primary_key.columns)
+                if not pk:
+                    # Already copied again entirely
+                    continue
+                keys = _get_staging_table(table, pk)
+                keys.create(conn)
+                self._copy_into(
+                    conn, keys, self._tenant_query(table, tenant, columns=pk)
+                )
+                missing = ~exists().where(and_(*(keys.c[c.name] == c for c in pk)))
+                result = conn.execute(
+                    table.delete().where(
+                        table.c.tenant == coerce_tenant(tenant, table), missing
+                    )
+                )
+                keys.drop(conn)
+                deleted[table.fullname] = result.rowcount
+        return deleted
+
+    @staticmethod
+    def _clear(
+        engine: Engine, tenant: TenantIdentifier, tables: Sequence[Table]
+    ) -> None:
+        with engine.begin() as conn:
+            for table in reversed(tables):
+                conn.execute(
+                    table.delete().where(table.c.tenant == coerce_tenant(tenant, table))
+                )
+
+    def _grant_writes(self, tenant: TenantIdentifier, grant: bool) -> None:
+        role = pg_quote(get_tenant_role_name(tenant, self.source.tenant_codec))
+        schema = ", ".join(pg_quote(s) for s in self.source.schemas)
+        sql = (
+            f"GRANT INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA {schema} TO {role}"
+            if grant
+            else f"REVOKE INSERT, UPDATE, DELETE ON ALL TABLES IN SCHEMA {schema} "
+            f"FROM {role}"
+        )
+        with self.source.engine.begin() as conn:
+            conn.execute(text(sql))
+
+    def _freeze(self, tenant: TenantIdentifier) -> None:
+        logger.info("freezing writes of tenant %s", tenant)
+        self._grant_writes(tenant, grant=False)
+        with self.source.engine.connect() as conn:
+            frozen_at = conn.execute(text("SELECT clock_timestamp()")).scalar_one()
+            conn.commit()
+            # Wait for the transactions started before the freeze
+            deadline = time.monotonic() + self.freeze_timeout
+            query = text(_ACTIVE_BEFORE_QUERY).bindparams(before=frozen_at)
+            while conn.execute(query).scalar_one() > 0:
+                conn.commit()
+                if time.monotonic() > deadline:
+                    self._unfreeze(tenant)
+                    raise TenantRelocationError(
+                        tenant, "timed out waiting for running transactions"
+                    )
+                time.sleep(0.1)
+
+    def _unfreeze(self, tenant: TenantIdentifier) -> None:
+        logger.info("restoring writes of tenant %s", tenant)
+        self._grant_writes(tenant, grant=True)
+
+    def _sync_sequences(self, tables: Sequence[Table]) -> None:
+        # The copied ids must not be generated again on the target
+        with self.target.engine.begin() as conn:
+            for table in tables:
+                column = table.autoincrement_column
+                # Only integer columns can be backed by a serial or identity
+                # sequence, tables without one are skipped by the query
+                if column is None or not isinstance(column.type, Integer):
+                    continue
+                name = get_qualified_name(table)
+                conn.execute(
+                    text(
+                        _SYNC_SEQUENCE_TEMPLATE.format(
+                            table=name, column=pg_quote(column.name)
+                        )
+                    ).bindparams(table=name, column=column.name)
+                )
+
+    def _verify(
+        self, tenant: TenantIdentifier, tables: Sequence[Table]
+    ) -> Dict[str, TableChecksum]:
+        checksums: Dict[str, TableChecksum] = {}
+        for table in tables:
+            source = _checksum(self.source.engine, table, tenant)
+            target = _checksum(self.target.engine, table, tenant)
+            if source != target:
+                raise TenantRelocationError(
+                    tenant, f"checksum mismatch on table '{table.fullname}'"
+                )
+            checksums[table.fullname] = source
+        return checksums
+
+
+def _get_staging_table(table: Table, columns: Sequence[Column[Any]]) -> Table:
+    return Table(
+        f"_sqlalchemy_tenants_staging_{table.name}",
+        MetaData(),
+        *(Column(c.name, c.type) for c in columns),
+        prefixes=["TEMPORARY"],
+        postgresql_on_commit="DROP",
+    )
+
+
+def _cursor(conn: Connection) -> Any:
+    return conn.connection.dbapi_connection.cursor()  # type: ignore[union-attr]
+
+
+def _checksum(engine: Engine, table: Table, tenant: TenantIdentifier) -> TableChecksum:
+    query = text(_CHECKSUM_TEMPLATE.format(table=get_qualified_name(table))).bindparams(
+        bindparam("tenant", coerce_tenant(tenant, table), type_=table.c.tenant.type)
+    )
+    with engine.connect() as conn:
+        rows, checksum = conn.execute(query).one()
+    return TableChecksum(rows=int(rows), checksum=int(checksum))
@@ -0,0 +1,153 @@
+import itertools
+import logging
+import time
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import Engine, event, text
+from sqlalchemy.engine import Connection
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.orm import ORMExecuteState, Session, SessionTransaction
+
+from sqlalchemy_tenants.exceptions import TenantNotFound
+from sqlalchemy_tenants.statements import get_set_local_role_statement
+
+logger = logging.getLogger(__name__)
+
+LAG_QUERY = """\
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class LagCache:
+    """The last replication lag measured for each replica."""
+
+    def __init__(self, check_interval: float) -> None:
+        self.check_interval = check_interval
+        self._lags: Dict[int, Tuple[float, float]] = {}
+
+    def get(self, replica: Any) -> Optional[float]:
+        """Get the lag of the replica, if it has been checked recently."""
+        checked = self._lags.get(id(replica))
+        if checked is None or time.monotonic() - checked[0] > self.check_interval:
+            return None
+        return checked[1]
+
+    def set(self, replica: Any, lag: float) -> None:
+        self._lags[id(replica)] = (time.monotonic(), lag)
+
+
+class ReplicaSet:
+    """
+    A set of read replicas, balancing tenant sessions across them in round-robin.
+
+    When `max_lag` is set, the replication lag of each replica is checked at most
+    every `check_interval` seconds, and replicas lagging behind (or unreachable)
+    are skipped until the next check. When no replica is available, sessions
+    fall back to the primary.
+    """
+
+    def __init__(
+        self,
+        engines: Sequence[Engine],
+        max_lag: Optional[float] = None,
+        check_interval: float = 5.0,
+    ) -> None:
+        if not engines:
+            raise ValueError("At least one replica is required.")
+        self.engines = list(engines)
+        self.max_lag = max_lag
+        self._lags = LagCache(check_interval)
+        self._counter = itertools.count()
+
+    def get_engine(self) -> Optional[Engine]:
+        """
+        Get the next available replica.
+
+        Returns:
+            The engine of the replica, or None if all the replicas are lagging.
+        """
+        start = next(self._counter)
+        for i in range(len(self.engines)):
+            engine = self.engines[(start + i) % len(self.engines)]
+            if self._is_available(engine):
+                return engine
+        logger.warning("no replica available, falling back to the primary")
+        return None
+
+    def get_lag(self, engine: Engine) -> float:
+        """Get the replication lag of the replica, in seconds."""
+        with engine.connect() as conn:
+            return float(conn.execute(text(LAG_QUERY)).scalar_one())
+
+    def _is_available(self, engine: Engine) -> bool:
+        if self.max_lag is None:
+            return True
+        lag = self._lags.get(engine)
+        if lag is None:
+            try:
+                lag = self.get_lag(engine)
+            except (DBAPIError, OSError):
+                logger.warning("replica %s is unreachable", engine.url, exc_info=True)
+                lag = float("inf")
+            self._lags.set(engine, lag)
+        return lag <= self.max_lag
+
+
+def set_role_on_begin(session: Session, role: str) -> None:
+    """
+    Set the role on every connection the session begins a transaction on,
+    whatever engine it belongs to.
+
+    The role is only set for the transaction, so the connections are returned
+    to the pool without it and don't need to be reset.
+    """
+    set_role = get_set_local_role_statement(role)
+
+    @event.listens_for(session, "after_begin")
+    def _after_begin(
+        _: Session, transaction: SessionTransaction, connection: Connection
+    ) -> None:
+        try:
+            connection.execute(set_role)
+        except DBAPIError as e:
+            if e.args and "does not exist" in e.args[0]:
+                raise TenantNotFound(f"Role '{role}' does not exist") from e
+            raise
+
+
+def route_reads(session: Session, replica: Engine) -> None:
+    """
+    Route the reads of the session to the replica until it writes.
+
+    Once the session flushes or executes anything other than a plain `SELECT`,
+    all its following statements go to the primary, so that it reads its
+    own writes.
+    """
+    pinned = False
+
+    @event.listens_for(session, "do_orm_execute")
+    def _do_orm_execute(state: ORMExecuteState) -> None:
+        nonlocal pinned
+        if pinned or "bind" in state.bind_arguments:
+            return
+        if _is_replica_read(state):
+            state.bind_arguments["bind"] = replica
+        else:
+            pinned = True
+
+    @event.listens_for(session, "after_flush")
+    def _after_flush(*_: Any) -> None:
+        nonlocal pinned
+        pinned = True
+
+
+def _is_replica_read(state: ORMExecuteState) -> bool:
+    session = state.session
+    if session.new or session.dirty or session.deleted:
+        # Pending changes would be flushed before the query
+        return False
+    return state.is_select and getattr(state.statement, "_for_update_arg", None) is None
@@ -0,0 +1,378 @@
+import logging
+from contextlib import contextmanager
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Generator,
+    MutableMapping,
+    Optional,
+    Sequence,
+    Set,
+)
+
+from alembic.config import Config
+from sqlalchemy import Connection, Engine, MetaData, NullPool, Table, event, text
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import PoolResetState
+from typing_extensions import Self
+
+from sqlalchemy_tenants.context import resolve_tenant
+from sqlalchemy_tenants.core import (
+    DEFAULT_TENANT_CODEC,
+    TENANT_SCHEMA_PREFIX,
+    TenantCodec,
+    TenantIdentifier,
+    get_tenant_schema_name,
+)
+from sqlalchemy_tenants.events import listen_tenant_events
+from sqlalchemy_tenants.exceptions import TenantAlreadyExists, TenantNotFound
+from sqlalchemy_tenants.managers import DBManager, TenantSession
+from sqlalchemy_tenants.migrations import (
+    MigrationProgress,
+    MigrationRunner,
+    MigrationStatus,
+    MigrationTarget,
+)
+from sqlalchemy_tenants.pool import reset_connection
+from sqlalchemy_tenants.utils import pg_quote
+
+logger = logging.getLogger(__name__)
+
+_INFO_SEARCH_PATH = "sqlalchemy_tenants_search_path"
+_INFO_PENDING_SEARCH_PATH = "sqlalchemy_tenants_pending_search_path"
+
+SET_SEARCH_PATH_QUERY = """\
+SELECT
+    set_config('search_path', :search_path, false) IS NOT NULL
+    AND EXISTS (SELECT 1 FROM pg_namespace WHERE nspname = :schema)
+"""
+
+
+def get_search_path(schema: str, shared_schemas: Sequence[str]) -> str:
+    """Get the search_path of a tenant schema, followed by the shared ones."""
+    return ", ".join(pg_quote(s) for s in [schema, *shared_schemas])
+
+
+def track_search_path(engine: Engine) -> None:
+    """
+    Keep track of the search_path of each pooled connection across
+    transactions, so that it is only set when it changes.
+
+    A search_path set in a transaction that is rolled back is discarded by
+    Postgres, so it is only recorded once the transaction commits. The
+    search_path of the connections returned to the pool is reset, so that the
+    next checkouts, including admin ones, don't run against a tenant schema.
+    """
+    if event.contains(engine, "commit", _on_commit):
+        return
+    event.listen(engine, "commit", _on_commit)
+    event.listen(engine, "rollback", _on_rollback)
+    if isinstance(engine.pool, NullPool):
+        # Connections are closed on return, with the search_path
+        return
+    is_asyncpg = engine.dialect.driver == "asyncpg"
+
+    @event.listens_for(engine, "reset")
+    def _reset(
+        dbapi_connection: Any, connection_record: Any, reset_state: PoolResetState
+    ) -> None:
+        info = connection_record.info
+        info.pop(_INFO_PENDING_SEARCH_PATH, None)
+        if info.pop(_INFO_SEARCH_PATH, None) is None:
+            return
+        if reset_state.terminate_only or not reset_state.asyncio_safe:
+            return
+        reset_connection(dbapi_connection, "RESET search_path", reset_state, is_asyncpg)
+
+
+def _on_commit(conn: Connection) -> None:
+    if _INFO_PENDING_SEARCH_PATH in conn.info:
+        conn.info[_INFO_SEARCH_PATH] = conn.info.pop(_INFO_PENDING_SEARCH_PATH)
+
+
+def _on_rollback(conn: Connection) -> None:
+    conn.info.pop(_INFO_PENDING_SEARCH_PATH, None)
+
+
+def needs_search_path(
+    info: MutableMapping[Any, Any], search_path: Optional[str]
+) -> bool:
+    """
+    Check whether the connection needs to switch to the given search_path,
+    where None is the default one.
+    """
+    current = info.get(_INFO_PENDING_SEARCH_PATH, info.get(_INFO_SEARCH_PATH))
+    return bool(current != search_path)
+
+
+def record_search_path(
+    info: MutableMapping[Any, Any], search_path: Optional[str]
+) -> None:
+    info[_INFO_PENDING_SEARCH_PATH] = search_path
+
+
+def get_tenant_tables(metadata: MetaData) -> Sequence[Table]:
+    """
+    Get the tables living in each tenant schema: the ones without an
+    explicit schema, sorted by foreign key dependency.
+    """
+    return [t for t in metadata.sorted_tables if t.schema is None]
+
+
+def get_clone_statements(
+    metadata: MetaData, source_schema: str, target_schema: str
+) -> Dict[str, str]:
+    """
+    Get the statements copying each tenant table from a schema to another.
+    """
+    statements: Dict[str, str] = {}
+    for table in get_tenant_tables(metadata):
+        columns = ", ".join(pg_quote(c.name) for c in table.columns)
+        name = pg_quote(table.name)
+        statements[table.name] = (
+            f"INSERT INTO {pg_quote(target_schema)}.{name} ({columns}) "
+            f"SELECT {columns} FROM {pg_quote(source_schema)}.{name}"
+        )
+    return statements
+
+
+class SchemaPerTenantManager(DBManager):
+    """
+    A manager giving each tenant its own schema, for tenants that need
+    physical isolation (separate tables, indexes and vacuum statistics).
+
+    Tenant sessions switch the `search_path` to the tenant schema followed by
+    the shared schemas, so models without an explicit schema resolve to the
+    tables of the tenant. Each tenant session holds a single connection for its
+    whole lifetime, whose `search_path` is set once and reset when the
+    connection is returned to the pool.
+
+    Sessions run with the role of the engine: isolation relies on the
+    `search_path`, not on database privileges. Read replicas are not supported,
+    so `readonly` sessions run on the engine as well.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        session_maker: sessionmaker[Session],
+        metadata: Optional[MetaData] = None,
+        shared_schemas: Sequence[str] = ("public",),
+        tenant_codec: Optional[TenantCodec] = None,
+    ) -> None:
+        self.engine = engine
+        self.session_maker = session_maker
+        self.metadata = metadata
+        self.shared_schemas = list(shared_schemas)
+        self.tenant_codec = tenant_codec or DEFAULT_TENANT_CODEC
+        track_search_path(engine)
+
+    @classmethod
+    def from_engine(
+        cls,
+        engine: Engine,
+        metadata: Optional[MetaData] = None,
+        shared_schemas: Sequence[str] = ("public",),
+        expire_on_commit: bool = False,
+        autoflush: bool = False,
+        autocommit: bool = False,
+        tenant_codec: Optional[TenantCodec] = None,
+    ) -> Self:
+        session_maker = sessionmaker(
+            bind=engine,
+            expire_on_commit=expire_on_commit,
+            autoflush=autoflush,
+            autocommit=autocommit,
+        )
+        return cls(
+            engine=engine,
+            session_maker=session_maker,
+            metadata=metadata,
+            shared_schemas=shared_schemas,
+            tenant_codec=tenant_codec,
+        )
+
+    @staticmethod
+    def _schema_exists(sess: Session, schema: str) -> bool:
+        result = sess.execute(
+            text("SELECT 1 FROM pg_namespace WHERE nspname = :schema").bindparams(
+                schema=schema
+            )
+        )
+        return result.scalar() is not None
+
+    def create_tenant(self, tenant: TenantIdentifier) -> None:
+        """
+        Create the schema of the tenant and, when the manager has a metadata,
+        the tables without an explicit schema in it.
+        """
+        logger.info("creating schema of tenant %s", tenant)
+        schema = get_tenant_schema_name(tenant, self.tenant_codec)
+        with self.new_session() as sess:
+            if self._schema_exists(sess, schema):
+                raise TenantAlreadyExists(tenant)
+            sess.execute(text(f"CREATE SCHEMA {pg_quote(schema)}"))
+            if self.metadata is not None:
+                conn = sess.connection().execution_options(
+                    schema_translate_map={None: schema}
+                )
+                self.metadata.create_all(conn, tables=get_tenant_tables(self.metadata))
+            sess.commit()
+
+    def delete_tenant(self, tenant: TenantIdentifier) -> None:
+        """
+        Drop the schema of the tenant.
+
+        Unlike with RLS, the data of the tenant lives in its schema
+        and is deleted with it.
+        """
+        logger.info("dropping schema of tenant %s", tenant)
+        schema = get_tenant_schema_name(tenant, self.tenant_codec)
+        with self.new_session() as sess:
+            if not self._schema_exists(sess, schema):
+                raise TenantNotFound(tenant)
+            sess.execute(text(f"DROP SCHEMA {pg_quote(schema)} CASCADE"))
+            sess.commit()
+
+    def list_tenants(self) -> Set[TenantIdentifier]:
+        with self.new_session() as sess:
+            result = sess.execute(
+                text(
+                    "SELECT nspname FROM pg_namespace WHERE nspname LIKE :prefix"
+                ).bindparams(prefix=f"{TENANT_SCHEMA_PREFIX}%")
+            )
+            return {
+                self.tenant_codec.decode(row[0].removeprefix(TENANT_SCHEMA_PREFIX))
+                for row in result.all()
+            }
+
+    def clone_tenant(
+        self,
+        source: TenantIdentifier,
+        target: TenantIdentifier,
+        metadata: MetaData | Sequence[MetaData],
+        remap_ids: bool = False,
+        batch_size: int = 10_000,
+    ) -> Dict[str, int]:
+        """
+        Copy all the rows of the tenant tables from a tenant schema to another.
+
+        Each schema has its own tables, so ids never clash and are copied as
+        they are: `remap_ids` and `batch_size` are ignored.
+        """
+        if source == target:
+            raise ValueError("Source and target tenants must be different.")
+        logger.info("cloning tenant %s into %s", source, target)
+        meta_list = metadata if isinstance(metadata, Sequence) else [metadata]
+        copied: Dict[str, int] = {}
+        with self.new_session() as sess:
+            for meta in meta_list:
+                statements = get_clone_statements(
+                    meta,
+                    source_schema=get_tenant_schema_name(source, self.tenant_codec),
+                    target_schema=get_tenant_schema_name(target, self.tenant_codec),
+                )
+                for name, stmt in statements.items():
+                    copied[name] = sess.execute(text(stmt)).rowcount  # type: ignore[attr-defined]
+            sess.commit()
+        return copied
+
+    def _set_search_path(self, sess: Session, schema: Optional[str]) -> None:
+        conn = sess.connection()
+        if schema is None:
+            if needs_search_path(conn.info, None):
+                sess.execute(text("RESET search_path"))
+                record_search_path(conn.info, None)
+            return
+        search_path = get_search_path(schema, self.shared_schemas)
+        if not needs_search_path(conn.info, search_path):
+            return
+        exists = sess.execute(
+            text(SET_SEARCH_PATH_QUERY),
+            {"search_path": search_path, "schema": schema},
+        ).scalar()
+        record_search_path(conn.info, search_path)
+        if not exists:
+            raise TenantNotFound(f"Schema '{schema}' does not exist")
+
+    @contextmanager
+    def new_tenant_session(
+        self,
+        tenant: Optional[TenantIdentifier] = None,
+        create_if_missing: bool = True,
+        readonly: bool = False,
+    ) -> Generator[TenantSession, None, None]:
+        tenant = resolve_tenant(tenant)
+        schema = get_tenant_schema_name(tenant, self.tenant_codec)
+        tried_create = False
+
+        while True:
+            try:
+                with (
+                    self.engine.connect() as conn,
+                    self.session_maker(bind=conn) as session,
+                ):
+                    # Commit the search_path, so that it applies to all the
+                    # transactions of the session
+                    self._set_search_path(session, schema)
+                    session.commit()
+                    listen_tenant_events(session, tenant)
+                    tenant_session = TenantSession.__new__(TenantSession)
+                    tenant_session.__dict__ = session.__dict__
+                    tenant_session.tenant = self.tenant_codec.parse(tenant)
+                    yield tenant_session
+                break
+            except TenantNotFound:
+                if tried_create:
+                    raise
+                if not create_if_missing:
+                    raise
+                logger.info("tenant %s does not exist, creating it", tenant)
+                self.create_tenant(tenant)
+                tried_create = True
+
+    @contextmanager
+    def new_session(self) -> Generator[Session, None, None]:
+        with self.session_maker() as session:
+            self._set_search_path(session, None)
+            yield session
+
+
+def upgrade_tenant_schemas(
+    config: Config,
+    schemas: Sequence[str],
+    revision: str = "head",
+    max_workers: int = 4,
+    on_progress: Optional[Callable[[MigrationProgress], None]] = None,
+) -> Dict[str, Optional[str]]:
+    """
+    Run the Alembic upgrade on each tenant schema, in parallel.
+
+    Each schema is upgraded by a separate process running `alembic -x
+    tenant_schema=<schema> upgrade <revision>`: see `get_migration_tenant_schema`.
+    A failure on a schema doesn't stop the others. Use
+    [`MigrationRunner`][sqlalchemy_tenants.migrations.MigrationRunner] directly
+    to resume interrupted runs.
+
+    Args:
+        config: The Alembic configuration.
+        schemas: The tenant schemas to upgrade.
+        revision: The revision to upgrade to.
+        max_workers: The maximum number of schemas upgraded at the same time.
+        on_progress: Called each time a schema is done.
+
+    Returns:
+        The error of each schema, or None for the schemas upgraded successfully.
+    """
+    runner = MigrationRunner(config, max_workers=max_workers, on_progress=on_progress)
+    report = runner.upgrade(
+        [MigrationTarget(name=s, schema=s) for s in schemas], revision=revision
+    )
+    results: Dict[str, Optional[str]] = {}
+    for schema, status in report.statuses.items():
+        if status is MigrationStatus.LOCKED:
+            results[schema] = "Locked by another migration"
+        else:
+            results[schema] = report.errors.get(schema)
+    return results
@@ -0,0 +1,85 @@
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Generator, Optional, Tuple
+
+from sqlalchemy_tenants.context import is_same_tenant, resolve_tenant
+from sqlalchemy_tenants.core import TenantIdentifier
+from sqlalchemy_tenants.managers import DBManager, TenantSession
+
+
+class ScopedTenantSession:
+    """
+    Share the tenant session opened by the outermost `session()` block of a
+    thread with the nested blocks, instead of opening a connection for each.
+
+    Only the outermost block owns the session: it's committed (or not) by the
+    code of that block and closed when the block exits. Nested blocks asking
+    for another tenant, or for a writable session while the current one is
+    readonly, get their own session.
+
+    Example:
+        ```python
+        sessions = ScopedTenantSession(manager)
+
+        def get_user(user_id: int) -> User:
+            with sessions.session() as sess:  # (1)
+                return sess.get_one(User, user_id)
+
+        with tenant_context("tenant_1"), sessions.session() as sess:
+            user = get_user(1)
+            sess.commit()
+        ```
+
+        1. Reuses the session of the caller.
+    """
+
+    def __init__(self, manager: DBManager) -> None:
+        self.manager = manager
+        self._current: ContextVar[Optional[Tuple[TenantSession, bool, int]]] = (
+            ContextVar(f"sqlalchemy_tenants_scoped_session_{id(self)}", default=None)
+        )
+
+    def get(self) -> Optional[TenantSession]:
+        """Get the session opened by the current thread, if any."""
+        current = self._current.get()
+        if current is None or current[2] != threading.get_ident():
+            return None
+        return current[0]
+
+    @contextmanager
+    def session(
+        self,
+        tenant: Optional[TenantIdentifier] = None,
+        create_if_missing: bool = True,
+        readonly: bool = False,
+    ) -> Generator[TenantSession, None, None]:
+        """
+        Get the session of the tenant opened by an enclosing block, or open one.
+
+        Args:
+            tenant: The identifier of the tenant, the current tenant by default.
+            create_if_missing: Whether to create the tenant role if it doesn't exist.
+            readonly: Whether the session may run on a read replica.
+
+        Yields:
+            The session of the tenant.
+        """
+        tenant = resolve_tenant(tenant)
+        current = self._current.get()
+        if (
+            current is not None
+            and current[2] == threading.get_ident()
+            and is_same_tenant(current[0].tenant, tenant)
+            and (readonly or not current[1])
+        ):
+            yield current[0]
+            return
+        with self.manager.new_tenant_session(
+            tenant, create_if_missing=create_if_missing, readonly=readonly
+        ) as sess:
+            token = self._current.set((sess, readonly, threading.get_ident()))
+            try:
+                yield sess
+            finally:
+                self._current.reset(token)
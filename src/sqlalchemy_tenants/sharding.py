@@ -0,0 +1,431 @@
+import bisect
+import hashlib
+import logging
+import math
+import time
+from abc import abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    Dict,
+    Generator,
+    List,
+    Mapping,
+    Optional,
+    Protocol,
+    Sequence,
+    Set,
+    Tuple,
+    cast,
+)
+
+from sqlalchemy import Column, Engine, MetaData, String, Table, delete, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateSchema
+from sqlalchemy.util import LRUCache
+from typing_extensions import runtime_checkable
+
+from sqlalchemy_tenants.context import resolve_tenant
+from sqlalchemy_tenants.core import TenantIdentifier
+from sqlalchemy_tenants.exceptions import TenantNotFound
+from sqlalchemy_tenants.managers import DBManager, PostgresManager, TenantSession
+from sqlalchemy_tenants.relocation import RelocationReport, TenantRelocator
+
+logger = logging.getLogger(__name__)
+
+DIRECTORY_TABLE_NAME = "sqlalchemy_tenants_directory"
+DIRECTORY_SCHEMA_NAME = "sqlalchemy_tenants"
+
+
+class HashRing:
+    """
+    A consistent hashing ring mapping tenants to shards.
+
+    Each shard is placed on the ring multiple times (virtual nodes), so that
+    adding or removing a shard only moves about 1/N of the tenants.
+    """
+
+    def __init__(self, shards: Sequence[str], vnodes: int = 100) -> None:
+        if not shards:
+            raise ValueError("At least one shard is required.")
+        ring: List[Tuple[int, str]] = sorted(
+            (self._hash(f"{shard}:{i}"), shard)
+            for shard in shards
+            for i in range(vnodes)
+        )
+        self._keys = [k for k, _ in ring]
+        self._shards = [s for _, s in ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        digest = hashlib.blake2b(value.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+    def get_shard(self, tenant: TenantIdentifier) -> str:
+        idx = bisect.bisect(self._keys, self._hash(str(tenant)))
+        return self._shards[idx % len(self._shards)]
+
+
+class ShardCache:
+    """
+    A local LRU cache of the shard of each tenant, whose entries expire after
+    `ttl` seconds so that tenants moved by other processes are eventually
+    routed to their new shard.
+    """
+
+    def __init__(self, size: int, ttl: Optional[float]) -> None:
+        self.ttl = ttl
+        self._cache: LRUCache[str, Tuple[str, float]] = LRUCache(size)
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        shard, expires_at = entry
+        if time.monotonic() >= expires_at:
+            self._cache.pop(key, None)
+            return None
+        return shard
+
+    def set(self, key: str, shard: str) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else math.inf
+        self._cache[key] = (shard, expires_at)
+
+    def pop(self, key: str) -> None:
+        self._cache.pop(key, None)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+
+def get_directory_table(
+    metadata: Optional[MetaData] = None,
+    table_name: str = DIRECTORY_TABLE_NAME,
+    schema: Optional[str] = DIRECTORY_SCHEMA_NAME,
+) -> Table:
+    """
+    Get the definition of the table mapping each tenant to its shard.
+
+    Pass your own metadata to have the table managed by your migrations.
+    Tenant roles can write every table of the schemas of their manager, so the
+    table lives in a dedicated schema by default: any schema the tenant roles
+    have no privileges on would do.
+    """
+    return Table(
+        table_name,
+        metadata if metadata is not None else MetaData(),
+        Column("tenant", String, primary_key=True),
+        Column("shard", String, nullable=False, index=True),
+        schema=schema,
+    )
+
+
+@runtime_checkable
+class Placement(Protocol):
+    @abstractmethod
+    def get_shard(self, tenant: TenantIdentifier) -> str:
+        """
+        Get the shard of an existing tenant.
+
+        Raises:
+            TenantNotFound: If the tenant has not been placed on any shard.
+        """
+
+    @abstractmethod
+    def add_tenant(self, tenant: TenantIdentifier) -> str:
+        """
+        Place a new tenant on a shard.
+
+        Returns:
+            The shard the tenant has been placed on.
+        """
+
+    @abstractmethod
+    def remove_tenant(self, tenant: TenantIdentifier) -> None:
+        """
+        Remove the tenant from its shard.
+        """
+
+
+class ConsistentHashPlacement(Placement):
+    """
+    Place tenants on shards with consistent hashing.
+
+    The placement is computed, so nothing needs to be stored.
+    """
+
+    def __init__(self, shards: Sequence[str], vnodes: int = 100) -> None:
+        self.ring = HashRing(shards, vnodes=vnodes)
+
+    def get_shard(self, tenant: TenantIdentifier) -> str:
+        return self.ring.get_shard(tenant)
+
+    def add_tenant(self, tenant: TenantIdentifier) -> str:
+        return self.ring.get_shard(tenant)
+
+    def remove_tenant(self, tenant: TenantIdentifier) -> None:
+        pass
+
+
+class DirectoryPlacement(Placement):
+    """
+    Place tenants on shards according to a directory table, caching lookups
+    in a local LRU cache.
+
+    New tenants are placed using the `default` placement and recorded in the
+    directory, so they can later be moved to another shard by updating
+    their row (and invalidating the cache).
+
+    Cached shards expire after `cache_ttl` seconds, so every process routes a
+    moved tenant to its new shard within `cache_ttl` of the move. Call
+    `invalidate` in each process (e.g. when notified of the move) to route it
+    there immediately. With `cache_ttl=None`, shards are cached until they're
+    invalidated.
+    """
+
+    def __init__(
+        self,
+        engine: Engine,
+        default: Placement,
+        table: Optional[Table] = None,
+        cache_size: int = 10_000,
+        cache_ttl: Optional[float] = 30.0,
+    ) -> None:
+        self.engine = engine
+        self.default = default
+        self.table = table if table is not None else get_directory_table()
+        self._cache = ShardCache(cache_size, ttl=cache_ttl)
+
+    def create_table(self) -> None:
+        """Create the directory table and its schema, if they don't exist."""
+        with self.engine.begin() as conn:
+            if self.table.schema is not None:
+                conn.execute(CreateSchema(self.table.schema, if_not_exists=True))
+            self.table.create(conn, checkfirst=True)
+
+    def invalidate(self, tenant: Optional[TenantIdentifier] = None) -> None:
+        """Drop the cached shard of the given tenant, or of all tenants."""
+        if tenant is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(str(tenant))
+
+    def get_shard(self, tenant: TenantIdentifier) -> str:
+        key = str(tenant)
+        shard: Optional[str] = self._cache.get(key)
+        if shard is not None:
+            return shard
+        with self.engine.connect() as conn:
+            shard = cast(
+                Optional[str],
+                conn.execute(
+                    select(self.table.c.shard).where(self.table.c.tenant == key)
+                ).scalar(),
+            )
+        if shard is None:
+            raise TenantNotFound(tenant)
+        self._cache.set(key, shard)
+        return shard
+
+    def add_tenant(self, tenant: TenantIdentifier) -> str:
+        key = str(tenant)
+        with self.engine.begin() as conn:
+            conn.execute(
+                insert(self.table)
+                .values(tenant=key, shard=self.default.add_tenant(tenant))
+                .on_conflict_do_nothing()
+            )
+            # Another process may have placed the tenant concurrently
+            shard: str = conn.execute(
+                select(self.table.c.shard).where(self.table.c.tenant == key)
+            ).scalar_one()
+        self._cache.set(key, shard)
+        return shard
+
+    def remove_tenant(self, tenant: TenantIdentifier) -> None:
+        key = str(tenant)
+        with self.engine.begin() as conn:
+            conn.execute(delete(self.table).where(self.table.c.tenant == key))
+        self._cache.pop(key)
+
+    def move_tenant(self, tenant: TenantIdentifier, shard: str) -> None:
+        """
+        Route the tenant to another shard.
+
+        Only the directory is updated: the data of the tenant must already
+        be on the new shard (see `ShardedManager.relocate_tenant`).
+
+        Raises:
+            TenantNotFound: If the tenant has not been placed on any shard.
+        """
+        key = str(tenant)
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                update(self.table).where(self.table.c.tenant == key).values(shard=shard)
+            )
+        if result.rowcount == 0:
+            raise TenantNotFound(tenant)
+        self._cache.set(key, shard)
+
+
+class ShardedManager(DBManager):
+    """
+    A manager spreading tenants across multiple databases (shards).
+
+    Each shard is served by its own manager, and tenants are routed to them
+    according to the given placement. Tenant sessions are opened on the shard
+    of the tenant, so application code using `new_tenant_session` is unchanged.
+    """
+
+    def __init__(
+        self,
+        managers: Mapping[str, DBManager],
+        placement: Placement,
+        max_workers: Optional[int] = None,
+    ) -> None:
+        if not managers:
+            raise ValueError("At least one shard is required.")
+        self.managers: Dict[str, DBManager] = dict(managers)
+        self.placement = placement
+        self.max_workers = max_workers
+
+    def get_manager(self, tenant: TenantIdentifier) -> DBManager:
+        """
+        Get the manager of the shard the tenant is placed on.
+
+        Raises:
+            TenantNotFound: If the tenant has not been placed on any shard.
+        """
+        return self.managers[self.placement.get_shard(tenant)]
+
+    def create_tenant(self, tenant: TenantIdentifier) -> None:
+        shard = self.placement.add_tenant(tenant)
+        logger.info("creating tenant %s on shard %s", tenant, shard)
+        try:
+            self.managers[shard].create_tenant(tenant)
+        except Exception:
+            self.placement.remove_tenant(tenant)
+            raise
+
+    def delete_tenant(self, tenant: TenantIdentifier) -> None:
+        self.get_manager(tenant).delete_tenant(tenant)
+        self.placement.remove_tenant(tenant)
+
+    def list_tenants(self) -> Set[TenantIdentifier]:
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers or len(self.managers)
+        ) as executor:
+            results = executor.map(lambda m: m.list_tenants(), self.managers.values())
+            return set().union(*results)
+
+    def clone_tenant(
+        self,
+        source: TenantIdentifier,
+        target: TenantIdentifier,
+        metadata: MetaData | Sequence[MetaData],
+        remap_ids: bool = False,
+        batch_size: int = 10_000,
+    ) -> Dict[str, int]:
+        manager = self.get_manager(source)
+        if manager is not self.get_manager(target):
+            raise ValueError(
+                f"Tenants '{source}' and '{target}' are placed on different shards."
+            )
+        return manager.clone_tenant(
+            source,
+            target,
+            metadata,
+            remap_ids=remap_ids,
+            batch_size=batch_size,
+        )
+
+    def relocate_tenant(
+        self,
+        tenant: TenantIdentifier,
+        shard: str,
+        metadata: MetaData | Sequence[MetaData],
+        updated_at_column: Optional[str] = None,
+        drop_source: bool = False,
+        max_bytes_per_second: Optional[int] = None,
+    ) -> RelocationReport:
+        """
+        Move a tenant to another shard while it keeps serving reads, freezing
+        its writes only for the final catch-up.
+
+        Requires a `DirectoryPlacement`, which is updated once the data has
+        been copied and verified. See `TenantRelocator` for the details.
+        Other processes keep routing the tenant to its current shard, where its
+        writes are revoked, until their cached shard expires or is invalidated.
+
+        Args:
+            tenant: The identifier of the tenant to relocate.
+            shard: The shard to move the tenant to.
+            metadata: The metadata of the RLS tables to relocate.
+            updated_at_column: The name of a column updated on every write,
+                used to copy the rows changed during the initial copy.
+            drop_source: Whether to delete the tenant from its current shard.
+            max_bytes_per_second: Limit the copy throughput.
+
+        Returns:
+            A report with the copied rows and the verified checksums.
+        """
+        if not isinstance(self.placement, DirectoryPlacement):
+            raise ValueError("Relocating tenants requires a DirectoryPlacement.")
+        current = self.placement.get_shard(tenant)
+        if current == shard:
+            raise ValueError(f"Tenant '{tenant}' is already on shard '{shard}'.")
+        source = self.managers[current]
+        target = self.managers[shard]
+        if not isinstance(source, PostgresManager) or not isinstance(
+            target, PostgresManager
+        ):
+            raise ValueError("Relocating tenants requires PostgresManager shards.")
+        placement = self.placement
+        relocator = TenantRelocator(
+            source,
+            target,
+            metadata,
+            updated_at_column=updated_at_column,
+            max_bytes_per_second=max_bytes_per_second,
+        )
+        return relocator.relocate(
+            tenant,
+            switch=lambda: placement.move_tenant(tenant, shard),
+            drop_source=drop_source,
+        )
+
+    @contextmanager
+    def new_tenant_session(
+        self,
+        tenant: Optional[TenantIdentifier] = None,
+        create_if_missing: bool = True,
+        readonly: bool = False,
+    ) -> Generator[TenantSession, None, None]:
+        tenant = resolve_tenant(tenant)
+        try:
+            manager = self.get_manager(tenant)
+        except TenantNotFound:
+            if not create_if_missing:
+                raise
+            manager = self.managers[self.placement.add_tenant(tenant)]
+        with manager.new_tenant_session(
+            tenant, create_if_missing=create_if_missing, readonly=readonly
+        ) as sess:
+            yield sess
+
+    @contextmanager
+    def new_session(
+        self, shard: Optional[str] = None
+    ) -> Generator[Session, None, None]:
+        """
+        Create a new admin session on the given shard.
+
+        The shard can be omitted when there is a single shard.
+        """
+        if shard is None:
+            if len(self.managers) > 1:
+                raise ValueError("A shard is required when there are many shards.")
+            shard = next(iter(self.managers))
+        with self.managers[shard].new_session() as sess:
+            yield sess
@@ -0,0 +1,126 @@
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Sequence
+
+from sqlalchemy import TextClause, text
+
+from sqlalchemy_tenants.core import (
+    CREATE_TENANT_FUNCTION_NAME,
+    DELETE_TENANT_FUNCTION_NAME,
+)
+from sqlalchemy_tenants.utils import pg_quote
+
+ROLE_EXISTS = text("SELECT 1 FROM pg_roles WHERE rolname = :role")
+LIST_ROLES = text("SELECT rolname FROM pg_roles WHERE rolname LIKE :prefix")
+PROVISIONING_FUNCTIONS_EXIST = text(
+    "SELECT count(DISTINCT proname) = 2 FROM pg_proc "
+    "WHERE proname IN (:create_function, :delete_function)"
+).bindparams(
+    create_function=CREATE_TENANT_FUNCTION_NAME,
+    delete_function=DELETE_TENANT_FUNCTION_NAME,
+)
+CREATE_TENANT = text(
+    f"SELECT {CREATE_TENANT_FUNCTION_NAME}(:role, CAST(:schemas AS text[]), :owner)"
+)
+DELETE_TENANT = text(f"SELECT {DELETE_TENANT_FUNCTION_NAME}(:role, :owner)")
+PROVISIONING_FUNCTIONS_TTL = 60.0
+"""How long, in seconds, the lookup of the provisioning functions is cached."""
+
+_DML_PRIVILEGES = "SELECT, INSERT, UPDATE, DELETE"
+
+
+@lru_cache(maxsize=10_000)
+def get_set_role_statement(role: str) -> TextClause:
+    """Get the statement switching the session to the role, built once per role."""
+    return text(f"SET SESSION ROLE {pg_quote(role)}")
+
+
+@lru_cache(maxsize=10_000)
+def get_set_local_role_statement(role: str) -> TextClause:
+    """
+    Get the statement switching the current transaction to the role, built once
+    per role.
+    """
+    return text(f"SET LOCAL ROLE {pg_quote(role)}")
+
+
+@dataclass(frozen=True)
+class RoleStatement:
+    """A DDL statement on a role, with everything but the role rendered."""
+
+    prefix: str
+    suffix: str = ""
+
+    def render(self, safe_role: str) -> TextClause:
+        return text(f"{self.prefix}{safe_role}{self.suffix}")
+
+
+class ProvisioningStatements:
+    """
+    The statements creating and deleting the tenant roles of a manager.
+
+    The schemas and the owner of the manager are rendered once, leaving only the
+    role to be rendered for each tenant.
+
+    The tenant roles can use every table of the schemas, including the tables
+    created later: when the manager has a registry, its privileges on the
+    registry are revoked right after being granted.
+    """
+
+    def __init__(
+        self, schemas: Sequence[str], owner: str, registry: Optional[str] = None
+    ) -> None:
+        # Quoted like the provisioning functions do with `%I`
+        schema_list = ", ".join(pg_quote(s) for s in schemas)
+        owner = pg_quote(owner)
+        self._create = [
+            RoleStatement("CREATE ROLE "),
+            RoleStatement("GRANT ", f" TO {owner}"),
+        ]
+        self._grant = [
+            RoleStatement(f"GRANT USAGE ON SCHEMA {schema_list} TO "),
+            RoleStatement(
+                f"GRANT {_DML_PRIVILEGES} ON ALL TABLES IN SCHEMA {schema_list} TO "
+            ),
+            RoleStatement(
+                f"ALTER DEFAULT PRIVILEGES IN SCHEMA {schema_list} "
+                f"GRANT {_DML_PRIVILEGES} ON TABLES TO "
+            ),
+        ]
+        self._revoke = (
+            [RoleStatement(f"REVOKE ALL ON TABLE {registry} FROM ")]
+            if registry is not None
+            else []
+        )
+        self._delete = [
+            RoleStatement("REASSIGN OWNED BY ", f" TO {owner}"),
+            RoleStatement("DROP OWNED BY "),
+            RoleStatement("DROP ROLE "),
+        ]
+
+    @staticmethod
+    def _render(statements: List[RoleStatement], role: str) -> List[TextClause]:
+        safe_role = pg_quote(role)
+        return [s.render(safe_role) for s in statements]
+
+    def create_role(self, role: str) -> List[TextClause]:
+        """Get the statements creating the role, with its privileges."""
+        return self._render(self._create + self._grant + self._revoke, role)
+
+    def grant_privileges(self, role: str) -> List[TextClause]:
+        """Get the statements granting the privileges on the schemas to the role."""
+        return self._render(self._grant + self._revoke, role)
+
+    def revoke_registry(self, roles: Sequence[str]) -> List[TextClause]:
+        """
+        Get the statements revoking the privileges of the roles on the registry,
+        in a single statement for all of them. Empty without a registry.
+        """
+        if not roles:
+            return []
+        safe_roles = ", ".join(pg_quote(r) for r in roles)
+        return [s.render(safe_roles) for s in self._revoke]
+
+    def delete_role(self, role: str) -> List[TextClause]:
+        """Get the statements dropping the role and everything it owns."""
+        return self._render(self._delete, role)
@@ -1,7 +1,13 @@
 import re
+from functools import lru_cache
+from typing import Optional
 
-from sqlalchemy import Connection, text
-from sqlalchemy.dialects import postgresql
+from sqlalchemy import Connection, Table, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.sql.compiler import IdentifierPreparer
+
+DUPLICATE_OBJECT = "42710"
+"""The SQLSTATE of `CREATE ROLE` when the role already exists."""
 
 
 def function_exists(connection: Connection, name: str) -> bool:
@@ -17,10 +23,36 @@ def function_exists(connection: Connection, name: str) -> bool:
     return result.first() is not None
 
 
+def get_sqlstate(error: DBAPIError) -> Optional[str]:
+    """Get the SQLSTATE of the error raised by the driver, if any."""
+    return getattr(error.orig, "sqlstate", None)
+
+
 def normalize_whitespace(s: str) -> str:
     return re.sub(r"\s+", " ", s.strip())
 
 
+@lru_cache(maxsize=1)
+def get_identifier_preparer() -> IdentifierPreparer:
+    """Get the identifier preparer of the Postgres dialect, created on first use."""
+    from sqlalchemy.dialects import postgresql  # noqa: PLC0415
+
+    return postgresql.dialect().identifier_preparer  # type: ignore[no-untyped-call]
+
+
+@lru_cache(maxsize=10_000)
 def pg_quote(input: str) -> str:
-    """Quote the input string to prevent SQL injection."""
-    return postgresql.dialect().identifier_preparer.quote(input)  # type: ignore[no-untyped-call]
+    """
+    Quote the input string to prevent SQL injection.
+
+    The quoted identifiers are memoized, as the same role and table names
+    are quoted over and over.
+    """
+    return get_identifier_preparer().quote(input)
+
+
+def get_qualified_name(table: Table) -> str:
+    """Get the quoted, schema-qualified name of the table."""
+    if table.schema:
+        return f"{pg_quote(table.schema)}.{pg_quote(table.name)}"
+    return pg_quote(table.name)
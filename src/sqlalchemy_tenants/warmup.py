@@ -0,0 +1,179 @@
+import threading
+from dataclasses import dataclass
+from typing import Any, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Engine, event
+from sqlalchemy.engine import Compiled, Connection, ExecutionContext, IteratorResult
+from sqlalchemy.engine.interfaces import CacheStats
+from sqlalchemy.engine.result import SimpleResultMetaData
+from sqlalchemy.orm import ORMExecuteState, Session
+from sqlalchemy.sql import compiler
+from sqlalchemy.sql.base import Executable
+
+from sqlalchemy_tenants.events import listen_tenant_events
+
+TENANT_SESSION_OPTION = "sqlalchemy_tenants_tenant_session"
+_WARMUP_OPTION = "sqlalchemy_tenants_warmup"
+_WARMUP_TENANT = "warmup"
+"""The tenant the statements are rewritten for: its value is a bound parameter,
+so it's not part of the cache key."""
+
+
+@dataclass(frozen=True)
+class WarmupStatement:
+    """A statement to compile ahead of its first execution."""
+
+    statement: Executable
+    column_keys: Tuple[str, ...] = ()
+    """The names of the parameters it's executed with, e.g. the values of an
+    `insert()`: each set of names is compiled and cached separately."""
+    for_executemany: bool = False
+    """Whether it's executed with a list of parameters."""
+
+
+class CompiledCacheStats:
+    """
+    The hits and misses of the compiled cache for the statements executed by
+    tenant sessions.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """The share of statements found in the cache, 0 when none was executed."""
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def record(self, cache_hit: Any) -> None:
+        with self._lock:
+            if cache_hit is CacheStats.CACHE_HIT:
+                self.hits += 1
+            elif cache_hit is CacheStats.CACHE_MISS:
+                self.misses += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+
+
+def compile_statements(
+    engine: Engine, statements: Iterable[WarmupStatement]
+) -> List[Compiled]:
+    """
+    Compile the statements into the compiled cache of the engine, the same way
+    their execution would, so their first execution is a cache hit.
+
+    Args:
+        engine: The engine whose cache is warmed up.
+        statements: The statements to compile.
+
+    Returns:
+        The compiled statements, empty when the engine has no compiled cache.
+    """
+    cache = engine._compiled_cache
+    if cache is None:
+        return []
+    dialect = engine.dialect
+    schema_translate_map = engine.get_execution_options().get("schema_translate_map")
+    compiled: List[Compiled] = []
+    for warmup in statements:
+        # Mirrors Connection._execute_clauseelement, which builds the cache key
+        result, _, _ = warmup.statement._compile_w_cache(
+            dialect=dialect,
+            compiled_cache=cache,
+            column_keys=sorted(warmup.column_keys),
+            for_executemany=warmup.for_executemany,
+            schema_translate_map=schema_translate_map,
+            linting=dialect.compiler_linting | compiler.WARN_LINTING,
+        )
+        compiled.append(result)
+    return compiled
+
+
+def compile_tenant_statements(
+    engine: Engine,
+    statements: Iterable[WarmupStatement],
+    inject_tenant_filter: bool = False,
+) -> List[Compiled]:
+    """
+    Compile the statements into the compiled cache of the engine as the tenant
+    sessions execute them, once their `do_orm_execute` listeners have rewritten
+    them (e.g. adding the tenant filter, or the tenant to the inserted values).
+
+    The statements go through a session with the tenant listeners that never
+    connects: each statement is compiled instead of being executed. ORM
+    inserts, which the ORM rewrites again on execution, are compiled as
+    they are.
+
+    Args:
+        engine: The engine whose cache is warmed up.
+        statements: The statements to compile.
+        inject_tenant_filter: Whether the tenant sessions add the tenant
+            criteria to their queries.
+
+    Returns:
+        The compiled statements, empty when the engine has no compiled cache.
+    """
+    compiled: List[Compiled] = []
+    with Session(bind=engine) as session:
+        listen_tenant_events(
+            session, _WARMUP_TENANT, inject_tenant_filter=inject_tenant_filter
+        )
+
+        @event.listens_for(session, "do_orm_execute")
+        def _compile(state: ORMExecuteState) -> IteratorResult[Any]:
+            warmup: WarmupStatement = state.execution_options[_WARMUP_OPTION]
+            if state.is_insert and state.is_orm_statement:
+                rewritten = warmup
+            else:
+                params = state.parameters
+                rows = params if isinstance(params, list) else [params or {}]
+                rewritten = WarmupStatement(
+                    state.statement, tuple(rows[0]), warmup.for_executemany
+                )
+            compiled.extend(compile_statements(engine, [rewritten]))
+            return IteratorResult(SimpleResultMetaData([]), iter([]))
+
+        for warmup in statements:
+            row = dict.fromkeys(warmup.column_keys)
+            session.execute(
+                warmup.statement,
+                [row, row] if warmup.for_executemany else row,
+                execution_options={_WARMUP_OPTION: warmup},
+            )
+    return compiled
+
+
+def tag_tenant_statements(session: Session) -> None:
+    """
+    Mark the statements executed by the session as coming from a tenant
+    session, for `track_compiled_cache`.
+
+    Must be registered before the other `do_orm_execute` listeners, which may
+    execute the statement themselves.
+    """
+
+    @event.listens_for(session, "do_orm_execute")
+    def _do_orm_execute(state: ORMExecuteState) -> None:
+        state.update_execution_options(**{TENANT_SESSION_OPTION: True})
+
+
+def track_compiled_cache(engine: Engine, stats: CompiledCacheStats) -> None:
+    """Record the compiled cache hits of the tenant statements run by the engine."""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: Optional[ExecutionContext],
+        executemany: bool,
+    ) -> None:
+        if context is not None and context.execution_options.get(TENANT_SESSION_OPTION):
+            stats.record(getattr(context, "cache_hit", None))
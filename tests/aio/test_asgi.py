@@ -0,0 +1,114 @@
+from typing import Any, AsyncGenerator, Awaitable, Callable, List
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from sqlalchemy_tenants.aio import (
+    PostgresManager,
+    TenantSessionMiddleware,
+    get_request_session,
+)
+from sqlalchemy_tenants.aio.asgi import Message, RequestSessionTiming, Scope
+from sqlalchemy_tenants.core import get_tenant_role_name
+from tests.factories import new_tenant_str
+
+Handler = Callable[[Scope], Awaitable[None]]
+
+
+@pytest.fixture(scope="function")
+async def pooled_async_engine(
+    postgres_dsn_asyncpg: str,
+) -> AsyncGenerator[AsyncEngine, None]:
+    engine = create_async_engine(postgres_dsn_asyncpg, pool_size=1, max_overflow=0)
+    yield engine
+    await engine.dispose()
+
+
+async def _call(middleware: TenantSessionMiddleware) -> List[Message]:
+    messages: List[Message] = []
+
+    async def receive() -> Message:
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message: Message) -> None:
+        messages.append(message)
+
+    await middleware({"type": "http", "path": "/"}, receive, send)
+    return messages
+
+
+def _new_app(handler: Handler) -> Callable[..., Awaitable[None]]:
+    async def app(scope: Scope, receive: Any, send: Any) -> None:
+        await handler(scope)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        # The connection is back to the pool before the body is sent
+        with pytest.raises(RuntimeError):
+            await get_request_session(scope, "any")
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+class TestTenantSessionMiddleware:
+    async def test_shared_session(self, pooled_async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(pooled_async_engine, schema_name="public")
+        tenant = new_tenant_str()
+        timings: List[RequestSessionTiming] = []
+
+        async def handler(scope: Scope) -> None:
+            first = await get_request_session(scope, tenant)
+            second = await get_request_session(scope, tenant)
+            assert first is second
+            role = await first.scalar(text("SELECT current_user"))
+            assert role == get_tenant_role_name(tenant)
+            with pytest.raises(ValueError):
+                await get_request_session(scope, new_tenant_str())
+
+        middleware = TenantSessionMiddleware(
+            _new_app(handler), manager=manager, on_release=timings.append
+        )
+        messages = await _call(middleware)
+
+        assert [m["type"] for m in messages] == [
+            "http.response.start",
+            "http.response.body",
+        ]
+        assert len(timings) == 1
+        assert timings[0].tenant == tenant
+        assert timings[0].hold_seconds > 0
+        assert pooled_async_engine.sync_engine.pool.checkedout() == 0  # type: ignore[attr-defined]
+
+    async def test_session_not_used(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        timings: List[RequestSessionTiming] = []
+
+        async def handler(scope: Scope) -> None:
+            pass
+
+        middleware = TenantSessionMiddleware(
+            _new_app(handler), manager=manager, on_release=timings.append
+        )
+        await _call(middleware)
+
+        assert timings == []
+        assert await manager.list_tenants() == set()
+
+    async def test_released_on_error(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        timings: List[RequestSessionTiming] = []
+
+        async def app(scope: Scope, receive: Any, send: Any) -> None:
+            await get_request_session(scope, new_tenant_str())
+            raise ValueError("handler failed")
+
+        middleware = TenantSessionMiddleware(
+            app, manager=manager, on_release=timings.append
+        )
+        with pytest.raises(ValueError, match="handler failed"):
+            await _call(middleware)
+        assert len(timings) == 1
+
+    async def test_middleware_not_installed(self) -> None:
+        with pytest.raises(RuntimeError):
+            await get_request_session({"type": "http"}, new_tenant_str())
@@ -0,0 +1,155 @@
+import asyncio
+from pathlib import Path
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from sqlalchemy_tenants.aio import PostgresManager, TenantJobScheduler
+from sqlalchemy_tenants.aio.jobs import JobStatus
+from sqlalchemy_tenants.aio.managers import AsyncTenantSession
+from sqlalchemy_tenants.core import TenantIdentifier, get_tenant_role_name
+from sqlalchemy_tenants.exceptions import TenantNotFound
+from tests.factories import new_tenant_str
+
+
+async def _new_tenants(manager: PostgresManager, count: int) -> List[str]:
+    tenants = [new_tenant_str() for _ in range(count)]
+    for tenant in tenants:
+        await manager.create_tenant(tenant)
+    return tenants
+
+
+class TestTenantJobScheduler:
+    async def test_run(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        tenants = await _new_tenants(manager, 6)
+        databases = {t: f"db_{i % 2}" for i, t in enumerate(tenants)}
+        running: Dict[str, int] = {"db_0": 0, "db_1": 0}
+        peaks: List[int] = []
+        users: Dict[TenantIdentifier, str] = {}
+
+        async def get_database(tenant: TenantIdentifier) -> str:
+            return databases[str(tenant)]
+
+        async def job(sess: AsyncTenantSession) -> None:
+            database = databases[str(sess.tenant)]
+            running[database] += 1
+            peaks.append(max(running.values()))
+            users[sess.tenant] = str(
+                (await sess.execute(text("SELECT current_user"))).scalar()
+            )
+            await asyncio.sleep(0.01)
+            running[database] -= 1
+
+        scheduler = TenantJobScheduler(
+            manager,
+            max_concurrency=3,
+            max_concurrency_per_database=1,
+            get_database=get_database,
+        )
+        report = await scheduler.run(job, tenants)
+
+        assert report.ok
+        assert report.get_tenants(JobStatus.SUCCEEDED) == sorted(tenants)
+        assert users == {t: get_tenant_role_name(t) for t in tenants}
+        assert max(peaks) == 1
+
+    async def test_fair_queuing(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        large, small_1, small_2, other_1, other_2 = await _new_tenants(manager, 5)
+        databases = {large: "a", small_1: "a", small_2: "a"}
+        order: List[TenantIdentifier] = []
+
+        async def get_database(tenant: TenantIdentifier) -> str:
+            return databases.get(str(tenant), "b")
+
+        async def job(sess: AsyncTenantSession) -> None:
+            order.append(sess.tenant)
+
+        scheduler = TenantJobScheduler(
+            manager, max_concurrency=1, get_database=get_database
+        )
+        sizes = {small_1: 1, large: 10, small_2: 1, other_1: 1, other_2: 1}
+        await scheduler.run(job, sizes)
+
+        # The large tenant goes first, then database b catches up
+        assert order == [large, other_1, other_2, small_1, small_2]
+
+    async def test_retries(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        flaky, broken = await _new_tenants(manager, 2)
+        missing = new_tenant_str()
+        calls: Dict[TenantIdentifier, int] = {flaky: 0, broken: 0}
+
+        async def job(sess: AsyncTenantSession) -> None:
+            calls[sess.tenant] += 1
+            if sess.tenant == broken or calls[sess.tenant] == 1:
+                raise ValueError("job failed")
+
+        scheduler = TenantJobScheduler(manager, max_attempts=3, backoff=0)
+        report = await scheduler.run(job, [flaky, broken, missing])
+
+        assert not report.ok
+        assert report.statuses[flaky] is JobStatus.SUCCEEDED
+        # Missing tenants are not retried
+        assert report.attempts == {flaky: 2, broken: 3, missing: 1}
+        assert report.get_tenants(JobStatus.FAILED) == sorted([broken, missing])
+        assert report.errors[broken] == "job failed"
+        # Tenants are never created by the jobs
+        assert missing not in await manager.list_tenants()
+
+    async def test_get_database_concurrently(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        tenants = await _new_tenants(manager, 3)
+        missing = new_tenant_str()
+        resolving: List[TenantIdentifier] = []
+        peaks: List[int] = []
+
+        async def get_database(tenant: TenantIdentifier) -> str:
+            resolving.append(tenant)
+            peaks.append(len(resolving))
+            await asyncio.sleep(0.01)
+            resolving.remove(tenant)
+            if tenant == missing:
+                raise TenantNotFound(tenant)
+            return "db"
+
+        async def job(sess: AsyncTenantSession) -> None:
+            pass
+
+        scheduler = TenantJobScheduler(manager, get_database=get_database)
+        report = await scheduler.run(job, [*tenants, missing])
+
+        assert max(peaks) == 4
+        assert report.get_tenants(JobStatus.SUCCEEDED) == sorted(tenants)
+        assert report.get_tenants(JobStatus.FAILED) == [missing]
+        assert missing not in report.attempts
+
+    async def test_resume(self, async_engine: AsyncEngine, tmp_path: Path) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        tenants = await _new_tenants(manager, 3)
+        state_path = tmp_path / "state.jsonl"
+        calls: List[TenantIdentifier] = []
+        fail = True
+
+        async def job(sess: AsyncTenantSession) -> None:
+            calls.append(sess.tenant)
+            if fail and sess.tenant == tenants[0]:
+                raise ValueError("job failed")
+
+        scheduler = TenantJobScheduler(manager, max_attempts=1, state_path=state_path)
+        report = await scheduler.run(job, tenants, name="nightly")
+        assert report.get_tenants(JobStatus.FAILED) == [tenants[0]]
+
+        fail = False
+        calls.clear()
+        report = await scheduler.run(job, tenants, name="nightly")
+        assert report.ok
+        assert calls == [tenants[0]]
+        assert report.get_tenants(JobStatus.SKIPPED) == sorted(tenants[1:])
+
+        # Another job starts from scratch
+        calls.clear()
+        await scheduler.run(job, tenants, name="other")
+        assert sorted(calls) == sorted(tenants)
@@ -1,19 +1,32 @@
+import asyncio
 from random import randint
-from uuid import uuid4
+from typing import Any, AsyncGenerator, List
+from uuid import UUID, uuid4
 
 import pytest
+from alembic import command
 from alembic.config import Config
-from sqlalchemy import delete, select, text, update
+from sqlalchemy import Table, delete, event, insert, select, text, update
 from sqlalchemy.exc import ProgrammingError
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 
+from sqlalchemy_tenants.aio import managers
 from sqlalchemy_tenants.aio.managers import AsyncTenantSession, PostgresManager
-from sqlalchemy_tenants.core import get_tenant_role_name
+from sqlalchemy_tenants.core import TenantIdentifier, get_tenant_role_name
 from sqlalchemy_tenants.exceptions import (
     TenantAlreadyExists,
+    TenantMismatch,
     TenantNotFound,
 )
-from tests.conftest import TableTestTenantInt, TableTestTenantStr, TableTestTenantUUID
+from sqlalchemy_tenants.pool import RoleResetMode
+from sqlalchemy_tenants.registry import get_registry_table
+from tests.conftest import (
+    Base,
+    TableTestTenantInt,
+    TableTestTenantStr,
+    TableTestTenantStrChild,
+    TableTestTenantUUID,
+)
 from tests.factories import new_tenant_str
 
 
@@ -60,6 +73,27 @@ class TestCreateTenant:
         with pytest.raises(TenantAlreadyExists):
             await manager.create_tenant(tenant_name)
 
+    async def test_create_tenant_multiple_schemas(
+        self, async_engine: AsyncEngine, extra_schema: str
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name=["public", extra_schema],
+        )
+        tenant_name = new_tenant_str()
+        await manager.create_tenant(tenant_name)
+        async with manager.new_tenant_session(tenant_name) as sess:
+            await sess.execute(
+                text(f"INSERT INTO {extra_schema}.extra_table VALUES (1, :tenant)"),
+                {"tenant": tenant_name},
+            )
+            count = (
+                await sess.execute(
+                    text(f"SELECT count(*) FROM {extra_schema}.extra_table")
+                )
+            ).scalar()
+            assert count == 1
+
 
 class TestDeleteTenant:
     async def test_delete_tenant(self, async_engine: AsyncEngine) -> None:
@@ -82,6 +116,95 @@ class TestDeleteTenant:
             await manager.delete_tenant(new_tenant_str())
 
 
+class TestProvisioningFunctions:
+    async def test_single_statement(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        statements: List[str] = []
+
+        def _record(*args: Any) -> None:
+            statements.append(args[2])
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", _record)
+        try:
+            await manager.create_tenant(tenant)
+            with pytest.raises(TenantAlreadyExists):
+                await manager.create_tenant(tenant)
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", _record)
+
+        # The functions are looked up once, then each tenant is a single call
+        assert len(statements) == 3
+        assert all("sqlalchemy_tenants_create_tenant(" in s for s in statements[1:])
+        async with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            result = await sess.scalars(select(TableTestTenantStr))
+            assert result.all() == []
+        await manager.delete_tenant(tenant)
+        assert tenant not in await manager.list_tenants()
+        with pytest.raises(TenantNotFound):
+            await manager.delete_tenant(tenant)
+
+    async def test_checked_again(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(managers, "PROVISIONING_FUNCTIONS_TTL", 0.0)
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        await manager.create_tenant(new_tenant_str())
+        statements: List[str] = []
+
+        def _record(*args: Any) -> None:
+            statements.append(args[2])
+
+        await asyncio.to_thread(
+            command.revision, alembic_config, message="init", autogenerate=True
+        )
+        await asyncio.to_thread(command.upgrade, alembic_config, "head")
+        event.listen(async_engine.sync_engine, "before_cursor_execute", _record)
+        try:
+            await manager.create_tenant(new_tenant_str())
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", _record)
+            await asyncio.to_thread(command.downgrade, alembic_config, "base")
+        # The functions added by the migration are found
+        assert len(statements) == 2
+        assert "sqlalchemy_tenants_create_tenant(" in statements[1]
+
+    async def test_mixed_case_schema(self, async_engine: AsyncEngine) -> None:
+        async with async_engine.begin() as conn:
+            await conn.execute(text('CREATE SCHEMA "TenantData"'))
+        try:
+            manager = PostgresManager.from_engine(
+                async_engine,
+                schema_name=["public", "TenantData"],
+            )
+            tenant = new_tenant_str()
+            await manager.create_tenant(tenant)
+            async with async_engine.connect() as conn:
+                granted = await conn.scalar(
+                    text("SELECT has_schema_privilege(:role, 'TenantData', 'USAGE')"),
+                    {"role": get_tenant_role_name(tenant)},
+                )
+            assert granted
+            await manager.delete_tenant(tenant)
+        finally:
+            async with async_engine.begin() as conn:
+                await conn.execute(text('DROP SCHEMA "TenantData" CASCADE'))
+
+
 class TestTenantSession:
     async def test_tenant_not_found(self, async_engine: AsyncEngine) -> None:
         manager = PostgresManager.from_engine(
@@ -116,6 +239,67 @@ class TestTenantSession:
             user = (await sess.execute(text("SELECT current_user"))).scalar()
             assert user == get_tenant_role_name(tenant_name)
 
+    async def test_role_kept_across_transactions(
+        self, async_engine: AsyncEngine
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        tenant_name = new_tenant_str()
+        role = get_tenant_role_name(tenant_name)
+        async with manager.new_tenant_session(tenant_name) as sess:
+            await sess.commit()
+            assert (await sess.execute(text("SELECT current_user"))).scalar() == role
+            await sess.rollback()
+            assert (await sess.execute(text("SELECT current_user"))).scalar() == role
+
+
+class TestReleaseBetweenTransactions:
+    async def test_role_set_on_each_transaction(
+        self, postgres_dsn_asyncpg: str
+    ) -> None:
+        engine = create_async_engine(postgres_dsn_asyncpg, pool_size=1)
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+            release_between_transactions=True,
+        )
+        tenant_name = new_tenant_str()
+        pool = engine.sync_engine.pool
+        try:
+            async with manager.new_tenant_session(tenant_name) as sess:
+                assert pool.checkedout() == 0  # type: ignore[attr-defined]
+                user = (await sess.execute(text("SELECT current_user"))).scalar()
+                assert user == get_tenant_role_name(tenant_name)
+                assert pool.checkedout() == 1  # type: ignore[attr-defined]
+                await sess.commit()
+                assert pool.checkedout() == 0  # type: ignore[attr-defined]
+                # The role was local to the transaction, on the same connection
+                async with engine.connect() as conn:
+                    user = (await conn.execute(text("SELECT current_user"))).scalar()
+                    assert user == "postgres"
+                user = (await sess.execute(text("SELECT current_user"))).scalar()
+                assert user == get_tenant_role_name(tenant_name)
+        finally:
+            await engine.dispose()
+
+    async def test_tenant_not_found(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+            release_between_transactions=True,
+        )
+        with pytest.raises(TenantNotFound):
+            async with manager.new_tenant_session(
+                tenant=new_tenant_str(), create_if_missing=False
+            ):
+                pass
+        tenant_name = new_tenant_str()
+        async with manager.new_tenant_session(tenant_name):
+            pass
+        assert tenant_name in await manager.list_tenants()
+
 
 class TestAdminSession:
     async def test_admin_session(self, async_engine: AsyncEngine) -> None:
@@ -129,6 +313,197 @@ class TestAdminSession:
             assert user == manager.engine.url.username
 
 
+class TestCloneTenant:
+    async def test_same_tenant(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        with pytest.raises(ValueError):
+            await manager.clone_tenant(tenant, tenant, Base.metadata)
+
+    async def test_clone_remap_ids(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        source = new_tenant_str()
+        target = new_tenant_str()
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        await manager.create_tenant(source)
+        await manager.create_tenant(target)
+        async with manager.new_session() as sess:
+            result = await sess.scalars(
+                insert(TableTestTenantStr).returning(TableTestTenantStr.id),
+                [{"name": f"Row {i}", "tenant": source} for i in range(3)],
+            )
+            parent_ids = result.all()
+            await sess.execute(
+                insert(TableTestTenantStrChild),
+                [{"parent_id": i, "tenant": source} for i in parent_ids],
+            )
+            await sess.commit()
+
+        copied = await manager.clone_tenant(
+            source, target, Base.metadata, remap_ids=True, batch_size=2
+        )
+
+        assert copied[TableTestTenantStr.__tablename__] == 3
+        assert copied[TableTestTenantStrChild.__tablename__] == 3
+        assert TableTestTenantInt.__tablename__ not in copied
+        async with manager.new_tenant_session(tenant=target) as sess:
+            parents = (await sess.scalars(select(TableTestTenantStr))).all()
+            children = (await sess.scalars(select(TableTestTenantStrChild))).all()
+        assert sorted(p.name for p in parents) == ["Row 0", "Row 1", "Row 2"]
+        assert not {p.id for p in parents} & set(parent_ids)
+        assert {c.parent_id for c in children} == {p.id for p in parents}
+        # The source tenant data is left untouched
+        async with manager.new_tenant_session(tenant=source) as sess:
+            source_ids = (await sess.scalars(select(TableTestTenantStr.id))).all()
+        assert sorted(source_ids) == sorted(parent_ids)
+
+    async def test_clone_uuid_tenant_as_str(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        source = str(uuid4())
+        target = str(uuid4())
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        await manager.create_tenant(source)
+        await manager.create_tenant(target)
+        async with manager.new_session() as sess:
+            await sess.execute(
+                insert(TableTestTenantUUID),
+                [{"name": f"Row {i}", "tenant": UUID(source)} for i in range(3)],
+            )
+            await sess.commit()
+
+        copied = await manager.clone_tenant(
+            source, target, Base.metadata, remap_ids=True
+        )
+
+        assert copied[TableTestTenantUUID.__tablename__] == 3
+        async with manager.new_session() as sess:
+            tenants = (await sess.scalars(select(TableTestTenantUUID.tenant))).all()
+        assert sorted(map(str, tenants)) == sorted([source] * 3 + [target] * 3)
+
+
+class TestTenantColumn:
+    async def test_orm_populated_on_flush(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        async with manager.new_tenant_session(tenant=tenant) as sess:
+            row = TableTestTenantStr(id=1, name="Row", tenant=None)  # type: ignore[arg-type]
+            sess.add(row)
+            await sess.flush()
+            assert row.tenant == tenant
+            await sess.rollback()
+
+    async def test_orm_mismatch(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        async with manager.new_tenant_session(tenant=new_tenant_str()) as sess:
+            sess.add(TableTestTenantStr(id=1, name="Row", tenant=new_tenant_str()))
+            with pytest.raises(TenantMismatch):
+                await sess.flush()
+
+    async def test_core_insert_populated(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        async with manager.new_tenant_session(tenant=tenant) as sess:
+            await sess.execute(insert(TableTestTenantStr).values(id=1, name="Row 1"))
+            await sess.execute(
+                insert(TableTestTenantStr),
+                [{"id": 2, "name": "Row 2"}, {"id": 3, "name": "Row 3"}],
+            )
+            tenants = (await sess.scalars(select(TableTestTenantStr.tenant))).all()
+            await sess.rollback()
+        assert tenants == [tenant, tenant, tenant]
+
+    async def test_core_insert_mismatch(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+        )
+        async with manager.new_tenant_session(tenant=new_tenant_str()) as sess:
+            with pytest.raises(TenantMismatch):
+                await sess.execute(
+                    insert(TableTestTenantStr).values(
+                        id=1, name="Row", tenant=new_tenant_str()
+                    )
+                )
+            with pytest.raises(TenantMismatch):
+                await sess.execute(
+                    insert(TableTestTenantStr),
+                    [{"id": 1, "name": "Row", "tenant": new_tenant_str()}],
+                )
+
+
+class TestTenantFilter:
+    async def test_inject_tenant_filter(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+            inject_tenant_filter=True,
+        )
+        tenant = new_tenant_str()
+        statements: List[str] = []
+
+        def capture(*args: Any) -> None:
+            statements.append(args[2])
+
+        event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+        try:
+            async with manager.new_tenant_session(tenant) as sess:
+                await sess.execute(select(TableTestTenantStr))
+                await sess.execute(update(TableTestTenantStr).values(name="Updated"))
+                await sess.execute(delete(TableTestTenantStr))
+        finally:
+            event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+
+        table_statements = [
+            s for s in statements if TableTestTenantStr.__tablename__ in s
+        ]
+        assert len(table_statements) == 3
+        assert all(
+            f"{TableTestTenantStr.__tablename__}.tenant = " in s
+            for s in table_statements
+        )
+
+
 class TestRLSIsEnforced:
     async def test_int(
         self,
@@ -253,9 +628,19 @@ class TestRLSIsEnforced:
                 assert all(r.tenant == tenant for r in tenant_curs)
         # Check that tenant-1 can't insert data for tenant-2
         async with manager.new_tenant_session(tenant=tenant_1) as sess:
-            with pytest.raises(ProgrammingError):
+            with pytest.raises(TenantMismatch):
                 sess.add(TableTestTenantStr(id=5, name="Invalid Row", tenant=tenant_2))
                 await sess.commit()
+        async with manager.new_tenant_session(tenant=tenant_1) as sess:
+            with pytest.raises(ProgrammingError):
+                await sess.execute(
+                    text(
+                        f"INSERT INTO {TableTestTenantStr.__tablename__} "
+                        "(id, name, tenant) VALUES (5, 'Invalid Row', :tenant)"
+                    ),
+                    {"tenant": tenant_2},
+                )
+                await sess.commit()
         # Check that tenant-1 can't delete data for tenant-2
         async with manager.new_tenant_session(tenant=tenant_1) as sess:
             await sess.execute(
@@ -286,3 +671,103 @@ class TestRLSIsEnforced:
 
 def test_new_async_tenant_session_dont_break() -> None:
     _ = AsyncTenantSession(tenant="test")
+
+
+@pytest.fixture
+async def registry(async_engine: AsyncEngine) -> AsyncGenerator[Table, None]:
+    table = get_registry_table()
+    async with async_engine.begin() as conn:
+        await conn.run_sync(table.create)
+    yield table
+    async with async_engine.begin() as conn:
+        await conn.run_sync(table.drop)
+
+
+class TestRegistry:
+    async def test_create_and_delete(
+        self, async_engine: AsyncEngine, registry: Table
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine, schema_name="public", registry=registry
+        )
+        tenants: List[TenantIdentifier] = [new_tenant_str(), randint(1, 10**9), uuid4()]
+        for tenant in tenants:
+            await manager.create_tenant(tenant)
+        assert await manager.list_tenants() == set(tenants)
+        assert await manager.count_tenants() == 3
+        page = await manager.list_tenants_page(limit=2)
+        assert page == sorted(tenants, key=str)[:2]
+        assert await manager.list_tenants_page(after=page[-1]) == [
+            sorted(tenants, key=str)[2]
+        ]
+
+        await manager.delete_tenant(tenants[0])
+        assert not await manager.tenant_exists(tenants[0])
+        assert await manager.tenant_exists(tenants[1])
+        with pytest.raises(TenantNotFound):
+            await manager.delete_tenant(tenants[0])
+
+    async def test_provisioning_functions(
+        self,
+        async_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+        registry: Table,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine, schema_name="public", registry=registry
+        )
+        tenant = uuid4()
+        await manager.create_tenant(tenant)
+        with pytest.raises(TenantAlreadyExists):
+            await manager.create_tenant(tenant)
+        assert await manager.list_tenants() == {tenant}
+        async with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            with pytest.raises(ProgrammingError, match="permission denied"):
+                await sess.execute(select(registry))
+            await sess.rollback()
+            with pytest.raises(ProgrammingError, match="permission denied"):
+                await sess.execute(delete(registry))
+        await manager.delete_tenant(tenant)
+        assert await manager.count_tenants() == 0
+
+    async def test_backfill(self, async_engine: AsyncEngine, registry: Table) -> None:
+        tenant = new_tenant_str()
+        await PostgresManager.from_engine(
+            async_engine, schema_name="public"
+        ).create_tenant(tenant)
+        manager = PostgresManager.from_engine(
+            async_engine, schema_name="public", registry=registry
+        )
+        assert await manager.backfill_registry() == 1
+        assert await manager.list_tenants() == {tenant}
+        # The tenant was granted the registry with the other tables
+        async with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            with pytest.raises(ProgrammingError, match="permission denied"):
+                await sess.execute(select(registry))
+
+
+class TestRoleReset:
+    @pytest.mark.parametrize(
+        "role_reset", [RoleResetMode.RESET_ROLE, RoleResetMode.DISCARD_ALL]
+    )
+    async def test_admin_session_after_tenant_session(
+        self, postgres_dsn_asyncpg: str, role_reset: RoleResetMode
+    ) -> None:
+        engine = create_async_engine(postgres_dsn_asyncpg, pool_size=1, max_overflow=0)
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", role_reset=role_reset
+        )
+        tenant = new_tenant_str()
+        stmt = text("SELECT current_user")
+        try:
+            for _ in range(2):
+                # The prepared statements survive the reset, or are prepared again
+                async with manager.new_tenant_session(tenant) as sess:
+                    role = (await sess.execute(stmt)).scalar_one()
+                    assert role == get_tenant_role_name(tenant)
+                    await sess.commit()
+                async with manager.new_session() as sess:
+                    assert (await sess.execute(stmt)).scalar_one() == "postgres"
+        finally:
+            await engine.dispose()
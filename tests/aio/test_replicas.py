@@ -0,0 +1,106 @@
+from typing import Any, AsyncGenerator, List
+
+import pytest
+from alembic.config import Config
+from sqlalchemy import NullPool, event, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from sqlalchemy_tenants.aio import PostgresManager, ReplicaSet
+from sqlalchemy_tenants.core import get_tenant_role_name
+from tests.conftest import TableTestTenantStr
+from tests.factories import new_tenant_str
+
+
+@pytest.fixture(scope="function")
+async def replica_engine(
+    async_engine: AsyncEngine,
+) -> AsyncGenerator[AsyncEngine, None]:
+    # A second engine on the same database stands in for a replica
+    replica = create_async_engine(async_engine.url, poolclass=NullPool)
+    yield replica
+    await replica.dispose()
+
+
+def _record_statements(engine: AsyncEngine) -> List[str]:
+    statements: List[str] = []
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _before_cursor_execute(_: Any, __: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    return statements
+
+
+class TestReplicaSet:
+    async def test_round_robin(
+        self, async_engine: AsyncEngine, replica_engine: AsyncEngine
+    ) -> None:
+        replicas = ReplicaSet([async_engine, replica_engine])
+        assert [await replicas.get_engine() for _ in range(4)] == [
+            async_engine,
+            replica_engine,
+            async_engine,
+            replica_engine,
+        ]
+
+    async def test_lag(self, replica_engine: AsyncEngine) -> None:
+        replicas = ReplicaSet([replica_engine], max_lag=1.0)
+        assert await replicas.get_lag(replica_engine) == 0
+        assert await replicas.get_engine() is replica_engine
+
+    async def test_unreachable_skipped(self, replica_engine: AsyncEngine) -> None:
+        unreachable = create_async_engine(replica_engine.url.set(port=1))
+        replicas = ReplicaSet([unreachable, replica_engine], max_lag=1.0)
+        assert [await replicas.get_engine() for _ in range(2)] == [
+            replica_engine,
+            replica_engine,
+        ]
+
+
+class TestReplicaSessions:
+    async def test_readonly(
+        self, async_engine: AsyncEngine, replica_engine: AsyncEngine
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+            replicas=ReplicaSet([replica_engine]),
+        )
+        tenant = new_tenant_str()
+        await manager.create_tenant(tenant)
+        statements = _record_statements(replica_engine)
+        async with manager.new_tenant_session(tenant, readonly=True) as sess:
+            user = (await sess.execute(text("SELECT current_user"))).scalar()
+            assert user == get_tenant_role_name(tenant)
+        assert "SELECT current_user" in statements
+
+    async def test_route_reads(
+        self,
+        async_engine: AsyncEngine,
+        replica_engine: AsyncEngine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            async_engine,
+            schema_name="public",
+            replicas=ReplicaSet([replica_engine]),
+            route_reads=True,
+        )
+        tenant = new_tenant_str()
+        await manager.create_tenant(tenant)
+        replica_statements = _record_statements(replica_engine)
+        primary_statements = _record_statements(async_engine)
+        async with manager.new_tenant_session(tenant) as sess:
+            assert (await sess.scalars(select(TableTestTenantStr))).all() == []
+            assert len(replica_statements) == 2  # The role and the select
+            assert primary_statements == []
+
+            sess.add(TableTestTenantStr(id=1, name="Row", tenant=tenant))
+            await sess.flush()
+            # The session reads its own writes from the primary
+            rows = (await sess.scalars(select(TableTestTenantStr))).all()
+            assert [r.name for r in rows] == ["Row"]
+            assert len(replica_statements) == 2
+            await sess.commit()
+        assert primary_statements[0].startswith("SET LOCAL ROLE")
@@ -0,0 +1,97 @@
+from typing import AsyncGenerator
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+
+from sqlalchemy_tenants.aio.schemas import SchemaPerTenantManager
+from sqlalchemy_tenants.core import get_tenant_schema_name
+from sqlalchemy_tenants.exceptions import TenantAlreadyExists, TenantNotFound
+from tests.factories import new_tenant_str
+from tests.test_schemas import SchemaBase, SchemaItem
+
+
+@pytest.fixture(autouse=True)
+async def cleanup_schemas(async_engine: AsyncEngine) -> AsyncGenerator[None, None]:
+    yield
+    async with async_engine.begin() as conn:
+        schemas = await conn.scalars(
+            text(
+                "SELECT nspname FROM pg_namespace "
+                "WHERE nspname LIKE 'tenant_schema_test%'"
+            )
+        )
+        for schema in schemas.all():
+            await conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+
+
+def _new_manager(async_engine: AsyncEngine) -> SchemaPerTenantManager:
+    return SchemaPerTenantManager.from_engine(
+        async_engine, metadata=SchemaBase.metadata
+    )
+
+
+class TestSchemaPerTenantManager:
+    async def test_create_list_delete(self, async_engine: AsyncEngine) -> None:
+        manager = _new_manager(async_engine)
+        tenant = new_tenant_str()
+        await manager.create_tenant(tenant)
+        assert tenant in await manager.list_tenants()
+        with pytest.raises(TenantAlreadyExists):
+            await manager.create_tenant(tenant)
+        await manager.delete_tenant(tenant)
+        assert tenant not in await manager.list_tenants()
+
+    async def test_tenant_session_isolation(self, async_engine: AsyncEngine) -> None:
+        manager = _new_manager(async_engine)
+        tenant_1 = new_tenant_str()
+        tenant_2 = new_tenant_str()
+        await manager.create_tenant(tenant_1)
+        await manager.create_tenant(tenant_2)
+        async with manager.new_tenant_session(tenant_1) as sess:
+            sess.add(SchemaItem(name="Item"))
+            await sess.commit()
+        async with manager.new_tenant_session(tenant_2) as sess:
+            assert (await sess.scalars(select(SchemaItem))).all() == []
+        async with manager.new_tenant_session(tenant_1) as sess:
+            items = (await sess.scalars(select(SchemaItem))).all()
+            assert [i.name for i in items] == ["Item"]
+        async with manager.new_session() as sess:
+            path = (await sess.execute(text("SHOW search_path"))).scalar()
+            assert get_tenant_schema_name(tenant_1) not in str(path)
+
+    async def test_search_path_reset_on_return(self, postgres_dsn_asyncpg: str) -> None:
+        engine = create_async_engine(postgres_dsn_asyncpg, pool_size=1, max_overflow=0)
+        manager = _new_manager(engine)
+        tenant = new_tenant_str()
+        try:
+            async with manager.new_tenant_session(tenant) as sess:
+                sess.add(SchemaItem(name="Item"))
+                await sess.commit()
+                items = (await sess.scalars(select(SchemaItem.name))).all()
+                assert items == ["Item"]
+            async with engine.connect() as conn:
+                path = (await conn.execute(text("SHOW search_path"))).scalar()
+            assert get_tenant_schema_name(tenant) not in str(path)
+        finally:
+            await engine.dispose()
+
+    async def test_tenant_not_found(self, async_engine: AsyncEngine) -> None:
+        manager = _new_manager(async_engine)
+        with pytest.raises(TenantNotFound):
+            async with manager.new_tenant_session(
+                new_tenant_str(), create_if_missing=False
+            ):
+                pass
+
+    async def test_clone_tenant(self, async_engine: AsyncEngine) -> None:
+        manager = _new_manager(async_engine)
+        source = new_tenant_str()
+        target = new_tenant_str()
+        await manager.create_tenant(source)
+        await manager.create_tenant(target)
+        async with manager.new_tenant_session(source) as sess:
+            sess.add_all([SchemaItem(name=f"Item {i}") for i in range(3)])
+            await sess.commit()
+        copied = await manager.clone_tenant(source, target, SchemaBase.metadata)
+        assert copied == {SchemaItem.__tablename__: 3}
@@ -0,0 +1,35 @@
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from sqlalchemy_tenants.aio.managers import AsyncTenantSession, PostgresManager
+from sqlalchemy_tenants.aio.scoped import ScopedTenantSession
+from sqlalchemy_tenants.context import get_current_tenant, tenant_context
+from sqlalchemy_tenants.core import get_tenant_role_name
+from tests.factories import new_tenant_str
+
+
+class TestScopedTenantSession:
+    async def test_reuse(self, async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(async_engine, schema_name="public")
+        sessions = ScopedTenantSession(manager)
+        tenant = new_tenant_str()
+
+        async def _nested() -> AsyncTenantSession:
+            async with sessions.session() as sess:
+                await sess.execute(text("SELECT 1"))
+                return sess
+
+        with tenant_context(tenant):
+            async with sessions.session() as outer:
+                assert await _nested() is outer
+                user = await outer.execute(text("SELECT current_user"))
+                assert user.scalar_one() == get_tenant_role_name(tenant)
+                # Concurrent tasks inherit the tenant, not the session
+                tasks = await asyncio.gather(_nested(), _nested())
+                assert outer not in tasks
+                assert tasks[0] is not tasks[1]
+                assert all(s.tenant == tenant for s in tasks)
+            assert sessions.get() is None
+        assert get_current_tenant() is None
@@ -0,0 +1,123 @@
+from typing import AsyncGenerator
+
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from sqlalchemy_tenants.aio.managers import PostgresManager
+from sqlalchemy_tenants.aio.sharding import (
+    ConsistentHashPlacement,
+    DirectoryPlacement,
+    Placement,
+    ShardedManager,
+)
+from sqlalchemy_tenants.exceptions import TenantNotFound
+from tests.factories import new_tenant_str
+
+SHARDS = ["shard-1", "shard-2"]
+
+
+@pytest.fixture(scope="function")
+async def directory(
+    async_engine: AsyncEngine,
+) -> AsyncGenerator[DirectoryPlacement, None]:
+    placement = DirectoryPlacement(
+        async_engine, default=ConsistentHashPlacement(SHARDS)
+    )
+    await placement.create_table()
+    yield placement
+    async with async_engine.begin() as conn:
+        await conn.run_sync(placement.table.drop)
+
+
+def _new_sharded_manager(engine: AsyncEngine, placement: Placement) -> ShardedManager:
+    return ShardedManager(
+        {
+            shard: PostgresManager.from_engine(engine, schema_name="public")
+            for shard in SHARDS
+        },
+        placement=placement,
+    )
+
+
+class TestShardedManager:
+    async def test_consistent_hash_routing(self, async_engine: AsyncEngine) -> None:
+        placement = ConsistentHashPlacement(SHARDS)
+        manager = _new_sharded_manager(async_engine, placement)
+        tenant = new_tenant_str()
+        await manager.create_tenant(tenant)
+        shard = await placement.get_shard(tenant)
+        assert await manager.get_manager(tenant) is manager.managers[shard]
+        assert tenant in await manager.list_tenants()
+        async with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            assert sess.tenant == tenant
+        await manager.delete_tenant(tenant)
+        assert tenant not in await manager.list_tenants()
+
+    async def test_directory_routing(
+        self, async_engine: AsyncEngine, directory: DirectoryPlacement
+    ) -> None:
+        manager = _new_sharded_manager(async_engine, directory)
+        tenant = new_tenant_str()
+        with pytest.raises(TenantNotFound):
+            await manager.get_manager(tenant)
+        await manager.create_tenant(tenant)
+        directory.invalidate()
+        expected = await directory.default.get_shard(tenant)
+        assert await directory.get_shard(tenant) == expected
+        await manager.delete_tenant(tenant)
+        with pytest.raises(TenantNotFound):
+            await directory.get_shard(tenant)
+
+    async def test_directory_cache_expires(
+        self, async_engine: AsyncEngine, directory: DirectoryPlacement
+    ) -> None:
+        tenant = new_tenant_str()
+        shard = await directory.add_tenant(tenant)
+        other_shard = next(s for s in SHARDS if s != shard)
+        # Another process, with its own cache
+        cached = DirectoryPlacement(
+            async_engine, default=directory.default, table=directory.table
+        )
+        expiring = DirectoryPlacement(
+            async_engine, default=directory.default, table=directory.table, cache_ttl=0
+        )
+        assert await cached.get_shard(tenant) == shard
+        assert await expiring.get_shard(tenant) == shard
+
+        await directory.move_tenant(tenant, other_shard)
+
+        assert await expiring.get_shard(tenant) == other_shard
+        assert await cached.get_shard(tenant) == shard
+        cached.invalidate(tenant)
+        assert await cached.get_shard(tenant) == other_shard
+
+    async def test_directory_create_if_missing(
+        self, async_engine: AsyncEngine, directory: DirectoryPlacement
+    ) -> None:
+        manager = _new_sharded_manager(async_engine, directory)
+        tenant = new_tenant_str()
+        async with manager.new_tenant_session(tenant) as sess:
+            assert sess.tenant == tenant
+        assert await directory.get_shard(tenant) in SHARDS
+
+    async def test_directory_not_writable_by_tenants(
+        self, async_engine: AsyncEngine, directory: DirectoryPlacement
+    ) -> None:
+        manager = _new_sharded_manager(async_engine, directory)
+        tenant = new_tenant_str()
+        await manager.create_tenant(tenant)
+        async with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            with pytest.raises(ProgrammingError, match="permission denied"):
+                await sess.execute(update(directory.table).values(shard="other"))
+        directory.invalidate()
+        assert await directory.get_shard(tenant) in SHARDS
+
+    async def test_new_session_requires_shard(self, async_engine: AsyncEngine) -> None:
+        manager = _new_sharded_manager(async_engine, ConsistentHashPlacement(SHARDS))
+        with pytest.raises(ValueError):
+            async with manager.new_session():
+                pass
+        async with manager.new_session(SHARDS[0]) as sess:
+            assert sess is not None
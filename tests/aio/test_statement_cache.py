@@ -0,0 +1,115 @@
+from typing import Any, AsyncGenerator, List
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+
+from sqlalchemy_tenants.aio import (
+    PostgresManager,
+    StatementCacheMode,
+    get_asyncpg_connect_args,
+)
+from sqlalchemy_tenants.core import get_tenant_role_name
+from tests.factories import new_tenant_str
+
+
+@pytest.fixture(scope="function")
+async def pooled_async_engine(
+    postgres_dsn_asyncpg: str,
+) -> AsyncGenerator[AsyncEngine, None]:
+    engine = create_async_engine(
+        postgres_dsn_asyncpg,
+        pool_size=1,
+        max_overflow=0,
+        connect_args=get_asyncpg_connect_args(pgbouncer=True),
+    )
+    yield engine
+    await engine.dispose()
+
+
+async def _get_statement_cache(sess: AsyncSession) -> Any:
+    conn = await sess.connection()
+    raw = await conn.get_raw_connection()
+    return raw.dbapi_connection._prepared_statement_cache  # type: ignore[union-attr]
+
+
+class TestStatementCache:
+    async def test_per_role(self, pooled_async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(
+            pooled_async_engine,
+            schema_name="public",
+            statement_cache_mode=StatementCacheMode.PER_ROLE,
+        )
+        tenant_1 = new_tenant_str()
+        tenant_2 = new_tenant_str()
+        await manager.create_tenant(tenant_1)
+        await manager.create_tenant(tenant_2)
+        caches: List[Any] = []
+        for tenant in [tenant_1, tenant_2, tenant_1]:
+            async with manager.new_tenant_session(tenant) as sess:
+                await sess.execute(text("SELECT current_user"))
+                caches.append(await _get_statement_cache(sess))
+        assert caches[0] is caches[2]
+        assert caches[0] is not caches[1]
+        assert "SELECT current_user" in caches[0]
+
+    async def test_reset(self, pooled_async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(
+            pooled_async_engine,
+            schema_name="public",
+            statement_cache_mode=StatementCacheMode.RESET,
+        )
+        tenant_1 = new_tenant_str()
+        tenant_2 = new_tenant_str()
+        await manager.create_tenant(tenant_1)
+        await manager.create_tenant(tenant_2)
+        async with manager.new_tenant_session(tenant_1) as sess:
+            await sess.execute(text("SELECT current_user"))
+            assert "SELECT current_user" in await _get_statement_cache(sess)
+        async with manager.new_tenant_session(tenant_2) as sess:
+            assert "SELECT current_user" not in await _get_statement_cache(sess)
+            user = (await sess.execute(text("SELECT current_user"))).scalar()
+            assert user == get_tenant_role_name(tenant_2)
+
+    async def test_per_role_release_between_transactions(
+        self, pooled_async_engine: AsyncEngine
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            pooled_async_engine,
+            schema_name="public",
+            statement_cache_mode=StatementCacheMode.PER_ROLE,
+            release_between_transactions=True,
+        )
+        tenant_1 = new_tenant_str()
+        tenant_2 = new_tenant_str()
+        await manager.create_tenant(tenant_1)
+        await manager.create_tenant(tenant_2)
+        async with (
+            manager.new_tenant_session(tenant_1) as sess_1,
+            manager.new_tenant_session(tenant_2) as sess_2,
+        ):
+            # Both sessions share the only connection, one transaction at a time
+            await sess_1.execute(text("SELECT current_user"))
+            cache_1 = await _get_statement_cache(sess_1)
+            await sess_1.commit()
+            cache_2 = await _get_statement_cache(sess_2)
+            await sess_2.commit()
+            assert cache_1 is not cache_2
+            assert "SELECT current_user" in cache_1
+            assert "SELECT current_user" not in cache_2
+
+    async def test_warmup(self, pooled_async_engine: AsyncEngine) -> None:
+        manager = PostgresManager.from_engine(pooled_async_engine, schema_name="public")
+        stats = manager.track_compiled_cache()
+        stmt = manager.register_warmup(select(func.current_user()))
+        tenant = new_tenant_str()
+        await manager.create_tenant(tenant)
+
+        assert await manager.warmup(tenant) == 1
+
+        async with manager.new_tenant_session(tenant) as sess:
+            cache = await _get_statement_cache(sess)
+            assert any("CURRENT_USER" in sql for sql in cache)
+            user = (await sess.execute(stmt)).scalar()
+            assert user == get_tenant_role_name(tenant)
+        assert (stats.hits, stats.misses) == (1, 0)
@@ -0,0 +1,25 @@
+from alembic import context
+from sqlalchemy import create_engine, pool, text
+
+from sqlalchemy_tenants.migrations import get_migration_tenant_schema
+
+config = context.config
+
+
+def run_migrations_online() -> None:
+    schema = get_migration_tenant_schema(config)
+    engine = create_engine(
+        config.get_main_option("sqlalchemy.url") or "",
+        poolclass=pool.NullPool,
+    )
+    with engine.connect() as connection:
+        if schema is not None:
+            connection.execute(text(f'SET search_path TO "{schema}"'))
+            connection.commit()
+            connection.dialect.default_schema_name = schema
+        context.configure(connection=connection, version_table_schema=schema)
+        with context.begin_transaction():
+            context.run_migrations()
+
+
+run_migrations_online()
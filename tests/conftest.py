@@ -8,7 +8,7 @@ from uuid import UUID
 import pytest
 from alembic import command
 from alembic.config import Config
-from sqlalchemy import Engine, NullPool, create_engine, text
+from sqlalchemy import Engine, ForeignKey, NullPool, create_engine, text
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, MappedAsDataclass, mapped_column
 
@@ -28,6 +28,15 @@ class TableTestTenantStr(Base):
     tenant: Mapped[str] = mapped_column()
 
 
+@with_rls
+class TableTestTenantStrChild(Base):
+    __tablename__ = "test_table_tenant_str_child"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    parent_id: Mapped[int] = mapped_column(ForeignKey("test_table_tenant_str.id"))
+    tenant: Mapped[str] = mapped_column()
+
+
 @with_rls
 class TableTestTenantInt(Base):
     __tablename__ = "test_table_tenant_int"
@@ -138,6 +147,21 @@ def async_engine(postgres_dsn_asyncpg: str) -> AsyncEngine:
     )
 
 
+EXTRA_SCHEMA = "tests_extra"
+
+
+@pytest.fixture(scope="function")
+def extra_schema(engine: Engine) -> Generator[str, None, None]:
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE SCHEMA {EXTRA_SCHEMA}"))
+        conn.execute(
+            text(f"CREATE TABLE {EXTRA_SCHEMA}.extra_table (id int, tenant varchar)")
+        )
+    yield EXTRA_SCHEMA
+    with engine.begin() as conn:
+        conn.execute(text(f"DROP SCHEMA {EXTRA_SCHEMA} CASCADE"))
+
+
 @pytest.fixture(autouse=True)
 async def cleanup_roles(async_engine: AsyncEngine) -> AsyncGenerator[None, None]:
     yield
@@ -1,12 +1,73 @@
+import gc
+import subprocess
+import sys
+import weakref
 from pathlib import Path
+from typing import Generator, List
+from uuid import UUID
 
 import pytest
-from sqlalchemy.orm import Mapped, mapped_column
+from alembic.operations import MigrationScript, ops
+from alembic.runtime.migration import MigrationContext
+from sqlalchemy import Engine, ForeignKey, MetaData, insert, text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
-from sqlalchemy_tenants.core import get_table_policy, with_rls
+from sqlalchemy_tenants.core import (
+    RLS_REGISTRY,
+    TenantCodec,
+    coerce_tenant,
+    get_process_revision_directives,
+    get_rls_tables,
+    get_table_policy,
+    get_tenant_rls_tables,
+    get_tenant_role_name,
+    is_rls_enabled,
+    verify_rls,
+    with_rls,
+)
 from tests.conftest import Base, TableTestTenantStr
 
 
+@pytest.fixture
+def extra_table(engine: Engine) -> Generator[str, None, None]:
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE extra_table (id int, tenant varchar)"))
+    yield "extra_table"
+    with engine.begin() as conn:
+        conn.execute(text("DROP TABLE extra_table"))
+
+
+def _run_hook(engine: Engine, metadata: MetaData) -> MigrationScript:
+    script = MigrationScript(
+        rev_id="test",
+        upgrade_ops=ops.UpgradeOps(ops=[]),
+        downgrade_ops=ops.DowngradeOps(ops=[]),
+    )
+    fn = get_process_revision_directives(metadata)
+    with engine.connect() as conn:
+        fn(MigrationContext.configure(conn), "head", [script])
+    return script
+
+
+def _get_sql(operations: ops.OpContainer) -> List[str]:
+    return [
+        str(op.sqltext) for op in operations.ops if isinstance(op, ops.ExecuteSQLOp)
+    ]
+
+
+@pytest.fixture
+def tenant_functions(engine: Engine) -> Generator[None, None, None]:
+    # Install the functions created by the migrations
+    script = _run_hook(engine, MetaData())
+    with engine.begin() as conn:
+        for sql in _get_sql(script.upgrade_ops):  # type: ignore[arg-type]
+            conn.execute(text(sql))
+    yield
+    with engine.begin() as conn:
+        for sql in _get_sql(script.downgrade_ops):  # type: ignore[arg-type]
+            conn.execute(text(f"{sql} CASCADE"))
+
+
 class TestWithRLS:
     def test_missing_tenant_column(self) -> None:
         class MissingTenantTable(Base):
@@ -53,3 +114,287 @@ class TestWithRLS:
             column_type=str,
         )
         assert expected_policy in migration_content, migration_content
+
+
+class TestProcessRevisionDirectives:
+    def test_schema_qualified_tables(
+        self,
+        engine: Engine,
+        extra_schema: str,
+        extra_table: str,
+        tenant_functions: None,
+    ) -> None:
+        class SchemaBase(DeclarativeBase):
+            pass
+
+        @with_rls
+        class PublicTable(SchemaBase):
+            __tablename__ = "extra_table"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[str] = mapped_column()
+
+        @with_rls
+        class ExtraTable(SchemaBase):
+            __tablename__ = "extra_table"
+            __table_args__ = {"schema": extra_schema}
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[str] = mapped_column()
+
+        # Same table name in two schemas, only the public one has RLS set up
+        policy = get_table_policy(table_name="extra_table", column_type=str)
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE extra_table ENABLE ROW LEVEL SECURITY"))
+            conn.execute(text(policy))
+
+        script = _run_hook(engine, SchemaBase.metadata)
+
+        sql = _get_sql(script.upgrade_ops)  # type: ignore[arg-type]
+        extra_policy = get_table_policy(
+            table_name="extra_table", column_type=str, schema_name=extra_schema
+        )
+        assert (
+            f'ALTER TABLE "{extra_schema}"."extra_table" ENABLE ROW LEVEL SECURITY'
+            in sql
+        )
+        assert extra_policy in sql
+        assert policy not in sql
+        assert 'ALTER TABLE "extra_table" ENABLE ROW LEVEL SECURITY' not in sql
+
+    def test_outdated_policy(
+        self, engine: Engine, extra_table: str, tenant_functions: None
+    ) -> None:
+        class DriftBase(DeclarativeBase):
+            pass
+
+        @with_rls
+        class DriftTable(DriftBase):
+            __tablename__ = "extra_table"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[UUID] = mapped_column()
+
+        # The tenant column is switching from str to UUID
+        old_policy = get_table_policy(table_name="extra_table", column_type=str)
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE extra_table ENABLE ROW LEVEL SECURITY"))
+            conn.execute(text(old_policy))
+
+        script = _run_hook(engine, DriftBase.metadata)
+
+        upgrade_sql = _get_sql(script.upgrade_ops)  # type: ignore[arg-type]
+        downgrade_sql = _get_sql(script.downgrade_ops)  # type: ignore[arg-type]
+        drop_policy = 'DROP POLICY sqlalchemy_tenants_all ON "extra_table"'
+        assert upgrade_sql == [
+            drop_policy,
+            get_table_policy(table_name="extra_table", column_type=UUID),
+        ]
+        assert downgrade_sql[0] == drop_policy
+        # The live policy can be restored as it was
+        with engine.begin() as conn:
+            conn.execute(text(drop_policy))
+            conn.execute(text(downgrade_sql[-1]))
+        script = _run_hook(engine, DriftBase.metadata)
+        assert _get_sql(script.upgrade_ops) == upgrade_sql  # type: ignore[arg-type]
+
+    def test_up_to_date_policy(
+        self, engine: Engine, extra_table: str, tenant_functions: None
+    ) -> None:
+        class UpToDateBase(DeclarativeBase):
+            pass
+
+        @with_rls
+        class UpToDateTable(UpToDateBase):
+            __tablename__ = "extra_table"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[str] = mapped_column()
+
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE extra_table ENABLE ROW LEVEL SECURITY"))
+            conn.execute(
+                text(get_table_policy(table_name="extra_table", column_type=str))
+            )
+
+        script = _run_hook(engine, UpToDateBase.metadata)
+
+        assert script.upgrade_ops.ops == []  # type: ignore[union-attr]
+
+
+class TestVerifyRLS:
+    def test_verify(
+        self, engine: Engine, extra_table: str, tenant_functions: None
+    ) -> None:
+        class VerifyBase(DeclarativeBase):
+            pass
+
+        @with_rls
+        class VerifyTable(VerifyBase):
+            __tablename__ = "extra_table"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[str] = mapped_column()
+
+        @with_rls
+        class MissingTable(VerifyBase):
+            __tablename__ = "missing_table"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[str] = mapped_column()
+
+        assert verify_rls(engine, VerifyBase.metadata) == [
+            "extra_table: row level security is disabled",
+            "extra_table: policy sqlalchemy_tenants_all is missing",
+            "missing_table: table does not exist",
+        ]
+        with engine.begin() as conn:
+            conn.execute(text("ALTER TABLE extra_table ENABLE ROW LEVEL SECURITY"))
+            conn.execute(
+                text("CREATE POLICY sqlalchemy_tenants_all ON extra_table USING (true)")
+            )
+        assert verify_rls(engine, VerifyTable.metadata) == [
+            "extra_table: policy sqlalchemy_tenants_all is outdated",
+            "missing_table: table does not exist",
+        ]
+
+
+class TestRLSRegistry:
+    def test_get_tables(self) -> None:
+        class RegistryBase(DeclarativeBase):
+            pass
+
+        @with_rls
+        class Parent(RegistryBase):
+            __tablename__ = "registry_parent"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[UUID] = mapped_column()
+
+        class Plain(RegistryBase):
+            __tablename__ = "registry_plain"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+
+        metadata = RegistryBase.metadata
+        assert get_rls_tables(metadata) == [Parent.__table__]
+
+        @with_rls
+        class Child(RegistryBase):
+            __tablename__ = "registry_child"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            parent_id: Mapped[int] = mapped_column(ForeignKey("registry_parent.id"))
+            tenant: Mapped[str] = mapped_column()
+
+        assert get_rls_tables(metadata) == [Parent.__table__, Child.__table__]
+        rls_parent = RLS_REGISTRY.get(metadata.tables["registry_parent"])
+        assert rls_parent is not None
+        assert rls_parent.policy == get_table_policy(
+            table_name="registry_parent", column_type=UUID
+        )
+        assert not is_rls_enabled(metadata.tables["registry_plain"])
+        # ORM statements refer to annotated copies of the tables
+        assert is_rls_enabled(insert(Parent).table)  # type: ignore[arg-type]
+
+        child = metadata.tables["registry_child"]
+        metadata.remove(child)
+        assert not is_rls_enabled(child)
+        assert get_rls_tables(metadata) == [Parent.__table__]
+
+    def test_metadata_collected(self) -> None:
+        class RegistryBase(DeclarativeBase):
+            pass
+
+        @with_rls
+        class Item(RegistryBase):
+            __tablename__ = "registry_item"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[str] = mapped_column()
+
+        assert get_rls_tables(RegistryBase.metadata) == [Item.__table__]
+        metadata_ref = weakref.ref(RegistryBase.metadata)
+        del RegistryBase, Item
+        gc.collect()
+        assert metadata_ref() is None
+
+    def test_get_tenant_tables(self) -> None:
+        class RegistryBase(DeclarativeBase):
+            pass
+
+        @with_rls
+        class ByUUID(RegistryBase):
+            __tablename__ = "registry_by_uuid"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[UUID] = mapped_column()
+
+        @with_rls
+        class ByInt(RegistryBase):
+            __tablename__ = "registry_by_int"
+
+            id: Mapped[int] = mapped_column(primary_key=True)
+            tenant: Mapped[int] = mapped_column()
+
+        metadata = RegistryBase.metadata
+        tenant = "0b4c6b1e-2f3a-4c6d-8e9f-a0b1c2d3e4f5"
+        assert get_tenant_rls_tables(metadata, tenant) == [ByUUID.__table__]
+        assert get_tenant_rls_tables(metadata, "42") == [ByInt.__table__]
+        assert coerce_tenant(tenant, metadata.tables["registry_by_uuid"]) == UUID(
+            tenant
+        )
+        with pytest.raises(ValueError):
+            get_tenant_rls_tables(metadata, "not-a-tenant")
+
+
+class TestTenantCodec:
+    def test_default(self) -> None:
+        codec = TenantCodec()
+        tenant = UUID("0b4c6b1e-2f3a-4c6d-8e9f-a0b1c2d3e4f5")
+        assert codec.encode(tenant) == str(tenant)
+        assert codec.encode(42) == "42"
+        assert codec.decode("42") == "42"
+        assert get_tenant_role_name(42) == "tenant_42"
+
+    def test_typed(self) -> None:
+        codec = TenantCodec(int)
+        assert codec.encode("42") == codec.encode(42) == "42"
+        assert codec.decode("42") == 42
+        assert codec.parse("42") == 42
+        with pytest.raises(ValueError):
+            codec.encode("not-an-int")
+
+        codec = TenantCodec(UUID)
+        tenant = UUID("0b4c6b1e-2f3a-4c6d-8e9f-a0b1c2d3e4f5")
+        assert codec.encode(str(tenant).upper()) == str(tenant)
+        assert codec.decode(str(tenant)) == tenant
+
+    def test_compact_uuid(self) -> None:
+        codec = TenantCodec(UUID, compact_uuid=True)
+        tenant = UUID("0b4c6b1e-2f3a-4c6d-8e9f-a0b1c2d3e4f5")
+        key = codec.encode(tenant)
+        assert len(key) == 26
+        assert key == key.lower()
+        assert codec.decode(key) == tenant
+        with pytest.raises(ValueError):
+            TenantCodec(str, compact_uuid=True)
+
+    def test_too_long(self) -> None:
+        with pytest.raises(ValueError):
+            get_tenant_role_name("x" * 57)
+        assert get_tenant_role_name("x" * 56) == "tenant_" + "x" * 56
+
+
+class TestImport:
+    def test_alembic_not_imported(self) -> None:
+        # Alembic is only needed by the migration hook
+        code = (
+            "import sys, sqlalchemy_tenants, sqlalchemy_tenants.managers, "
+            "sqlalchemy_tenants.aio\n"
+            "print(sorted(m for m in sys.modules if m.split('.')[0] == 'alembic'))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        )
+        assert result.stdout.strip() == "[]"
@@ -1,18 +1,47 @@
 import random
-from uuid import uuid4
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Generator, List, Optional
+from uuid import UUID, uuid4
 
 import pytest
+from alembic import command
 from alembic.config import Config
-from sqlalchemy import Engine, delete, select, text, update
+from sqlalchemy import (
+    Engine,
+    Table,
+    create_engine,
+    delete,
+    event,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
 from sqlalchemy.exc import ProgrammingError
 
-from sqlalchemy_tenants.core import get_tenant_role_name
+from sqlalchemy_tenants import managers
+from sqlalchemy_tenants.core import (
+    TenantCodec,
+    TenantIdentifier,
+    get_tenant_role_name,
+)
 from sqlalchemy_tenants.exceptions import (
     TenantAlreadyExists,
+    TenantMismatch,
     TenantNotFound,
 )
 from sqlalchemy_tenants.managers import PostgresManager, TenantSession
-from tests.conftest import TableTestTenantInt, TableTestTenantStr, TableTestTenantUUID
+from sqlalchemy_tenants.pool import RoleResetMode, mark_role_set
+from sqlalchemy_tenants.registry import get_registry_table
+from sqlalchemy_tenants.utils import pg_quote
+from tests.conftest import (
+    Base,
+    TableTestTenantInt,
+    TableTestTenantStr,
+    TableTestTenantStrChild,
+    TableTestTenantUUID,
+)
 from tests.factories import new_tenant_str
 
 
@@ -59,6 +88,25 @@ class TestCreateTenant:
         with pytest.raises(TenantAlreadyExists):
             manager.create_tenant(tenant_name)
 
+    def test_create_tenant_multiple_schemas(
+        self, engine: Engine, extra_schema: str
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name=["public", extra_schema],
+        )
+        tenant_name = new_tenant_str()
+        manager.create_tenant(tenant_name)
+        with manager.new_tenant_session(tenant_name) as sess:
+            sess.execute(
+                text(f"INSERT INTO {extra_schema}.extra_table VALUES (1, :tenant)"),
+                {"tenant": tenant_name},
+            )
+            count = sess.execute(
+                text(f"SELECT count(*) FROM {extra_schema}.extra_table")
+            ).scalar()
+            assert count == 1
+
 
 class TestDeleteTenant:
     def test_delete_tenant(self, engine: Engine) -> None:
@@ -81,6 +129,92 @@ class TestDeleteTenant:
             manager.delete_tenant(new_tenant_str())
 
 
+class TestProvisioningFunctions:
+    def test_single_statement(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        statements: List[str] = []
+
+        def _record(*args: Any) -> None:
+            statements.append(args[2])
+
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            manager.create_tenant(tenant)
+            with pytest.raises(TenantAlreadyExists):
+                manager.create_tenant(tenant)
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+
+        # The functions are looked up once, then each tenant is a single call
+        assert len(statements) == 3
+        assert all("sqlalchemy_tenants_create_tenant(" in s for s in statements[1:])
+        with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            assert sess.scalars(select(TableTestTenantStr)).all() == []
+        manager.delete_tenant(tenant)
+        assert tenant not in manager.list_tenants()
+        with pytest.raises(TenantNotFound):
+            manager.delete_tenant(tenant)
+
+    def test_checked_again(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        monkeypatch.setattr(managers, "PROVISIONING_FUNCTIONS_TTL", 0.0)
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        manager.create_tenant(new_tenant_str())
+        statements: List[str] = []
+
+        def _record(*args: Any) -> None:
+            statements.append(args[2])
+
+        command.revision(alembic_config, message="init", autogenerate=True)
+        command.upgrade(alembic_config, "head")
+        event.listen(engine, "before_cursor_execute", _record)
+        try:
+            manager.create_tenant(new_tenant_str())
+        finally:
+            event.remove(engine, "before_cursor_execute", _record)
+            command.downgrade(alembic_config, "base")
+        # The functions added by the migration are found
+        assert len(statements) == 2
+        assert "sqlalchemy_tenants_create_tenant(" in statements[1]
+
+    def test_mixed_case_schema(self, engine: Engine) -> None:
+        with engine.begin() as conn:
+            conn.execute(text('CREATE SCHEMA "TenantData"'))
+        try:
+            manager = PostgresManager.from_engine(
+                engine,
+                schema_name=["public", "TenantData"],
+            )
+            tenant = new_tenant_str()
+            manager.create_tenant(tenant)
+            with engine.connect() as conn:
+                granted = conn.execute(
+                    text("SELECT has_schema_privilege(:role, 'TenantData', 'USAGE')"),
+                    {"role": get_tenant_role_name(tenant)},
+                ).scalar()
+            assert granted
+            manager.delete_tenant(tenant)
+        finally:
+            with engine.begin() as conn:
+                conn.execute(text('DROP SCHEMA "TenantData" CASCADE'))
+
+
 class TestTenantSession:
     def test_tenant_not_found(self, engine: Engine) -> None:
         manager = PostgresManager.from_engine(
@@ -113,6 +247,58 @@ class TestTenantSession:
             user = (sess.execute(text("SELECT current_user"))).scalar()
             assert user == get_tenant_role_name(tenant_name)
 
+    def test_role_kept_across_transactions(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenant_name = new_tenant_str()
+        role = get_tenant_role_name(tenant_name)
+        with manager.new_tenant_session(tenant_name) as sess:
+            sess.commit()
+            assert sess.execute(text("SELECT current_user")).scalar() == role
+            sess.rollback()
+            assert sess.execute(text("SELECT current_user")).scalar() == role
+
+
+class TestReleaseBetweenTransactions:
+    def test_role_set_on_each_transaction(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+            release_between_transactions=True,
+        )
+        tenant_name = new_tenant_str()
+        pool = engine.pool
+        with manager.new_tenant_session(tenant_name) as sess:
+            assert pool.checkedout() == 0  # type: ignore[attr-defined]
+            user = sess.execute(text("SELECT current_user")).scalar()
+            assert user == get_tenant_role_name(tenant_name)
+            assert pool.checkedout() == 1  # type: ignore[attr-defined]
+            sess.commit()
+            assert pool.checkedout() == 0  # type: ignore[attr-defined]
+            # The role was local to the transaction
+            with engine.connect() as conn:
+                assert conn.execute(text("SELECT current_user")).scalar() == "postgres"
+            user = sess.execute(text("SELECT current_user")).scalar()
+            assert user == get_tenant_role_name(tenant_name)
+
+    def test_tenant_not_found(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+            release_between_transactions=True,
+        )
+        with pytest.raises(TenantNotFound):  # noqa: SIM117
+            with manager.new_tenant_session(
+                tenant=new_tenant_str(), create_if_missing=False
+            ):
+                pass
+        tenant_name = new_tenant_str()
+        with manager.new_tenant_session(tenant_name):
+            pass
+        assert tenant_name in manager.list_tenants()
+
 
 class TestAdminSession:
     def test_admin_session(self, engine: Engine) -> None:
@@ -126,6 +312,227 @@ class TestAdminSession:
             assert user == manager.engine.url.username
 
 
+class TestCloneTenant:
+    def test_same_tenant(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        with pytest.raises(ValueError):
+            manager.clone_tenant(tenant, tenant, Base.metadata)
+
+    def test_clone_remap_ids(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        source = new_tenant_str()
+        target = new_tenant_str()
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        manager.create_tenant(source)
+        manager.create_tenant(target)
+        with manager.new_session() as sess:
+            parent_ids = sess.scalars(
+                insert(TableTestTenantStr).returning(TableTestTenantStr.id),
+                [{"name": f"Row {i}", "tenant": source} for i in range(3)],
+            ).all()
+            sess.execute(
+                insert(TableTestTenantStrChild),
+                [{"parent_id": i, "tenant": source} for i in parent_ids],
+            )
+            sess.commit()
+
+        copied = manager.clone_tenant(
+            source, target, Base.metadata, remap_ids=True, batch_size=2
+        )
+
+        assert copied[TableTestTenantStr.__tablename__] == 3
+        assert copied[TableTestTenantStrChild.__tablename__] == 3
+        assert TableTestTenantInt.__tablename__ not in copied
+        with manager.new_tenant_session(tenant=target) as sess:
+            parents = sess.scalars(select(TableTestTenantStr)).all()
+            children = sess.scalars(select(TableTestTenantStrChild)).all()
+        assert sorted(p.name for p in parents) == ["Row 0", "Row 1", "Row 2"]
+        assert not {p.id for p in parents} & set(parent_ids)
+        assert {c.parent_id for c in children} == {p.id for p in parents}
+        # The source tenant data is left untouched
+        with manager.new_tenant_session(tenant=source) as sess:
+            source_ids = sess.scalars(select(TableTestTenantStr.id)).all()
+        assert sorted(source_ids) == sorted(parent_ids)
+
+    def test_clone_uuid_tenant_as_str(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        source = str(uuid4())
+        target = str(uuid4())
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        manager.create_tenant(source)
+        manager.create_tenant(target)
+        with manager.new_session() as sess:
+            sess.execute(
+                insert(TableTestTenantUUID),
+                [{"name": f"Row {i}", "tenant": UUID(source)} for i in range(3)],
+            )
+            sess.commit()
+
+        copied = manager.clone_tenant(source, target, Base.metadata, remap_ids=True)
+
+        assert copied[TableTestTenantUUID.__tablename__] == 3
+        with manager.new_session() as sess:
+            tenants = sess.scalars(select(TableTestTenantUUID.tenant)).all()
+        assert sorted(map(str, tenants)) == sorted([source] * 3 + [target] * 3)
+
+
+class TestTenantColumn:
+    def test_orm_populated_on_flush(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        with manager.new_tenant_session(tenant=tenant) as sess:
+            row = TableTestTenantStr(id=1, name="Row", tenant=None)  # type: ignore[arg-type]
+            sess.add(row)
+            sess.flush()
+            assert row.tenant == tenant
+            sess.rollback()
+
+    def test_orm_mismatch(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        with manager.new_tenant_session(tenant=new_tenant_str()) as sess:
+            sess.add(TableTestTenantStr(id=1, name="Row", tenant=new_tenant_str()))
+            with pytest.raises(TenantMismatch):
+                sess.flush()
+
+    def test_core_insert_populated(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        with manager.new_tenant_session(tenant=tenant) as sess:
+            sess.execute(insert(TableTestTenantStr).values(id=1, name="Row 1"))
+            sess.execute(
+                insert(TableTestTenantStr),
+                [{"id": 2, "name": "Row 2"}, {"id": 3, "name": "Row 3"}],
+            )
+            tenants = sess.scalars(select(TableTestTenantStr.tenant)).all()
+            sess.rollback()
+        assert tenants == [tenant, tenant, tenant]
+
+    def test_core_insert_mismatch(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        with manager.new_tenant_session(tenant=new_tenant_str()) as sess:
+            with pytest.raises(TenantMismatch):
+                sess.execute(
+                    insert(TableTestTenantStr).values(
+                        id=1, name="Row", tenant=new_tenant_str()
+                    )
+                )
+            with pytest.raises(TenantMismatch):
+                sess.execute(
+                    insert(TableTestTenantStr),
+                    [{"id": 1, "name": "Row", "tenant": new_tenant_str()}],
+                )
+
+    def test_core_multi_values_insert(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenant = new_tenant_str()
+        with manager.new_tenant_session(tenant=tenant) as sess:
+            sess.execute(
+                insert(TableTestTenantStr).values(
+                    [
+                        {"id": 1, "name": "Row 1", "tenant": tenant},
+                        {"id": 2, "name": "Row 2", "tenant": tenant},
+                    ]
+                )
+            )
+            with pytest.raises(TenantMismatch):
+                sess.execute(
+                    insert(TableTestTenantStr).values(
+                        [
+                            {"id": 3, "name": "Row 3", "tenant": tenant},
+                            {"id": 4, "name": "Row 4", "tenant": new_tenant_str()},
+                        ]
+                    )
+                )
+            tenants = sess.scalars(select(TableTestTenantStr.tenant)).all()
+            sess.rollback()
+        assert tenants == [tenant, tenant]
+
+
+class TestTenantFilter:
+    def test_inject_tenant_filter(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+            inject_tenant_filter=True,
+        )
+        tenant = new_tenant_str()
+        statements: List[str] = []
+
+        def capture(*args: Any) -> None:
+            statements.append(args[2])
+
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            with manager.new_tenant_session(tenant) as sess:
+                sess.execute(select(TableTestTenantStr))
+                sess.execute(update(TableTestTenantStr).values(name="Updated"))
+                sess.execute(delete(TableTestTenantStr))
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+
+        table_statements = [
+            s for s in statements if TableTestTenantStr.__tablename__ in s
+        ]
+        assert len(table_statements) == 3
+        assert all(
+            f"{TableTestTenantStr.__tablename__}.tenant = " in s
+            for s in table_statements
+        )
+
+
 class TestRLSIsEnforced:
     def test_int(
         self,
@@ -245,10 +652,22 @@ class TestRLSIsEnforced:
         # Check that tenant-1 can't insert data for tenant-2
         with (
             manager.new_tenant_session(tenant=tenant_1) as sess,
-            pytest.raises(ProgrammingError),
+            pytest.raises(TenantMismatch),
         ):
             sess.add(TableTestTenantStr(id=5, name="Invalid Row", tenant=tenant_2))
             sess.commit()
+        with (
+            manager.new_tenant_session(tenant=tenant_1) as sess,
+            pytest.raises(ProgrammingError),
+        ):
+            sess.execute(
+                text(
+                    f"INSERT INTO {TableTestTenantStr.__tablename__} "
+                    "(id, name, tenant) VALUES (5, 'Invalid Row', :tenant)"
+                ),
+                {"tenant": tenant_2},
+            )
+            sess.commit()
         # Check that tenant-1 can't delete data for tenant-2
         with manager.new_tenant_session(tenant=tenant_1) as sess:
             sess.execute(
@@ -279,3 +698,295 @@ class TestRLSIsEnforced:
 
 def test_new_tenant_session_dont_break() -> None:
     _ = TenantSession(tenant="test")
+
+
+class TestMapTenants:
+    def test_map_tenants(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenants = [new_tenant_str() for _ in range(5)]
+        for tenant in tenants:
+            manager.create_tenant(tenant)
+        missing = new_tenant_str()
+
+        result = manager.map_tenants(
+            lambda sess: sess.execute(text("SELECT current_user")).scalar(),
+            [*tenants, missing],
+            max_workers=3,
+        )
+
+        assert result.results == {t: get_tenant_role_name(t) for t in tenants}
+        assert list(result.errors) == [missing]
+        assert isinstance(result.errors[missing], TenantNotFound)
+        assert not result.ok
+
+    def test_concurrent_creation(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+        )
+        tenants = [new_tenant_str() for _ in range(10)]
+
+        def _open_sessions() -> None:
+            for tenant in tenants:
+                with manager.new_tenant_session(tenant) as sess:
+                    sess.execute(text("SELECT 1"))
+
+        # Every thread finds the tenants missing and tries to create them
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            futures = [executor.submit(_open_sessions) for _ in range(16)]
+        for future in futures:
+            future.result()
+        assert set(tenants) <= manager.list_tenants()
+
+
+class TestWarmup:
+    def test_warmup(self, postgres_dsn_psycopg: str) -> None:
+        engine = create_engine(postgres_dsn_psycopg)
+        manager = PostgresManager.from_engine(engine, schema_name="public")
+        stats = manager.track_compiled_cache()
+        warm = manager.register_warmup(select(func.current_user()))
+        cold = select(func.session_user())
+        tenant = new_tenant_str()
+        try:
+            assert manager.warmup() == 1
+            with manager.new_tenant_session(tenant) as sess:
+                sess.execute(warm)
+                assert (stats.hits, stats.misses) == (1, 0)
+                sess.execute(cold)
+                sess.execute(cold)
+            assert (stats.hits, stats.misses) == (2, 1)
+            # Admin sessions are not tracked
+            with manager.new_session() as sess:
+                sess.execute(cold)
+            assert stats.hit_rate == 2 / 3
+        finally:
+            engine.dispose()
+
+    def test_rewritten_statements(
+        self,
+        postgres_dsn_psycopg: str,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        engine = create_engine(postgres_dsn_psycopg)
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", inject_tenant_filter=True
+        )
+        stats = manager.track_compiled_cache()
+        # Filtered by tenant, and inserted with the tenant added to the values
+        query = manager.register_warmup(select(TableTestTenantStr))
+        table = Base.metadata.tables[TableTestTenantStr.__tablename__]
+        insert_item = manager.register_warmup(insert(table), column_keys=["id", "name"])
+        tenant = new_tenant_str()
+        try:
+            assert manager.warmup() == 2
+            with manager.new_tenant_session(tenant) as sess:
+                sess.execute(insert_item, {"id": 1, "name": "Item"})
+                assert sess.scalars(query).one().name == "Item"
+            assert (stats.hits, stats.misses) == (2, 0)
+        finally:
+            engine.dispose()
+
+
+@pytest.fixture
+def registry(engine: Engine) -> Generator[Table, None, None]:
+    table = get_registry_table()
+    table.create(engine)
+    yield table
+    table.drop(engine)
+
+
+class TestRegistry:
+    def test_create_and_delete(self, engine: Engine, registry: Table) -> None:
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", registry=registry
+        )
+        tenants: List[TenantIdentifier] = [
+            new_tenant_str(),
+            random.randint(1, 10**9),
+            uuid4(),
+        ]
+        for tenant in tenants:
+            manager.create_tenant(tenant)
+        # The identifiers keep their type
+        assert manager.list_tenants() == set(tenants)
+        assert manager.count_tenants() == 3
+        assert manager.tenant_exists(tenants[1])
+        with pytest.raises(TenantAlreadyExists):
+            manager.create_tenant(tenants[0])
+        with manager.new_tenant_session(tenants[2], create_if_missing=False) as sess:
+            assert sess.execute(text("SELECT 1")).scalar() == 1
+
+        manager.delete_tenant(tenants[0])
+        assert not manager.tenant_exists(tenants[0])
+        assert manager.count_tenants() == 2
+        with pytest.raises(TenantNotFound):
+            manager.delete_tenant(tenants[0])
+
+    def test_list_tenants_page(self, engine: Engine, registry: Table) -> None:
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", registry=registry
+        )
+        tenants = sorted(new_tenant_str() for _ in range(5))
+        for tenant in tenants:
+            manager.create_tenant(tenant)
+        pages = []
+        after = None
+        while page := manager.list_tenants_page(limit=2, after=after):
+            pages.append(page)
+            after = page[-1]
+        assert pages == [tenants[:2], tenants[2:4], tenants[4:]]
+
+    def test_backfill(self, engine: Engine, registry: Table) -> None:
+        tenant = new_tenant_str()
+        PostgresManager.from_engine(engine, schema_name="public").create_tenant(tenant)
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", registry=registry
+        )
+        assert not manager.tenant_exists(tenant)
+        assert manager.backfill_registry() == 1
+        assert manager.backfill_registry() == 0
+        assert manager.list_tenants() == {tenant}
+        # The tenant was granted the registry with the other tables
+        with (
+            manager.new_tenant_session(tenant, create_if_missing=False) as sess,
+            pytest.raises(ProgrammingError, match="permission denied"),
+        ):
+            sess.execute(select(registry))
+
+    def test_hidden_from_tenants(self, engine: Engine, registry: Table) -> None:
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", registry=registry
+        )
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            with pytest.raises(ProgrammingError, match="permission denied"):
+                sess.execute(select(registry))
+            sess.rollback()
+            with pytest.raises(ProgrammingError, match="permission denied"):
+                sess.execute(delete(registry))
+        assert manager.list_tenants() == {tenant}
+
+    def test_without_registry(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(engine, schema_name="public")
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        assert manager.tenant_exists(tenant)
+        assert manager.count_tenants() == 1
+        with pytest.raises(ValueError):
+            manager.list_tenants_page()
+
+
+class TestTenantCodec:
+    def test_typed_tenants(
+        self,
+        engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", tenant_codec=TenantCodec(int)
+        )
+        tenant = random.randint(1, 10**9)
+        manager.create_tenant(str(tenant))
+        with pytest.raises(TenantAlreadyExists):
+            manager.create_tenant(tenant)
+        assert manager.list_tenants() == {tenant}
+        with manager.new_tenant_session(str(tenant), create_if_missing=False) as sess:
+            assert sess.tenant == tenant
+            sess.execute(
+                insert(TableTestTenantInt).values(id=1, name="a", tenant=tenant)
+            )
+            assert sess.scalars(select(TableTestTenantInt.tenant)).all() == [tenant]
+
+    def test_compact_uuid_not_supported(self, engine: Engine) -> None:
+        with pytest.raises(ValueError):
+            PostgresManager.from_engine(
+                engine,
+                schema_name="public",
+                tenant_codec=TenantCodec(UUID, compact_uuid=True),
+            )
+
+
+class TestRoleReset:
+    @pytest.mark.parametrize("role_reset", [RoleResetMode.RESET_ROLE, None])
+    def test_admin_session_after_tenant_session(
+        self, postgres_dsn_psycopg: str, role_reset: Optional[RoleResetMode]
+    ) -> None:
+        engine = create_engine(postgres_dsn_psycopg, pool_size=1, max_overflow=0)
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", role_reset=role_reset
+        )
+        tenant = new_tenant_str()
+        try:
+            with manager.new_tenant_session(tenant) as sess:
+                sess.execute(text("SELECT 1"))
+                sess.commit()
+            with manager.new_session() as sess:
+                user = sess.execute(text("SELECT current_user")).scalar_one()
+            assert user == ("postgres" if role_reset else get_tenant_role_name(tenant))
+        finally:
+            engine.dispose()
+
+    def test_discard_all(self, postgres_dsn_psycopg: str) -> None:
+        engine = create_engine(postgres_dsn_psycopg, pool_size=1, max_overflow=0)
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", role_reset=RoleResetMode.DISCARD_ALL
+        )
+        tenant = new_tenant_str()
+        try:
+            with manager.new_tenant_session(tenant) as sess:
+                sess.execute(text("SET application_name = 'tenant'"))
+                sess.commit()
+                # Left in a failed transaction
+                with pytest.raises(ProgrammingError):
+                    sess.execute(text("SELECT * FROM missing_table"))
+            with manager.new_session() as sess:
+                user, name = sess.execute(
+                    text("SELECT current_user, current_setting('application_name')")
+                ).one()
+            assert (user, name) == ("postgres", "")
+        finally:
+            engine.dispose()
+
+    @pytest.mark.parametrize(
+        "role_reset", [RoleResetMode.RESET_ROLE, RoleResetMode.DISCARD_ALL]
+    )
+    def test_returned_in_transaction(
+        self, postgres_dsn_psycopg: str, role_reset: RoleResetMode
+    ) -> None:
+        engine = create_engine(postgres_dsn_psycopg, pool_size=1, max_overflow=0)
+        manager = PostgresManager.from_engine(
+            engine, schema_name="public", role_reset=role_reset
+        )
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        try:
+            conn = engine.raw_connection()
+            cursor = conn.cursor()
+            cursor.execute(f"SET ROLE {pg_quote(get_tenant_role_name(tenant))}")
+            cursor.execute("SELECT pg_backend_pid()")
+            pid = cursor.fetchone()[0]  # type: ignore[index]
+            mark_role_set(conn)
+            # Returned to the pool with the transaction still open
+            conn.close()
+            with manager.new_session() as sess:
+                user, new_pid = sess.execute(
+                    text("SELECT current_user, pg_backend_pid()")
+                ).one()
+            # The connection was reset, not invalidated
+            assert (user, new_pid) == ("postgres", pid)
+        finally:
+            engine.dispose()
+
+    def test_conflicting_modes(self, postgres_dsn_psycopg: str) -> None:
+        engine = create_engine(postgres_dsn_psycopg)
+        PostgresManager.from_engine(engine, schema_name="public")
+        with pytest.raises(ValueError):
+            PostgresManager.from_engine(
+                engine, schema_name="public", role_reset=RoleResetMode.DISCARD_ALL
+            )
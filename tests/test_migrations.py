@@ -0,0 +1,111 @@
+import json
+from pathlib import Path
+from typing import Generator, List
+
+import pytest
+from alembic.config import Config
+from sqlalchemy import Engine, text
+
+from sqlalchemy_tenants.migrations import (
+    MigrationProgress,
+    MigrationRunner,
+    MigrationStatus,
+    MigrationTarget,
+)
+from tests.factories import new_tenant_str
+
+
+@pytest.fixture
+def config(postgres_dsn_psycopg: str) -> Config:
+    config = Config()
+    config.set_main_option(
+        "script_location", str(Path(__file__).parent / "alembic_schemas")
+    )
+    config.set_main_option("sqlalchemy.url", postgres_dsn_psycopg)
+    return config
+
+
+@pytest.fixture
+def schemas(engine: Engine) -> Generator[List[str], None, None]:
+    schemas = [f"tenant_test_{new_tenant_str()}" for _ in range(2)]
+    with engine.begin() as conn:
+        for schema in schemas:
+            conn.execute(text(f'CREATE SCHEMA "{schema}"'))
+    yield schemas
+    with engine.begin() as conn:
+        for schema in schemas:
+            conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+
+
+def _get_version(engine: Engine, schema: str) -> str:
+    with engine.connect() as conn:
+        query = text(f'SELECT version_num FROM "{schema}".alembic_version')
+        return str(conn.execute(query).scalar_one())
+
+
+class TestMigrationRunner:
+    def test_upgrade(self, engine: Engine, config: Config, schemas: List[str]) -> None:
+        progress: List[MigrationProgress] = []
+        runner = MigrationRunner(config, max_workers=2, on_progress=progress.append)
+
+        report = runner.upgrade(
+            [
+                *[MigrationTarget(name=s, schema=s) for s in schemas],
+                MigrationTarget(name="missing", schema="tenant_test_missing"),
+            ]
+        )
+
+        assert report.revision == "0001"
+        assert report.get_targets(MigrationStatus.SUCCEEDED) == sorted(schemas)
+        assert report.get_targets(MigrationStatus.FAILED) == ["missing"]
+        assert not report.ok
+        assert "failed: 1" in report.summary()
+        assert sorted(p.completed for p in progress) == [1, 2, 3]
+        for schema in schemas:
+            assert _get_version(engine, schema) == "0001"
+
+    def test_resume(self, config: Config, schemas: List[str], tmp_path: Path) -> None:
+        state_path = tmp_path / "state.json"
+        runner = MigrationRunner(config, state_path=state_path)
+        targets = [MigrationTarget(name=s, schema=s) for s in schemas]
+        runner.upgrade(targets[:1])
+
+        report = runner.upgrade(targets)
+
+        assert report.statuses == {
+            schemas[0]: MigrationStatus.SKIPPED,
+            schemas[1]: MigrationStatus.SUCCEEDED,
+        }
+        state = json.loads(state_path.read_text())
+        assert state["revision"] == "0001"
+        assert set(state["targets"]) == set(schemas)
+
+    def test_resume_other_revision(
+        self, config: Config, schemas: List[str], tmp_path: Path
+    ) -> None:
+        state_path = tmp_path / "state.json"
+        state_path.write_text(
+            json.dumps({"revision": "0000", "targets": {schemas[0]: "succeeded"}})
+        )
+        runner = MigrationRunner(config, state_path=state_path)
+
+        report = runner.upgrade([MigrationTarget(name=schemas[0], schema=schemas[0])])
+
+        assert report.statuses == {schemas[0]: MigrationStatus.SUCCEEDED}
+
+    def test_locked(self, engine: Engine, config: Config, schemas: List[str]) -> None:
+        runner = MigrationRunner(config)
+        key = f"sqlalchemy_tenants_migration:{schemas[0]}"
+        with engine.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(hashtext(:key))"), {"key": key})
+            report = runner.upgrade(
+                [MigrationTarget(name=s, schema=s) for s in schemas]
+            )
+            conn.execute(
+                text("SELECT pg_advisory_unlock(hashtext(:key))"), {"key": key}
+            )
+
+        assert report.statuses == {
+            schemas[0]: MigrationStatus.LOCKED,
+            schemas[1]: MigrationStatus.SUCCEEDED,
+        }
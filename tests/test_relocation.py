@@ -0,0 +1,342 @@
+from typing import Dict, Generator, Sequence
+from uuid import UUID, uuid4
+
+import pytest
+from alembic.config import Config
+from sqlalchemy import (
+    Engine,
+    Table,
+    create_engine,
+    delete,
+    func,
+    insert,
+    select,
+    text,
+    update,
+)
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from sqlalchemy_tenants.core import TenantIdentifier, with_rls
+from sqlalchemy_tenants.exceptions import TenantRelocationError
+from sqlalchemy_tenants.managers import PostgresManager
+from sqlalchemy_tenants.relocation import TenantRelocator, _get_dependency_levels
+from sqlalchemy_tenants.sharding import (
+    ConsistentHashPlacement,
+    DirectoryPlacement,
+    ShardedManager,
+)
+from tests.conftest import (
+    Base,
+    TableTestTenantStr,
+    TableTestTenantStrChild,
+    TableTestTenantUUID,
+)
+from tests.factories import new_tenant_str
+
+TARGET_DATABASE = "tests_relocation_target"
+
+
+class SettingsBase(DeclarativeBase):
+    pass
+
+
+@with_rls
+class TenantSetting(SettingsBase):
+    __tablename__ = "test_tenant_setting"
+
+    tenant: Mapped[str] = mapped_column(primary_key=True)
+    key: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column()
+
+
+@pytest.fixture(scope="function")
+def target_engine(engine: Engine) -> Generator[Engine, None, None]:
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP DATABASE IF EXISTS {TARGET_DATABASE}"))
+        conn.execute(
+            text(
+                f"CREATE DATABASE {TARGET_DATABASE} TEMPLATE template0 ENCODING 'UTF8'"
+            )
+        )
+    target = create_engine(engine.url.set(database=TARGET_DATABASE))
+    Base.metadata.create_all(target)
+    yield target
+    target.dispose()
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(f"DROP DATABASE {TARGET_DATABASE} WITH (FORCE)"))
+
+
+def _insert_rows(manager: PostgresManager, tenant: str, count: int) -> None:
+    with manager.new_session() as sess:
+        parent_ids = sess.scalars(
+            insert(TableTestTenantStr).returning(TableTestTenantStr.id),
+            [{"name": f"Row {i}", "tenant": tenant} for i in range(count)],
+        ).all()
+        sess.execute(
+            insert(TableTestTenantStrChild),
+            [{"parent_id": i, "tenant": tenant} for i in parent_ids],
+        )
+        sess.commit()
+
+
+def _count_rows(manager: PostgresManager, tenant: str) -> int:
+    with manager.new_session() as sess:
+        return sess.execute(
+            select(func.count()).where(TableTestTenantStr.tenant == tenant)
+        ).scalar_one()
+
+
+class TestDependencyLevels:
+    def test_levels(self) -> None:
+        levels = _get_dependency_levels(
+            [
+                Base.metadata.tables[TableTestTenantStr.__tablename__],
+                Base.metadata.tables[TableTestTenantStrChild.__tablename__],
+            ]
+        )
+        assert [[t.name for t in level] for level in levels] == [
+            [TableTestTenantStr.__tablename__],
+            [TableTestTenantStrChild.__tablename__],
+        ]
+
+
+class TestTenantRelocator:
+    def test_relocate(
+        self,
+        engine: Engine,
+        target_engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        source = PostgresManager.from_engine(engine, schema_name="public")
+        target = PostgresManager.from_engine(target_engine, schema_name="public")
+        tenant = new_tenant_str()
+        other = new_tenant_str()
+        source.create_tenant(tenant)
+        source.create_tenant(other)
+        _insert_rows(source, tenant, 5)
+        _insert_rows(source, other, 3)
+        switched = []
+
+        report = TenantRelocator(source, target, Base.metadata).relocate(
+            tenant, switch=lambda: switched.append(tenant), drop_source=True
+        )
+
+        assert switched == [tenant]
+        assert report.copied[TableTestTenantStr.__tablename__] == 5
+        assert report.copied[TableTestTenantStrChild.__tablename__] == 5
+        assert report.checksums[TableTestTenantStr.__tablename__].rows == 5
+        assert _count_rows(target, tenant) == 5
+        assert _count_rows(target, other) == 0
+        assert _count_rows(source, tenant) == 0
+        assert _count_rows(source, other) == 3
+        # New rows on the target don't reuse the copied ids
+        _insert_rows(target, tenant, 1)
+        assert _count_rows(target, tenant) == 6
+
+    def test_changes_during_copy(
+        self,
+        engine: Engine,
+        target_engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+        monkeypatch: pytest.MonkeyPatch,
+    ) -> None:
+        source = PostgresManager.from_engine(engine, schema_name="public")
+        target = PostgresManager.from_engine(target_engine, schema_name="public")
+        tenant = new_tenant_str()
+        source.create_tenant(tenant)
+        _insert_rows(source, tenant, 3)
+        with source.new_session() as sess:
+            ids = sess.scalars(
+                select(TableTestTenantStr.id)
+                .where(TableTestTenantStr.tenant == tenant)
+                .order_by(TableTestTenantStr.id)
+            ).all()
+        relocator = TenantRelocator(source, target, Base.metadata)
+        copy_tables = relocator._copy_tables
+
+        def copy_and_change(
+            tenant: TenantIdentifier, tables: Sequence[Table]
+        ) -> Dict[str, int]:
+            copied = copy_tables(tenant, tables)
+            with source.new_session() as sess:
+                sess.execute(
+                    delete(TableTestTenantStrChild).where(
+                        TableTestTenantStrChild.parent_id == ids[0]
+                    )
+                )
+                sess.execute(
+                    delete(TableTestTenantStr).where(TableTestTenantStr.id == ids[0])
+                )
+                sess.execute(
+                    update(TableTestTenantStr)
+                    .where(TableTestTenantStr.id == ids[1])
+                    .values(name="Updated")
+                )
+                sess.commit()
+            return copied
+
+        monkeypatch.setattr(relocator, "_copy_tables", copy_and_change)
+        report = relocator.relocate(tenant)
+
+        assert report.copied[TableTestTenantStr.__tablename__] == 3
+        assert report.deleted[TableTestTenantStr.__tablename__] == 1
+        assert report.deleted[TableTestTenantStrChild.__tablename__] == 1
+        with target.new_session() as sess:
+            rows = sess.execute(
+                select(TableTestTenantStr.id, TableTestTenantStr.name)
+                .where(TableTestTenantStr.tenant == tenant)
+                .order_by(TableTestTenantStr.id)
+            ).all()
+        assert [tuple(r) for r in rows] == [(ids[1], "Updated"), (ids[2], "Row 2")]
+
+    def test_relocate_uuid_tenant_as_str(
+        self,
+        engine: Engine,
+        target_engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        source = PostgresManager.from_engine(engine, schema_name="public")
+        target = PostgresManager.from_engine(target_engine, schema_name="public")
+        tenant = str(uuid4())
+        source.create_tenant(tenant)
+        with source.new_session() as sess:
+            sess.execute(
+                insert(TableTestTenantUUID),
+                [
+                    {"id": i, "name": f"Row {i}", "tenant": UUID(tenant)}
+                    for i in range(1, 4)
+                ],
+            )
+            sess.commit()
+
+        report = TenantRelocator(source, target, Base.metadata).relocate(
+            tenant, drop_source=True
+        )
+
+        assert report.checksums[TableTestTenantUUID.__tablename__].rows == 3
+        with target.new_session() as sess:
+            count = sess.execute(
+                select(func.count()).select_from(TableTestTenantUUID)
+            ).scalar_one()
+        assert count == 3
+        with source.new_session() as sess:
+            count = sess.execute(
+                select(func.count()).select_from(TableTestTenantUUID)
+            ).scalar_one()
+        assert count == 0
+
+    def test_composite_primary_key(
+        self,
+        engine: Engine,
+        target_engine: Engine,
+    ) -> None:
+        SettingsBase.metadata.create_all(engine)
+        SettingsBase.metadata.create_all(target_engine)
+        try:
+            source = PostgresManager.from_engine(engine, schema_name="public")
+            target = PostgresManager.from_engine(target_engine, schema_name="public")
+            tenant = new_tenant_str()
+            source.create_tenant(tenant)
+            with source.new_session() as sess:
+                sess.execute(
+                    insert(TenantSetting),
+                    [
+                        {"tenant": tenant, "key": "a", "value": "1"},
+                        {"tenant": tenant, "key": "b", "value": "2"},
+                    ],
+                )
+                sess.commit()
+
+            report = TenantRelocator(source, target, SettingsBase.metadata).relocate(
+                tenant
+            )
+
+            assert report.checksums[TenantSetting.__tablename__].rows == 2
+            with target.new_session() as sess:
+                values = sess.scalars(
+                    select(TenantSetting.value).order_by(TenantSetting.key)
+                ).all()
+            assert values == ["1", "2"]
+        finally:
+            SettingsBase.metadata.drop_all(engine)
+
+    def test_checksum_mismatch(
+        self,
+        engine: Engine,
+        target_engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        source = PostgresManager.from_engine(engine, schema_name="public")
+        target = PostgresManager.from_engine(target_engine, schema_name="public")
+        tenant = new_tenant_str()
+        source.create_tenant(tenant)
+        _insert_rows(source, tenant, 2)
+
+        relocator = TenantRelocator(source, target, Base.metadata)
+        relocator.relocate(tenant)
+        _insert_rows(target, tenant, 1)
+
+        with pytest.raises(TenantRelocationError):
+            relocator._verify(
+                tenant, [Base.metadata.tables[TableTestTenantStr.__tablename__]]
+            )
+
+
+class TestRelocateTenant:
+    def test_relocate_tenant(
+        self,
+        engine: Engine,
+        target_engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        placement = DirectoryPlacement(
+            engine, default=ConsistentHashPlacement(["source"])
+        )
+        placement.create_table()
+        manager = ShardedManager(
+            {
+                "source": PostgresManager.from_engine(engine, schema_name="public"),
+                "target": PostgresManager.from_engine(
+                    target_engine, schema_name="public"
+                ),
+            },
+            placement=placement,
+        )
+        try:
+            tenant = new_tenant_str()
+            manager.create_tenant(tenant)
+            assert placement.get_shard(tenant) == "source"
+            _insert_rows(manager.managers["source"], tenant, 2)  # type: ignore[arg-type]
+
+            manager.relocate_tenant(tenant, "target", Base.metadata)
+
+            placement.invalidate()
+            assert placement.get_shard(tenant) == "target"
+            with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+                rows = sess.scalars(select(TableTestTenantStr)).all()
+                assert {r.tenant for r in rows} == {tenant}
+                assert len(rows) == 2
+        finally:
+            placement.table.drop(engine)
+
+    def test_same_shard(self, engine: Engine) -> None:
+        placement = DirectoryPlacement(
+            engine, default=ConsistentHashPlacement(["source"])
+        )
+        placement.create_table()
+        manager = ShardedManager(
+            {"source": PostgresManager.from_engine(engine, schema_name="public")},
+            placement=placement,
+        )
+        try:
+            tenant = new_tenant_str()
+            manager.create_tenant(tenant)
+            with pytest.raises(ValueError):
+                manager.relocate_tenant(tenant, "source", Base.metadata)
+        finally:
+            placement.table.drop(engine)
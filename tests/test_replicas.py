@@ -0,0 +1,121 @@
+from typing import Any, Generator, List
+
+import pytest
+from alembic.config import Config
+from sqlalchemy import Engine, create_engine, event, select, text
+
+from sqlalchemy_tenants.core import get_tenant_role_name
+from sqlalchemy_tenants.managers import PostgresManager
+from sqlalchemy_tenants.replicas import ReplicaSet
+from tests.conftest import TableTestTenantStr
+from tests.factories import new_tenant_str
+
+
+@pytest.fixture(scope="function")
+def replica_engine(engine: Engine) -> Generator[Engine, None, None]:
+    # A second engine on the same database stands in for a replica
+    replica = create_engine(engine.url)
+    yield replica
+    replica.dispose()
+
+
+def _record_statements(engine: Engine) -> List[str]:
+    statements: List[str] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before_cursor_execute(_: Any, __: Any, statement: str, *args: Any) -> None:
+        statements.append(statement)
+
+    return statements
+
+
+class TestReplicaSet:
+    def test_round_robin(self, engine: Engine, replica_engine: Engine) -> None:
+        replicas = ReplicaSet([engine, replica_engine])
+        assert [replicas.get_engine() for _ in range(4)] == [
+            engine,
+            replica_engine,
+            engine,
+            replica_engine,
+        ]
+
+    def test_lag(self, replica_engine: Engine) -> None:
+        replicas = ReplicaSet([replica_engine], max_lag=1.0)
+        assert replicas.get_lag(replica_engine) == 0
+        assert replicas.get_engine() is replica_engine
+
+    def test_lagging_fallback(
+        self, replica_engine: Engine, monkeypatch: pytest.MonkeyPatch
+    ) -> None:
+        replicas = ReplicaSet([replica_engine], max_lag=1.0)
+        monkeypatch.setattr(replicas, "get_lag", lambda _: 10.0)
+        assert replicas.get_engine() is None
+
+    def test_unreachable_skipped(self, replica_engine: Engine) -> None:
+        unreachable = create_engine(replica_engine.url.set(port=1))
+        replicas = ReplicaSet([unreachable, replica_engine], max_lag=1.0)
+        assert [replicas.get_engine() for _ in range(2)] == [
+            replica_engine,
+            replica_engine,
+        ]
+
+    def test_no_replicas(self) -> None:
+        with pytest.raises(ValueError):
+            ReplicaSet([])
+
+
+class TestReplicaSessions:
+    def test_readonly(self, engine: Engine, replica_engine: Engine) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+            replicas=ReplicaSet([replica_engine]),
+        )
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        statements = _record_statements(replica_engine)
+        with manager.new_tenant_session(tenant, readonly=True) as sess:
+            user = sess.execute(text("SELECT current_user")).scalar()
+            assert user == get_tenant_role_name(tenant)
+        assert "SELECT current_user" in statements
+
+    def test_readonly_without_replicas(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(engine, schema_name="public")
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        with manager.new_tenant_session(tenant, readonly=True) as sess:
+            user = sess.execute(text("SELECT current_user")).scalar()
+            assert user == get_tenant_role_name(tenant)
+
+    def test_route_reads(
+        self,
+        engine: Engine,
+        replica_engine: Engine,
+        alembic_config: Config,
+        alembic_upgrade_downgrade: None,
+    ) -> None:
+        manager = PostgresManager.from_engine(
+            engine,
+            schema_name="public",
+            replicas=ReplicaSet([replica_engine]),
+            route_reads=True,
+        )
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        replica_statements = _record_statements(replica_engine)
+        primary_statements = _record_statements(engine)
+        with manager.new_tenant_session(tenant) as sess:
+            assert sess.scalars(select(TableTestTenantStr)).all() == []
+            assert len(replica_statements) == 2  # The role and the select
+            assert primary_statements == []
+
+            sess.add(TableTestTenantStr(id=1, name="Row", tenant=tenant))
+            sess.flush()
+            # The session reads its own writes from the primary
+            rows = sess.scalars(select(TableTestTenantStr)).all()
+            assert [r.name for r in rows] == ["Row"]
+            assert len(replica_statements) == 2
+            user = sess.execute(text("SELECT current_user")).scalar()
+            assert user == get_tenant_role_name(tenant)
+            sess.commit()
+        assert primary_statements[0].startswith("SET LOCAL ROLE")
@@ -0,0 +1,177 @@
+from pathlib import Path
+from typing import Any, Generator, List
+from uuid import UUID, uuid4
+
+import pytest
+from alembic.config import Config
+from sqlalchemy import Engine, MetaData, create_engine, event, insert, select, text
+from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
+
+from sqlalchemy_tenants.core import TenantCodec, get_tenant_schema_name
+from sqlalchemy_tenants.exceptions import TenantAlreadyExists, TenantNotFound
+from sqlalchemy_tenants.migrations import MigrationProgress
+from sqlalchemy_tenants.schemas import SchemaPerTenantManager, upgrade_tenant_schemas
+from tests.factories import new_tenant_str
+
+
+class SchemaBase(DeclarativeBase):
+    pass
+
+
+class SchemaItem(SchemaBase):
+    __tablename__ = "schema_items"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    name: Mapped[str] = mapped_column()
+
+
+@pytest.fixture(autouse=True)
+def cleanup_schemas(engine: Engine) -> Generator[None, None, None]:
+    yield
+    with engine.begin() as conn:
+        schemas = conn.scalars(
+            text(
+                "SELECT nspname FROM pg_namespace "
+                "WHERE nspname LIKE 'tenant_schema_test%'"
+            )
+        ).all()
+        for schema in schemas:
+            conn.execute(text(f'DROP SCHEMA "{schema}" CASCADE'))
+
+
+def _new_manager(
+    engine: Engine, metadata: MetaData = SchemaBase.metadata
+) -> SchemaPerTenantManager:
+    return SchemaPerTenantManager.from_engine(engine, metadata=metadata)
+
+
+class TestSchemaPerTenantManager:
+    def test_compact_uuid(self, engine: Engine) -> None:
+        codec = TenantCodec(UUID, compact_uuid=True)
+        manager = SchemaPerTenantManager.from_engine(
+            engine, metadata=SchemaBase.metadata, tenant_codec=codec
+        )
+        tenant = uuid4()
+        manager.create_tenant(str(tenant))
+        try:
+            assert len(get_tenant_schema_name(tenant, codec)) == 40
+            assert tenant in manager.list_tenants()
+            with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+                assert sess.tenant == tenant
+                sess.execute(insert(SchemaItem).values(id=1, name="a"))
+                assert sess.scalars(select(SchemaItem.name)).all() == ["a"]
+        finally:
+            manager.delete_tenant(tenant)
+
+    def test_create_list_delete(self, engine: Engine) -> None:
+        manager = _new_manager(engine)
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        assert tenant in manager.list_tenants()
+        with pytest.raises(TenantAlreadyExists):
+            manager.create_tenant(tenant)
+        manager.delete_tenant(tenant)
+        assert tenant not in manager.list_tenants()
+        with pytest.raises(TenantNotFound):
+            manager.delete_tenant(tenant)
+
+    def test_tenant_session_isolation(self, engine: Engine) -> None:
+        manager = _new_manager(engine)
+        tenant_1 = new_tenant_str()
+        tenant_2 = new_tenant_str()
+        manager.create_tenant(tenant_1)
+        manager.create_tenant(tenant_2)
+        with manager.new_tenant_session(tenant_1) as sess:
+            sess.add(SchemaItem(name="Item"))
+            sess.commit()
+        with manager.new_tenant_session(tenant_2) as sess:
+            assert sess.scalars(select(SchemaItem)).all() == []
+        with manager.new_tenant_session(tenant_1) as sess:
+            assert [i.name for i in sess.scalars(select(SchemaItem))] == ["Item"]
+        with manager.new_session() as sess:
+            path = sess.execute(text("SHOW search_path")).scalar()
+            assert get_tenant_schema_name(tenant_1) not in str(path)
+
+    def test_search_path_kept_across_transactions(self, engine: Engine) -> None:
+        manager = _new_manager(engine)
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        statements: List[str] = []
+
+        def _before_cursor_execute(_: Any, __: Any, statement: str, *args: Any) -> None:
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        with manager.new_tenant_session(tenant) as sess:
+            sess.add(SchemaItem(name="Item"))
+            sess.commit()
+            sess.add(SchemaItem(name="Discarded"))
+            sess.flush()
+            sess.rollback()
+            assert sess.scalars(select(SchemaItem.name)).all() == ["Item"]
+        event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+        # The session sets the search_path once, on the connection it holds
+        assert sum("set_config('search_path'" in s for s in statements) == 1
+
+    def test_search_path_reset_on_return(self, postgres_dsn_psycopg: str) -> None:
+        engine = create_engine(postgres_dsn_psycopg, pool_size=1, max_overflow=0)
+        manager = _new_manager(engine)
+        tenant = new_tenant_str()
+        try:
+            with manager.new_tenant_session(tenant) as sess:
+                sess.execute(select(SchemaItem))
+            with engine.connect() as conn:
+                path = conn.execute(text("SHOW search_path")).scalar()
+            assert get_tenant_schema_name(tenant) not in str(path)
+        finally:
+            engine.dispose()
+
+    def test_tenant_not_found(self, engine: Engine) -> None:
+        manager = _new_manager(engine)
+        with pytest.raises(TenantNotFound):  # noqa: SIM117
+            with manager.new_tenant_session(new_tenant_str(), create_if_missing=False):
+                pass
+
+    def test_clone_tenant(self, engine: Engine) -> None:
+        manager = _new_manager(engine)
+        source = new_tenant_str()
+        target = new_tenant_str()
+        manager.create_tenant(source)
+        manager.create_tenant(target)
+        with manager.new_tenant_session(source) as sess:
+            sess.execute(insert(SchemaItem), [{"name": f"Item {i}"} for i in range(3)])
+            sess.commit()
+        copied = manager.clone_tenant(source, target, SchemaBase.metadata)
+        assert copied == {SchemaItem.__tablename__: 3}
+        with manager.new_tenant_session(target) as sess:
+            assert len(sess.scalars(select(SchemaItem)).all()) == 3
+
+
+class TestUpgradeTenantSchemas:
+    def test_upgrade(self, engine: Engine, postgres_dsn_psycopg: str) -> None:
+        manager = SchemaPerTenantManager.from_engine(engine)
+        tenants = [new_tenant_str() for _ in range(3)]
+        for tenant in tenants:
+            manager.create_tenant(tenant)
+        schemas = [get_tenant_schema_name(t) for t in tenants]
+        config = Config()
+        config.set_main_option(
+            "script_location", str(Path(__file__).parent / "alembic_schemas")
+        )
+        config.set_main_option("sqlalchemy.url", postgres_dsn_psycopg)
+        progress: List[MigrationProgress] = []
+
+        results = upgrade_tenant_schemas(
+            config,
+            [*schemas, "tenant_test_missing"],
+            max_workers=2,
+            on_progress=progress.append,
+        )
+
+        assert all(results[s] is None for s in schemas)
+        assert results["tenant_test_missing"] is not None
+        assert sorted(p.completed for p in progress) == [1, 2, 3, 4]
+        with manager.new_tenant_session(tenants[0]) as sess:
+            assert sess.scalars(select(SchemaItem)).all() == []
+            version = sess.execute(text("SELECT version_num FROM alembic_version"))
+            assert version.scalar() == "0001"
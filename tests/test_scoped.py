@@ -0,0 +1,74 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import Engine, text
+
+from sqlalchemy_tenants.context import (
+    get_current_tenant,
+    reset_current_tenant,
+    set_current_tenant,
+    tenant_context,
+)
+from sqlalchemy_tenants.core import get_tenant_role_name
+from sqlalchemy_tenants.exceptions import NoCurrentTenant
+from sqlalchemy_tenants.managers import PostgresManager
+from sqlalchemy_tenants.scoped import ScopedTenantSession
+from tests.factories import new_tenant_str
+
+
+class TestCurrentTenant:
+    def test_set_and_reset(self) -> None:
+        assert get_current_tenant() is None
+        token = set_current_tenant("tenant_1")
+        with tenant_context("tenant_2"):
+            assert get_current_tenant() == "tenant_2"
+            # Threads don't inherit the tenant
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                assert executor.submit(get_current_tenant).result() is None
+        assert get_current_tenant() == "tenant_1"
+        reset_current_tenant(token)
+        assert get_current_tenant() is None
+
+    def test_new_tenant_session(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(engine, schema_name="public")
+        tenant = new_tenant_str()
+        with pytest.raises(NoCurrentTenant), manager.new_tenant_session():
+            pass
+        with tenant_context(tenant), manager.new_tenant_session() as sess:
+            assert sess.tenant == tenant
+            user = sess.execute(text("SELECT current_user")).scalar_one()
+            assert user == get_tenant_role_name(tenant)
+
+
+class TestScopedTenantSession:
+    def test_reuse(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(engine, schema_name="public")
+        sessions = ScopedTenantSession(manager)
+        tenant = new_tenant_str()
+        other = new_tenant_str()
+        assert sessions.get() is None
+        with tenant_context(tenant), sessions.session() as outer:
+            assert sessions.get() is outer
+            with sessions.session() as inner:
+                assert inner is outer
+            with sessions.session(readonly=True) as inner:
+                assert inner is outer
+            with sessions.session(other) as inner:
+                assert inner is not outer
+                assert inner.tenant == other
+                assert sessions.get() is inner
+            assert sessions.get() is outer
+            # Another thread gets its own session
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                assert executor.submit(sessions.get).result() is None
+        assert sessions.get() is None
+
+    def test_writable_in_readonly(self, engine: Engine) -> None:
+        manager = PostgresManager.from_engine(engine, schema_name="public")
+        sessions = ScopedTenantSession(manager)
+        tenant = new_tenant_str()
+        with (
+            sessions.session(tenant, readonly=True) as outer,
+            sessions.session(tenant) as inner,
+        ):
+            assert inner is not outer
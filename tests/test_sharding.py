@@ -0,0 +1,145 @@
+from typing import Generator
+
+import pytest
+from sqlalchemy import Engine, update
+from sqlalchemy.exc import ProgrammingError
+
+from sqlalchemy_tenants.exceptions import TenantNotFound
+from sqlalchemy_tenants.managers import PostgresManager
+from sqlalchemy_tenants.sharding import (
+    ConsistentHashPlacement,
+    DirectoryPlacement,
+    HashRing,
+    Placement,
+    ShardedManager,
+)
+from tests.factories import new_tenant_str
+
+SHARDS = ["shard-1", "shard-2"]
+
+
+@pytest.fixture(scope="function")
+def directory(engine: Engine) -> Generator[DirectoryPlacement, None, None]:
+    placement = DirectoryPlacement(engine, default=ConsistentHashPlacement(SHARDS))
+    placement.create_table()
+    yield placement
+    placement.table.drop(engine)
+
+
+def _new_sharded_manager(engine: Engine, placement: Placement) -> ShardedManager:
+    return ShardedManager(
+        {
+            shard: PostgresManager.from_engine(engine, schema_name="public")
+            for shard in SHARDS
+        },
+        placement=placement,
+    )
+
+
+class TestHashRing:
+    def test_stable(self) -> None:
+        ring = HashRing(SHARDS)
+        tenants = [new_tenant_str() for _ in range(100)]
+        assert [ring.get_shard(t) for t in tenants] == [
+            HashRing(SHARDS).get_shard(t) for t in tenants
+        ]
+
+    def test_distribution(self) -> None:
+        ring = HashRing(SHARDS)
+        shards = [ring.get_shard(new_tenant_str()) for _ in range(1000)]
+        for shard in SHARDS:
+            assert 300 < shards.count(shard) < 700
+
+    def test_add_shard_moves_few_tenants(self) -> None:
+        before = HashRing(SHARDS)
+        after = HashRing([*SHARDS, "shard-3"])
+        tenants = [new_tenant_str() for _ in range(1000)]
+        moved = [t for t in tenants if before.get_shard(t) != after.get_shard(t)]
+        assert all(after.get_shard(t) == "shard-3" for t in moved)
+        assert len(moved) < 500
+
+    def test_no_shards(self) -> None:
+        with pytest.raises(ValueError):
+            HashRing([])
+
+
+class TestShardedManager:
+    def test_consistent_hash_routing(self, engine: Engine) -> None:
+        placement = ConsistentHashPlacement(SHARDS)
+        manager = _new_sharded_manager(engine, placement)
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        shard = placement.get_shard(tenant)
+        assert manager.get_manager(tenant) is manager.managers[shard]
+        assert tenant in manager.list_tenants()
+        with manager.new_tenant_session(tenant, create_if_missing=False) as sess:
+            assert sess.tenant == tenant
+        manager.delete_tenant(tenant)
+        assert tenant not in manager.list_tenants()
+
+    def test_directory_routing(
+        self, engine: Engine, directory: DirectoryPlacement
+    ) -> None:
+        manager = _new_sharded_manager(engine, directory)
+        tenant = new_tenant_str()
+        with pytest.raises(TenantNotFound):
+            manager.get_manager(tenant)
+        manager.create_tenant(tenant)
+        directory.invalidate()
+        assert directory.get_shard(tenant) == directory.default.get_shard(tenant)
+        manager.delete_tenant(tenant)
+        with pytest.raises(TenantNotFound):
+            directory.get_shard(tenant)
+
+    def test_directory_cache_expires(
+        self, engine: Engine, directory: DirectoryPlacement
+    ) -> None:
+        tenant = new_tenant_str()
+        shard = directory.add_tenant(tenant)
+        other_shard = next(s for s in SHARDS if s != shard)
+        # Another process, with its own cache
+        cached = DirectoryPlacement(
+            engine, default=directory.default, table=directory.table
+        )
+        expiring = DirectoryPlacement(
+            engine, default=directory.default, table=directory.table, cache_ttl=0
+        )
+        assert cached.get_shard(tenant) == shard
+        assert expiring.get_shard(tenant) == shard
+
+        directory.move_tenant(tenant, other_shard)
+
+        assert expiring.get_shard(tenant) == other_shard
+        assert cached.get_shard(tenant) == shard
+        cached.invalidate(tenant)
+        assert cached.get_shard(tenant) == other_shard
+
+    def test_directory_create_if_missing(
+        self, engine: Engine, directory: DirectoryPlacement
+    ) -> None:
+        manager = _new_sharded_manager(engine, directory)
+        tenant = new_tenant_str()
+        with manager.new_tenant_session(tenant) as sess:
+            assert sess.tenant == tenant
+        assert directory.get_shard(tenant) in SHARDS
+
+    def test_directory_not_writable_by_tenants(
+        self, engine: Engine, directory: DirectoryPlacement
+    ) -> None:
+        manager = _new_sharded_manager(engine, directory)
+        tenant = new_tenant_str()
+        manager.create_tenant(tenant)
+        with (
+            manager.new_tenant_session(tenant, create_if_missing=False) as sess,
+            pytest.raises(ProgrammingError, match="permission denied"),
+        ):
+            sess.execute(update(directory.table).values(shard="other"))
+        directory.invalidate()
+        assert directory.get_shard(tenant) in SHARDS
+
+    def test_new_session_requires_shard(self, engine: Engine) -> None:
+        manager = _new_sharded_manager(engine, ConsistentHashPlacement(SHARDS))
+        with pytest.raises(ValueError), manager.new_session():
+            pass
+        with manager.new_session(SHARDS[0]) as sess:
+            assert sess is not None
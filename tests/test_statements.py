@@ -0,0 +1,45 @@
+from sqlalchemy_tenants.statements import (
+    ProvisioningStatements,
+    get_set_role_statement,
+)
+
+
+class TestProvisioningStatements:
+    def test_create_role(self) -> None:
+        statements = ProvisioningStatements(["public", "Extra"], owner="owner")
+        sql = [str(s) for s in statements.create_role('tenant_a"b')]
+        assert sql == [
+            'CREATE ROLE "tenant_a""b"',
+            'GRANT "tenant_a""b" TO owner',
+            'GRANT USAGE ON SCHEMA public, "Extra" TO "tenant_a""b"',
+            "GRANT SELECT, INSERT, UPDATE, DELETE ON ALL TABLES "
+            'IN SCHEMA public, "Extra" TO "tenant_a""b"',
+            'ALTER DEFAULT PRIVILEGES IN SCHEMA public, "Extra" '
+            'GRANT SELECT, INSERT, UPDATE, DELETE ON TABLES TO "tenant_a""b"',
+        ]
+
+    def test_delete_role(self) -> None:
+        statements = ProvisioningStatements(["public"], owner="owner")
+        sql = [str(s) for s in statements.delete_role("tenant_a")]
+        assert sql == [
+            "REASSIGN OWNED BY tenant_a TO owner",
+            "DROP OWNED BY tenant_a",
+            "DROP ROLE tenant_a",
+        ]
+
+    def test_revoke_registry(self) -> None:
+        statements = ProvisioningStatements(
+            ["public"], owner="owner", registry="public.registry"
+        )
+        sql = [str(s) for s in statements.grant_privileges("tenant_a")]
+        assert sql[-1] == "REVOKE ALL ON TABLE public.registry FROM tenant_a"
+        sql = [str(s) for s in statements.revoke_registry(["tenant_a", "tenant_b"])]
+        assert sql == ["REVOKE ALL ON TABLE public.registry FROM tenant_a, tenant_b"]
+        assert statements.revoke_registry([]) == []
+        assert ProvisioningStatements(["public"], "owner").revoke_registry(["a"]) == []
+
+
+def test_set_role_statement_is_reused() -> None:
+    stmt = get_set_role_statement("tenant_a")
+    assert str(stmt) == "SET SESSION ROLE tenant_a"
+    assert get_set_role_statement("tenant_a") is stmt